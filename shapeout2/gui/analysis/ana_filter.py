@@ -127,6 +127,7 @@ class FilterPanel(QtWidgets.QWidget):
                     data=feat)
                 rc.setActive(False)
                 rc.setVisible(False)
+                rc.range_changed.connect(self.on_box_range_changed)
                 # Insert the control at the correct position (label-sorted)
                 rcf = list(self._box_range_controls.keys())
                 rcl = [dclab.dfn.get_feature_label(ft) for ft in rcf]
@@ -191,6 +192,11 @@ class FilterPanel(QtWidgets.QWidget):
             labs = [it[0] for it in lf]
         return feats, labs
 
+    @QtCore.pyqtSlot(float, float)
+    def on_box_range_changed(self, start, end):
+        """Show the number of events within the new box filter range"""
+        self.update_box_count(self.sender())
+
     def on_duplicate_filter(self):
         # determine the new filter state
         filt_state = self.read_pipeline_state()
@@ -278,6 +284,18 @@ class FilterPanel(QtWidgets.QWidget):
         else:
             self.setEnabled(False)
 
+    def update_box_count(self, rc):
+        """Update the event count of a box filter range control"""
+        if (rc.is_active()
+                and self.pipeline is not None
+                and self.pipeline.num_slots):
+            state = rc.read_pipeline_state()
+            rc.setCount(self.pipeline.get_range_count(feat=rc.data,
+                                                      start=state["start"],
+                                                      end=state["end"]))
+        else:
+            rc.setCount(None)
+
     def update_box_ranges(self):
         """Update the box plot filter ranges
 
@@ -298,6 +316,7 @@ class FilterPanel(QtWidgets.QWidget):
                     if feat not in state["box filters"]:
                         # reset range to limits
                         rc.reset_range()
+                self.update_box_count(rc)
 
     def update_polygon_filters(self, update_state=True):
         """Update the layout containing the polygon filters"""
@@ -51,6 +51,8 @@ class PlotPanel(QtWidgets.QWidget):
         self.comboBox_plots.currentIndexChanged.connect(self.update_content)
         self.comboBox_marker_hue.currentIndexChanged.connect(
             self.on_hue_selected)
+        self.comboBox_scatter_mode.currentIndexChanged.connect(
+            self.on_scatter_mode_selected)
         self.comboBox_marker_feature.currentIndexChanged.connect(
             self.on_hue_selected)
         self.comboBox_axis_x.currentIndexChanged.connect(self.on_axis_changed)
@@ -104,6 +106,7 @@ class PlotPanel(QtWidgets.QWidget):
             },
             "scatter": {
                 "colormap": self.comboBox_colormap.currentData(),
+                "density scale": self.comboBox_density_scale.currentData(),
                 "downsample": self.checkBox_downsample.isChecked(),
                 "downsampling value": self.spinBox_downsample.value(),
                 "enabled": self.groupBox_scatter.isChecked(),
@@ -113,6 +116,7 @@ class PlotPanel(QtWidgets.QWidget):
                 "marker alpha": self.spinBox_alpha.value() / 100,
                 "marker hue": marker_hue,
                 "marker size": self.doubleSpinBox_marker_size.value(),
+                "mode": self.comboBox_scatter_mode.currentData(),
                 "show event count": self.checkBox_event_count.isChecked(),
             },
             "contour": {
@@ -179,6 +183,12 @@ class PlotPanel(QtWidgets.QWidget):
 
         # Scatter
         sca = state["scatter"]
+        mode_index = self.comboBox_scatter_mode.findData(sca["mode"])
+        self.comboBox_scatter_mode.setCurrentIndex(mode_index)
+        dscale_index = self.comboBox_density_scale.findData(
+            sca["density scale"])
+        self.comboBox_density_scale.setCurrentIndex(dscale_index)
+        self.on_scatter_mode_selected()
         self.checkBox_downsample.setChecked(sca["downsample"])
         self.spinBox_downsample.setValue(sca["downsampling value"])
         self.groupBox_scatter.setChecked(sca["enabled"])
@@ -248,6 +258,17 @@ class PlotPanel(QtWidgets.QWidget):
         self.comboBox_colormap.clear()
         for c in COLORMAPS:
             self.comboBox_colormap.addItem(c, c)
+        # Scatter plot rendering
+        self.comboBox_scatter_mode.clear()
+        for mode in STATE_OPTIONS["scatter"]["mode"]:
+            self.comboBox_scatter_mode.addItem(mode.capitalize(), mode)
+        self.comboBox_density_scale.clear()
+        for sc in STATE_OPTIONS["scatter"]["density scale"]:
+            if sc == "log":
+                vc = "logarithmic counts"
+            else:
+                vc = "linear counts"
+            self.comboBox_density_scale.addItem(vc, sc)
         # Contour line styles
         lstyles = STATE_OPTIONS["contour"]["line styles"][0]
         self.comboBox_ls_1.clear()
@@ -493,6 +514,15 @@ class PlotPanel(QtWidgets.QWidget):
         else:
             raise ValueError("Unknown selection: '{}'".format(selection))
 
+    @QtCore.pyqtSlot()
+    def on_scatter_mode_selected(self):
+        """Show/hide options that only apply to marker scatter plots"""
+        density = self.comboBox_scatter_mode.currentData() == "density image"
+        self.comboBox_density_scale.setVisible(density)
+        self.checkBox_downsample.setEnabled(not density)
+        self.spinBox_downsample.setEnabled(not density)
+        self.doubleSpinBox_marker_size.setEnabled(not density)
+
     @QtCore.pyqtSlot()
     def on_plot_duplicated(self):
         # determine the new filter state
@@ -0,0 +1,117 @@
+"""Colormaps and vectorized color mapping for scatter plots"""
+import functools
+
+import numpy as np
+from PyQt6 import QtGui
+import pyqtgraph as pg
+from pyqtgraph.graphicsItems.GradientEditorItem import Gradients
+
+
+#: number of colors in the colormap lookup tables
+LUT_SIZE = 256
+
+
+# Register custom colormaps
+Gradients["grayblue"] = {'ticks': [(0.0, (100, 100, 100, 255)),
+                                   (1.0, (0, 0, 255, 255))],
+                         'mode': 'rgb'}
+
+Gradients["graygreen"] = {'ticks': [(0.0, (100, 100, 100, 255)),
+                                    (1.0, (0, 180, 0, 255))],
+                          'mode': 'rgb'}
+
+Gradients["grayorange"] = {'ticks': [(0.0, (100, 100, 100, 255)),
+                                     (1.0, (210, 110, 0, 255))],
+                           'mode': 'rgb'}
+
+Gradients["grayred"] = {'ticks': [(0.0, (100, 100, 100, 255)),
+                                  (1.0, (200, 0, 0, 255))],
+                        'mode': 'rgb'}
+
+
+def get_colormap(name):
+    """Return the :class:`pyqtgraph.ColorMap` of a registered gradient"""
+    return pg.ColorMap(*zip(*Gradients[name]["ticks"]))
+
+
+def get_color_indices(values, vmin=0, vmax=1):
+    """Return the palette indices for `values`
+
+    Values are linearly mapped from the interval [vmin, vmax] to
+    the indices of the colormap lookup table (values outside of
+    the interval are clipped). NaN values are mapped to the index
+    `LUT_SIZE` (the last entry of the palette).
+    """
+    values = np.asarray(values, dtype=float)
+    if vmax == vmin or not np.isfinite(vmax - vmin):
+        scale = 0
+    else:
+        scale = (LUT_SIZE - 1) / (vmax - vmin)
+    with np.errstate(invalid="ignore"):
+        norm = (values - vmin) * scale
+    nan = np.isnan(norm)
+    norm[nan] = LUT_SIZE
+    np.clip(norm, 0, LUT_SIZE - 1, out=norm, where=~nan)
+    return np.rint(norm).astype(np.intp)
+
+
+@functools.lru_cache(maxsize=64)
+def get_palette(name, nan_color="#FF0000"):
+    """Return the RGBA lookup table and brushes of a colormap
+
+    Returns
+    -------
+    lut: np.ndarray of shape (LUT_SIZE + 1, 4) and dtype uint8
+        RGBA colors; the last entry is the color for NaN values
+    brushes: np.ndarray of shape (LUT_SIZE + 1,) and dtype object
+        :class:`QtGui.QBrush` for each entry in `lut`
+
+    Notes
+    -----
+    Using the same QBrush instances for all points with the same
+    color avoids the creation of one brush per point in pyqtgraph
+    and keeps its symbol atlas small.
+    """
+    cmap = get_colormap(name)
+    lut = np.zeros((LUT_SIZE + 1, 4), dtype=np.uint8)
+    lut[:-1] = cmap.getLookupTable(0, 1, LUT_SIZE, alpha=True)
+    lut[-1] = pg.mkColor(nan_color).getRgb()
+    brushes = np.empty(LUT_SIZE + 1, dtype=object)
+    for ii, rgba in enumerate(lut):
+        brushes[ii] = QtGui.QBrush(pg.mkColor(*rgba))
+    lut.flags.writeable = False
+    brushes.flags.writeable = False
+    return lut, brushes
+
+
+def map_to_brushes(values, name, vmin=0, vmax=1, nan_color="#FF0000"):
+    """Return an array of brushes for `values` (see :func:`map_to_rgba`)
+
+    The returned object array can directly be passed to
+    :func:`pyqtgraph.ScatterPlotItem.setData`.
+    """
+    _, brushes = get_palette(name, nan_color)
+    return brushes[get_color_indices(values, vmin=vmin, vmax=vmax)]
+
+
+def map_to_rgba(values, name, vmin=0, vmax=1, nan_color="#FF0000"):
+    """Map values to RGBA colors
+
+    Parameters
+    ----------
+    values: 1d np.ndarray
+        Data (e.g. density or feature values) to map
+    name: str
+        Name of the colormap
+    vmin, vmax: float
+        Values mapped to the first and last color of the colormap
+    nan_color: str
+        Color used for highlighting NaN values
+
+    Returns
+    -------
+    rgba: np.ndarray of shape (N, 4) and dtype uint8
+        RGBA color for each value
+    """
+    lut, _ = get_palette(name, nan_color)
+    return lut[get_color_indices(values, vmin=vmin, vmax=vmax)]
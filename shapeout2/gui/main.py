@@ -23,6 +23,7 @@ from . import compute
 from . import dcor
 from . import export
 from . import pipeline_plot
+from . import plot_prefetch
 from . import preferences
 from . import quick_view
 from . import update
@@ -102,6 +103,11 @@ class ShapeOut2(QtWidgets.QMainWindow):
         if s3_secret_access_key:
             dclab.rtdc_dataset.fmt_s3.S3_SECRET_ACCESS_KEY = \
                 s3_secret_access_key
+        # Memory limits and persistent storage of the caches
+        preferences.apply_handle_pool_settings(self.settings)
+        preferences.apply_mask_store_settings(self.settings)
+        preferences.apply_meta_index_settings(self.settings)
+        preferences.apply_plot_cache_settings(self.settings)
 
         #: Analysis pipeline
         self.pipeline = pipeline.Pipeline()
@@ -166,6 +172,9 @@ class ShapeOut2(QtWidgets.QMainWindow):
         self.subwindows = {}
         # Subwindows for plots
         self.subwindows_plots = {}
+        # Computes the data of all plot windows in parallel
+        self.plot_prefetcher = plot_prefetch.PlotPrefetcher(parent=self)
+        self.plot_prefetcher.finished.connect(self.on_plot_data_ready)
         # Initialize a few things
         self.init_quick_view()
         self.init_analysis_view()
@@ -328,6 +337,11 @@ class ShapeOut2(QtWidgets.QMainWindow):
         self.block_matrix.invalidate_elements(invalid_dm, invalid_pm)
         # Update AnalysisView
         self.widget_ana_view.set_pipeline(self.pipeline)
+        # Release the slot shown in QuickView if it was removed
+        qv_slot = self.widget_quick_view.slot
+        if qv_slot is not None and all(
+                slot is not qv_slot for slot in self.pipeline.slots):
+            self.widget_quick_view.clear_dataset()
         # Update QuickView choices
         self.widget_quick_view.update_feature_choices()
         # update list of polygon filters in Quick View
@@ -347,8 +361,12 @@ class ShapeOut2(QtWidgets.QMainWindow):
                         self.plots_changed.disconnect(child.update_content)
                         break
                 sub.deleteLater()
-        self.plots_changed.emit()
         self.widget_ana_view.widget_plot.update_content()
+        # Compute the plot data of all plot windows in parallel; the
+        # plot windows are updated when all data are computed (see
+        # `on_plot_data_ready`).
+        self.plot_prefetcher.prefetch(self.pipeline,
+                                      list(self.subwindows_plots.keys()))
         # Remove zombie slots
         for slot_id in list(pipeline.Dataslot._instances.keys()):
             if slot_id not in self.pipeline.slot_ids:
@@ -425,25 +443,53 @@ class ShapeOut2(QtWidgets.QMainWindow):
             self.toolButton_new_plot.setEnabled(True)
             self.block_matrix.toolButton_new_plot.setEnabled(True)
 
-        failed_paths = []
-
-        slot_ids = []
-        # Create Dataslot instance and update block matrix
-        self.setUpdatesEnabled(False)
+        paths = []
         for fn in fnames:
             if is_dcor:
                 path = fn
             else:
                 path = pathlib.Path(fn)
                 self.settings.setValue("paths/add dataset", str(path.parent))
-            # add a filter if we don't have one already
-            if self.pipeline.num_filters == 0:
-                self.add_filter()
+            paths.append(path)
+
+        # add a filter if we don't have one already
+        if paths and self.pipeline.num_filters == 0:
+            self.add_filter()
+
+        # Open the datasets in parallel
+        if len(paths) > 1:
+            prog = QtWidgets.QProgressDialog("Loading datasets...", None, 0,
+                                             len(paths), self)
+            prog.setMinimumDuration(500)
+
+            def callback(done, total):
+                prog.setValue(done)
+                QtWidgets.QApplication.processEvents(
+                    QtCore.QEventLoop.ProcessEventsFlag.AllEvents, 300)
+        else:
+            prog = callback = None
+        datasets, errors = pipeline.dataslot.open_datasets(paths,
+                                                           callback=callback)
+        if prog is not None:
+            prog.close()
+        if errors and len(paths) == 1:
+            # Let the user know immediately
+            raise errors[0][1]
+        failed_paths = [path for path, _ in errors]
+
+        slot_ids = []
+        # Create Dataslot instance and update block matrix
+        self.setUpdatesEnabled(False)
+        for path, ds in zip(paths, datasets):
+            if ds is None:
+                continue
             try:
-                slot_id = self.pipeline.add_slot(path=path)
+                slot = pipeline.Dataslot(path=path, dataset=ds)
+                slot_id = self.pipeline.add_slot(slot=slot)
             except BaseException:
-                if len(fnames) == 1:
+                if len(paths) == 1:
                     # Let the user know immediately
+                    self.setUpdatesEnabled(True)
                     raise
                 else:
                     failed_paths.append(path)
@@ -522,6 +568,22 @@ class ShapeOut2(QtWidgets.QMainWindow):
                 event.ignore()
         else:
             event.accept()
+        if event.isAccepted():
+            self.widget_quick_view.clear_dataset()
+            self.plot_prefetcher.finished.disconnect(self.on_plot_data_ready)
+            self.plot_prefetcher.shutdown()
+            # Remove the views of this window from the pyqtgraph registry
+            # of views. pyqtgraph accesses all registered views whenever
+            # a new view is registered, but the widgets of this window
+            # might be deleted before their views are garbage-collected.
+            for vb in list(pg.ViewBox.AllViews):
+                if not pg.Qt.isQObjectAlive(vb):
+                    continue
+                widget = vb.getViewWidget()
+                if widget is not None and self.isAncestorOf(widget):
+                    pg.ViewBox.AllViews.pop(vb, None)
+                    if pg.ViewBox.NamedViews.get(vb.name) is vb:
+                        pg.ViewBox.NamedViews.pop(vb.name)
 
     def dragEnterEvent(self, e):
         """Whether files are accepted"""
@@ -678,6 +740,8 @@ class ShapeOut2(QtWidgets.QMainWindow):
         else:
             yes = True
         if yes:
+            # do not report plot data of the old session
+            self.plot_prefetcher.cancel()
             session.clear_session(self.pipeline)
             self.reload_pipeline()
             self.setWindowTitle(f"Shape-Out {version}")
@@ -977,6 +1041,12 @@ class ShapeOut2(QtWidgets.QMainWindow):
         self.mdiArea.update()
         self.subwindows["analysis_view"].update()
 
+    @QtCore.pyqtSlot(int)
+    def on_plot_data_ready(self, generation):
+        """Update the plot windows when the plot data are computed"""
+        if generation == self.plot_prefetcher.generation:
+            self.plots_changed.emit()
+
     @widgets.show_wait_cursor
     @QtCore.pyqtSlot(bool)
     def on_quickview(self, view=True):
@@ -66,7 +66,7 @@ class MatrixFilter(QtWidgets.QWidget):
     @enabled.setter
     def enabled(self, b):
         filt = pipeline.Filter._instances[self.identifier]
-        filt.general["enable filters"] = b
+        filt.filter_used = b
 
     @property
     def name(self):
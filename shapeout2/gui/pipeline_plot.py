@@ -1,4 +1,5 @@
 import copy
+import functools
 import html
 import importlib.resources
 
@@ -7,34 +8,17 @@ import numpy as np
 from PyQt6 import uic, QtCore, QtGui, QtWidgets
 import pyqtgraph as pg
 from pyqtgraph import exporters
-from pyqtgraph.graphicsItems.GradientEditorItem import Gradients
 
 
 from .. import plot_cache
 from .. import util
+from ..pipeline.handle_pool import handle_pool
+from . import colormaps
 from .widgets import ShapeOutColorBarItem
 
 from .widgets import SimplePlotItem
 
 
-# Register custom colormaps
-Gradients["grayblue"] = {'ticks': [(0.0, (100, 100, 100, 255)),
-                                   (1.0, (0, 0, 255, 255))],
-                         'mode': 'rgb'}
-
-Gradients["graygreen"] = {'ticks': [(0.0, (100, 100, 100, 255)),
-                                    (1.0, (0, 180, 0, 255))],
-                          'mode': 'rgb'}
-
-Gradients["grayorange"] = {'ticks': [(0.0, (100, 100, 100, 255)),
-                                     (1.0, (210, 110, 0, 255))],
-                           'mode': 'rgb'}
-
-Gradients["grayred"] = {'ticks': [(0.0, (100, 100, 100, 255)),
-                                  (1.0, (200, 0, 0, 255))],
-                        'mode': 'rgb'}
-
-
 class ContourSpacingTooLarge(UserWarning):
     pass
 
@@ -51,6 +35,7 @@ class PipelinePlot(QtWidgets.QWidget):
 
         # used to avoid unnecessary plotting
         self._plot_data_hash = "unset"
+        self._revision = None
 
         self._window_decoration_size = (None, None)
 
@@ -63,32 +48,19 @@ class PipelinePlot(QtWidgets.QWidget):
 
     def update_content(self):
         """Update the current plot"""
+        if self.identifier not in self.pipeline.plot_ids:
+            # The plot was removed and this window is about to be
+            # deleted (e.g. if the session was cleared).
+            return
         parent = self.parent()
-        dslist, slot_states = self.pipeline.get_plot_datasets(self.identifier)
         plot = self.pipeline.get_plot(self.identifier)
         plot_state = plot.__getstate__()
-        # check whether anything changed
-        # 1. plot state and all relevant slot states
-        tohash = [slot_states, plot_state]
-        # 2. all relevant filter states
-        for slot_state in slot_states:
-            slot_id = slot_state["identifier"]
-            for filt_id in self.pipeline.filter_ids:
-                if self.pipeline.is_element_active(slot_id, filt_id):
-                    filt = self.pipeline.get_filter(filt_id)
-                    filt_state = filt.__getstate__()
-                    tohash.append([slot_id, filt_id, filt_state])
-                    # also check whether the polygon filters changed (#26)
-                    for pid in filt_state["polygon filters"]:
-                        pf = dclab.PolygonFilter.get_instance_from_id(pid)
-                        tohash.append(pf.__getstate__())
-        plot_data_hash = util.hashobj(tohash)
-        if plot_data_hash == self._plot_data_hash:
-            # do nothing
-            pass
-        else:
-            self._plot_data_hash = plot_data_hash
-            self.update_content_plot(plot_state, slot_states, dslist)
+        # Quick check with the revision counter of the pipeline
+        # (without applying any filters)
+        revision = self.pipeline.revision
+        if revision != self._revision:
+            self._revision = revision
+            self.update_content_data(plot_state)
 
         # Set size in the end (after layout is populated)
         lay = plot_state["layout"]
@@ -112,6 +84,45 @@ class PipelinePlot(QtWidgets.QWidget):
         self.plot_layout.updateGeometry()
         self.update()
 
+    def update_content_data(self, plot_state):
+        """Plot the data if any of the relevant states changed"""
+        # Plotting applies the filters of the datasets, so datasets
+        # must not be read in other threads in the meantime (e.g. by
+        # the plot prefetcher).
+        with self.pipeline.dataset_lock.writing():
+            dslist, slot_states = self.pipeline.get_plot_datasets(
+                self.identifier)
+            # do not close the datasets while plotting
+            slots = [self.pipeline.get_slot(ss["identifier"])
+                     for ss in slot_states]
+            with handle_pool.pinned(slots):
+                self._update_content_data(plot_state, dslist, slot_states)
+
+    def _update_content_data(self, plot_state, dslist, slot_states):
+        """Helper for :func:`update_content_data` (slots are pinned)"""
+        # check whether anything changed
+        # 1. plot state and all relevant slot states
+        tohash = [slot_states, plot_state]
+        # 2. all relevant filter states
+        for slot_state in slot_states:
+            slot_id = slot_state["identifier"]
+            for filt_id in self.pipeline.filter_ids:
+                if self.pipeline.is_element_active(slot_id, filt_id):
+                    filt = self.pipeline.get_filter(filt_id)
+                    filt_state = filt.__getstate__()
+                    tohash.append([slot_id, filt_id, filt_state])
+                    # also check whether the polygon filters changed (#26)
+                    for pid in filt_state["polygon filters"]:
+                        pf = dclab.PolygonFilter.get_instance_from_id(pid)
+                        tohash.append(pf.__getstate__())
+        plot_data_hash = util.hashobj(tohash)
+        if plot_data_hash == self._plot_data_hash:
+            # do nothing
+            pass
+        else:
+            self._plot_data_hash = plot_data_hash
+            self.update_content_plot(plot_state, slot_states, dslist)
+
     def update_content_plot(self, plot_state, slot_states, dslist):
         # abbreviations
         gen = plot_state["general"]
@@ -167,7 +178,7 @@ class PipelinePlot(QtWidgets.QWidget):
 
         # limits in case of scatter plot and feature hue
         if lay["division"] == "merge":
-            pp = PipelinePlotItem(parent=linner)
+            pp = PipelinePlotItem(parent=linner, pipeline=self.pipeline)
             self.plot_items.append(pp)
             linner.addItem(item=pp,
                            row=None,
@@ -181,7 +192,7 @@ class PipelinePlot(QtWidgets.QWidget):
                 # get the hash flag
                 hash_flag = get_hash_flag(hash_set, ds)
 
-                pp = PipelinePlotItem(parent=linner)
+                pp = PipelinePlotItem(parent=linner, pipeline=self.pipeline)
                 self.plot_items.append(pp)
                 linner.addItem(item=pp,
                                row=None,
@@ -201,7 +212,7 @@ class PipelinePlot(QtWidgets.QWidget):
                 # get the hash flag
                 hash_flag = get_hash_flag(hash_set, ds)
 
-                pp = PipelinePlotItem(parent=linner)
+                pp = PipelinePlotItem(parent=linner, pipeline=self.pipeline)
                 self.plot_items.append(pp)
                 linner.addItem(item=pp,
                                row=None,
@@ -215,7 +226,7 @@ class PipelinePlot(QtWidgets.QWidget):
             # contour plot
             plot_state_contour = copy.deepcopy(plot_state)
             plot_state_contour["scatter"]["enabled"] = False
-            pp = PipelinePlotItem(parent=linner)
+            pp = PipelinePlotItem(parent=linner, pipeline=self.pipeline)
             self.plot_items.append(pp)
             linner.addItem(item=pp,
                            row=None,
@@ -227,7 +238,15 @@ class PipelinePlot(QtWidgets.QWidget):
         # colorbar
         colorbar_kwds = {}
 
-        if sca["marker hue"] == "kde":
+        if sca["mode"] == "density image":
+            if not (lay["division"] == "merge"
+                    or sca["marker hue"] in ["dataset", "none"]):
+                colorbar_kwds["values"] = (0, 1)
+                if sca["density scale"] == "log":
+                    colorbar_kwds["label"] = "event density (log) [a.u.]"
+                else:
+                    colorbar_kwds["label"] = "event density [a.u.]"
+        elif sca["marker hue"] == "kde":
             colorbar_kwds["values"] = (0, 1)
             colorbar_kwds["label"] = "density [a.u.]"
         elif sca["marker hue"] == "feature":
@@ -247,7 +266,7 @@ class PipelinePlot(QtWidgets.QWidget):
 
         if colorbar_kwds:
             # add colorbar
-            cmap = pg.ColorMap(*zip(*Gradients[sca["colormap"]]["ticks"]))
+            cmap = colormaps.get_colormap(sca["colormap"])
             colorbar = ShapeOutColorBarItem(
                 yoffset=31,  # this is heuristic
                 height=min(300, lay["size y"] // 2),
@@ -264,8 +283,11 @@ class PipelinePlot(QtWidgets.QWidget):
 
 
 class PipelinePlotItem(SimplePlotItem):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, pipeline=None, *args, **kwargs):
         super(PipelinePlotItem, self).__init__(*args, **kwargs)
+        #: pipeline of the plotted datasets (used for updating density
+        #: images when the plot is resized)
+        self.pipeline = pipeline
         # circumvent problems with removed plots
         self.setAcceptHoverEvents(False)
         # Disable user interaction
@@ -314,6 +336,8 @@ class PipelinePlotItem(SimplePlotItem):
         # Remove everything
         for el in self._plot_elements:
             self.removeItem(el)
+            if isinstance(el, DensityImageItem):
+                el.disconnect_view()
 
         if not dslist:
             return
@@ -346,12 +370,21 @@ class PipelinePlotItem(SimplePlotItem):
         sca = plot_state["scatter"]
         if sca["enabled"]:
             for rtdc_ds, ss in zip(dslist, slot_states):
-                sct = add_scatter(plot_item=self,
-                                  rtdc_ds=rtdc_ds,
-                                  plot_state=plot_state,
-                                  slot_state=ss,
-                                  hash_flag=hash_flag
-                                  )
+                if sca["mode"] == "density image":
+                    sct = add_density_image(plot_item=self,
+                                            rtdc_ds=rtdc_ds,
+                                            plot_state=plot_state,
+                                            slot_state=ss,
+                                            hash_flag=hash_flag,
+                                            pipeline=self.pipeline,
+                                            )
+                else:
+                    sct = add_scatter(plot_item=self,
+                                      rtdc_ds=rtdc_ds,
+                                      plot_state=plot_state,
+                                      slot_state=ss,
+                                      hash_flag=hash_flag
+                                      )
                 self._plot_elements += sct
         # Contour data
         if plot_state["contour"]["enabled"]:
@@ -384,8 +417,12 @@ class PipelinePlotItem(SimplePlotItem):
                           )
 
                 if plot_state["scatter"]["show event count"]:
+                    if plot_state["scatter"]["mode"] == "density image":
+                        num_events = sct[0].event_count
+                    else:
+                        num_events = len(sct[0].data)
                     if True:
-                        add_label(text=f"{len(sct[0].data)} events",
+                        add_label(text=f"{num_events} events",
                                   anchor_parent=self.axes["right"]["item"],
                                   font_size_diff=-1,
                                   color="black",
@@ -408,6 +445,153 @@ class PipelinePlotItem(SimplePlotItem):
                           )
 
 
+class DensityImageItem(pg.ImageItem):
+    def __init__(self, plot_item, plot_state, rtdc_ds, slot_state,
+                 pipeline=None):
+        """Image of the 2D histogram of all events at screen resolution
+
+        If `pipeline` is given, the histogram is recomputed (with
+        a short delay) when the size of the view box changes. The
+        dataset is then fetched from the pipeline (`rtdc_ds` is not
+        kept, because the dataset might be closed in the meantime).
+        With the "merge" division or the "dataset" marker hue, the
+        dataset color is used and the density defines the opacity
+        (black is used for the marker hue "none"). Otherwise, the
+        density is mapped to the plot colormap.
+        """
+        super(DensityImageItem, self).__init__(axisOrder="row-major")
+        self.plot_item = plot_item
+        self.plot_state = plot_state
+        self.slot_state = slot_state
+        self.pipeline = pipeline
+        #: number of events shown in the image
+        self.event_count = 0
+        self._bins = None
+        # identifies the filtered events of `rtdc_ds`
+        self._dataset_key = plot_cache.get_dataset_key(rtdc_ds)
+        gen = plot_state["general"]
+        self.range_x = get_view_range(gen["range x"], gen["scale x"])
+        self.range_y = get_view_range(gen["range y"], gen["scale y"])
+        self.update_image(rtdc_ds)
+        self._resize_timer = None
+        if pipeline is not None:
+            # update image resolution when the plot is resized
+            self._resize_timer = QtCore.QTimer(self)
+            self._resize_timer.setSingleShot(True)
+            self._resize_timer.setInterval(200)
+            self._resize_timer.timeout.connect(self.on_view_resized)
+            self.plot_item.vb.sigResized.connect(self._resize_timer.start)
+
+    def disconnect_view(self):
+        """Stop updating the image when the plot is resized"""
+        if self._resize_timer is not None:
+            self.plot_item.vb.sigResized.disconnect(self._resize_timer.start)
+            self._resize_timer.stop()
+            self._resize_timer = None
+
+    def get_counts(self, rtdc_ds, bins):
+        """Return the histogram of `rtdc_ds` for the current plot"""
+        gen = self.plot_state["general"]
+        return plot_cache.get_density_image_data(
+            rtdc_ds=rtdc_ds,
+            xax=gen["axis x"],
+            yax=gen["axis y"],
+            xscale=gen["scale x"],
+            yscale=gen["scale y"],
+            range_x=[float(r) for r in self.range_x],
+            range_y=[float(r) for r in self.range_y],
+            bins=bins,
+        )
+
+    def get_counts_from_pipeline(self, bins):
+        """Return the histogram using the dataset from the pipeline
+
+        Returns None if the slot was removed from the pipeline or
+        if its filtered events changed (the plot is redrawn then).
+        """
+        pipeline = self.pipeline
+        slot_id = self.slot_state["identifier"]
+        with pipeline.dataset_lock.writing():
+            if slot_id not in pipeline.slot_ids:
+                return None
+            slot = pipeline.get_slot(slot_id)
+            with handle_pool.pinned([slot]):
+                rtdc_ds = pipeline.get_dataset(
+                    pipeline.slot_ids.index(slot_id))
+                if plot_cache.get_dataset_key(rtdc_ds) != self._dataset_key:
+                    return None
+                return self.get_counts(rtdc_ds, bins)
+
+    def get_rgba(self, counts):
+        """Convert event counts to an RGBA image"""
+        lay = self.plot_state["layout"]
+        sca = self.plot_state["scatter"]
+        if sca["density scale"] == "log":
+            density = np.log1p(counts)
+        else:
+            density = np.array(counts, dtype=float)
+        if density.max() > 0:
+            density /= density.max()
+        if lay["division"] == "merge" or sca["marker hue"] == "dataset":
+            color = pg.mkColor(self.slot_state["color"])
+        elif sca["marker hue"] == "none":
+            color = pg.mkColor("#000000")
+        else:
+            color = None
+        if color is None:
+            rgba = colormaps.map_to_rgba(density.ravel(), sca["colormap"])
+            rgba = rgba.reshape(counts.shape + (4,))
+        else:
+            rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+            rgba[..., :3] = color.getRgb()[:3]
+            # make sure that single events are visible
+            rgba[..., 3] = (0.2 + 0.8 * density) * 255
+        rgba[counts == 0, 3] = 0
+        return rgba
+
+    @QtCore.pyqtSlot()
+    def on_view_resized(self):
+        if self.scene() is None:
+            # the image was removed from the plot
+            self.disconnect_view()
+        else:
+            self.update_image()
+
+    def update_image(self, rtdc_ds=None):
+        """Compute the histogram with one bin per screen pixel
+
+        If `rtdc_ds` is None, the dataset is fetched from the
+        pipeline. No image is shown if the plot range is empty or
+        not finite (e.g. for log scales when there are no positive
+        values).
+        """
+        vb = self.plot_item.vb
+        bins = (max(int(vb.width()), 1), max(int(vb.height()), 1))
+        if bins == self._bins:
+            return
+        if not (np.all(np.isfinite(self.range_x))
+                and np.all(np.isfinite(self.range_y))
+                and self.range_x[1] > self.range_x[0]
+                and self.range_y[1] > self.range_y[0]):
+            self._bins = bins
+            self.event_count = 0
+            self.clear()
+            return
+        if rtdc_ds is None:
+            counts = self.get_counts_from_pipeline(bins)
+            if counts is None:
+                return
+        else:
+            counts = self.get_counts(rtdc_ds, bins)
+        self._bins = bins
+        self.event_count = int(counts.sum())
+        self.setImage(self.get_rgba(counts))
+        self.setRect(QtCore.QRectF(self.range_x[0],
+                                   self.range_y[0],
+                                   self.range_x[1] - self.range_x[0],
+                                   self.range_y[1] - self.range_y[0]))
+
+
 def add_label(text, anchor_parent, text_halign="center", text_valign="center",
               font_size_diff=0, color=None, dx=0, dy=0):
     """Add a graphics label anchored to another item
@@ -513,35 +697,46 @@ def add_contour(plot_item, plot_state, rtdc_ds, slot_state, legend=None):
 def add_isoelastics(plot_item, axis_x, axis_y, channel_width, pixel_size,
                     lut_identifier=None):
     elements = []
-    isodef = dclab.isoelastics.get_default()
-    # We do not use isodef.get_with_rtdcbase, because then the
-    # isoelastics would be shifted according to flow rate and.
-    # viscosity. We could do it, but for visualization there is
-    # really no need and also, the plots then look the same as
-    # in Shape-Out 1.
-    try:
-        iso = isodef.get(
-            lut_identifier=lut_identifier if lut_identifier
-            else "LE-2D-FEM-19",
-            channel_width=channel_width,
-            flow_rate=None,
-            viscosity=None,
-            col1=axis_x,
-            col2=axis_y,
-            add_px_err=True,
-            px_um=pixel_size)
-    except KeyError:
-        pass
-    else:
-        for ss in iso:
-            iline = pg.PlotDataItem(x=ss[:, 0], y=ss[:, 1])
-            plot_item.addItem(iline)
-            elements.append(iline)
-            # send them to the back
-            iline.setZValue(-100)
+    lines = get_isoelastics(axis_x=axis_x,
+                            axis_y=axis_y,
+                            channel_width=channel_width,
+                            pixel_size=pixel_size,
+                            lut_identifier=lut_identifier)
+    if lines is not None:
+        # all lines in one item (a log scale is applied by pyqtgraph)
+        iline = pg.PlotDataItem(x=lines[:, 0], y=lines[:, 1],
+                                connect="finite")
+        plot_item.addItem(iline)
+        elements.append(iline)
+        # send them to the back
+        iline.setZValue(-100)
     return elements
 
 
+def add_density_image(plot_item, plot_state, rtdc_ds, slot_state,
+                      hash_flag=None, pipeline=None):
+    """Show all events of a dataset as a 2D histogram image"""
+    image = DensityImageItem(plot_item=plot_item,
+                             plot_state=plot_state,
+                             rtdc_ds=rtdc_ds,
+                             slot_state=slot_state,
+                             pipeline=pipeline)
+    plot_item.addItem(image)
+    image.setZValue(-50)
+
+    # add dcnum hash label
+    if hash_flag:
+        add_label(
+            hash_flag,
+            anchor_parent=plot_item.axes["top"]["item"],
+            font_size_diff=-1,
+            color="red",
+            text_halign="left",
+            text_valign="top",
+        )
+    return [image]
+
+
 def add_scatter(plot_item, plot_state, rtdc_ds, slot_state, hash_flag):
     gen = plot_state["general"]
     sca = plot_state["scatter"]
@@ -552,46 +747,20 @@ def add_scatter(plot_item, plot_state, rtdc_ds, slot_state, hash_flag):
     scatter.setAcceptHoverEvents(False)
     plot_item.addItem(scatter)
 
+    x, y, kde, idx = compute_scatter_data(plot_state=plot_state,
+                                          rtdc_ds=rtdc_ds)
     if sca["marker hue"] == "kde":
-        kde_type = gen["kde"]
-    else:
-        kde_type = "none"
-
-    x, y, kde, idx = plot_cache.get_scatter_data(
-        rtdc_ds=rtdc_ds,
-        downsample=sca["downsample"] * sca["downsampling value"],
-        xax=gen["axis x"],
-        yax=gen["axis y"],
-        xscale=gen["scale x"],
-        yscale=gen["scale y"],
-        kde_type=kde_type,
-    )
-    # define colormap
-    # TODO:
-    # - common code base with QuickView
-    cmap = pg.ColorMap(*zip(*Gradients[sca["colormap"]]["ticks"]))
-    if sca["marker hue"] == "kde":
-        brush = []
         # Note: we don't expand the density to [0, 1], because the
         # colorbar will show "density" and because we don want to
         # compute the density in this function and not someplace else.
-        for k in kde:
-            brush.append(cmap.mapToQColor(k))
-        # Note, colors could also be digitized (does not seem to be faster):
-        # cbin = np.linspace(0, 1, 1000)
-        # dig = np.digitize(kde, cbin)
-        # for idx in dig:
-        #     brush.append(cmap.mapToQColor(cbin[idx]))
+        brush = colormaps.map_to_brushes(kde, sca["colormap"])
     elif sca["marker hue"] == "feature":
-        brush = []
-        feat = np.asarray(rtdc_ds[sca["hue feature"]][idx], dtype=float)
-        feat -= sca["hue min"]
-        feat /= sca["hue max"] - sca["hue min"]
-        for f in feat:
-            if np.isnan(f):
-                brush.append(pg.mkColor("#FF0000"))
-            else:
-                brush.append(cmap.mapToQColor(f))
+        feat = rtdc_ds[sca["hue feature"]][idx]
+        brush = colormaps.map_to_brushes(feat,
+                                         sca["colormap"],
+                                         vmin=sca["hue min"],
+                                         vmax=sca["hue max"],
+                                         nan_color="#FF0000")
     elif sca["marker hue"] == "dataset":
         alpha = int(sca["marker alpha"] * 255)
         colord = pg.mkColor(slot_state["color"])
@@ -625,7 +794,7 @@ def add_scatter(plot_item, plot_state, rtdc_ds, slot_state, hash_flag):
     return [scatter]
 
 
-def compute_contours(plot_state, rtdc_ds):
+def compute_contours(plot_state, rtdc_ds, apply_filter=True):
     gen = plot_state["general"]
     con = plot_state["contour"]
     contours = plot_cache.get_contour_data(
@@ -637,11 +806,42 @@ def compute_contours(plot_state, rtdc_ds):
         xscale=gen["scale x"],
         yscale=gen["scale y"],
         kde_type=gen["kde"],
-        quantiles=[p/100 for p in con["percentiles"]]
+        quantiles=[p/100 for p in con["percentiles"]],
+        apply_filter=apply_filter,
     )
     return contours
 
 
+def compute_scatter_data(plot_state, rtdc_ds, apply_filter=True):
+    gen = plot_state["general"]
+    sca = plot_state["scatter"]
+    if sca["marker hue"] == "kde":
+        kde_type = gen["kde"]
+    else:
+        kde_type = "none"
+
+    range_x = gen["range x"]
+    range_y = gen["range y"]
+    if (gen["auto range"]
+            or range_x[0] == range_x[1] or range_y[0] == range_y[1]):
+        # all events are visible
+        range_x = range_y = None
+
+    x, y, kde, idx = plot_cache.get_scatter_data(
+        rtdc_ds=rtdc_ds,
+        downsample=sca["downsample"] * sca["downsampling value"],
+        xax=gen["axis x"],
+        yax=gen["axis y"],
+        xscale=gen["scale x"],
+        yscale=gen["scale y"],
+        kde_type=kde_type,
+        range_x=range_x,
+        range_y=range_y,
+        apply_filter=apply_filter,
+    )
+    return x, y, kde, idx
+
+
 def compute_contour_opening_angles(plot_state, contour):
     """For each point of the contour, compute the opening angle
 
@@ -738,29 +938,73 @@ def set_viewbox(plot, range_x, range_y, scale_x="linear", scale_y="linear",
     # Set Log scale
     plot.setLogMode(x=scale_x == "log",
                     y=scale_y == "log")
-    range_x = np.array(range_x)
-    range_y = np.array(range_y)
-    if scale_x == "log":
-        if range_x[0] <= 0:
-            if range_x[1] > 10:
-                range_x[0] = 1e-1
-            else:
-                range_x[0] = 1e-3
-        range_x = np.log10(range_x)
-    if scale_y == "log":
-        if range_y[0] <= 0:
-            if range_y[1] > 10:
-                range_y[0] = 1e-1
-            else:
-                range_y[0] = 1e-3
-        range_y = np.log10(range_y)
     # Set Range
-    plot.setRange(xRange=range_x,
-                  yRange=range_y,
+    plot.setRange(xRange=get_view_range(range_x, scale_x),
+                  yRange=get_view_range(range_y, scale_y),
                   padding=padding,
                   )
 
 
+@functools.lru_cache(maxsize=32)
+def get_isoelastics(axis_x, axis_y, channel_width, pixel_size,
+                    lut_identifier=None):
+    """Return the isoelastics for a plot configuration
+
+    Returns
+    -------
+    lines: 2d ndarray of shape (N, 2) or None
+        All isoelastic lines in one array, separated by rows of
+        NaN values (for `pg.PlotDataItem(..., connect="finite")`);
+        None if there are no isoelastics for the given axes
+    """
+    isodef = dclab.isoelastics.get_default()
+    # We do not use isodef.get_with_rtdcbase, because then the
+    # isoelastics would be shifted according to flow rate and.
+    # viscosity. We could do it, but for visualization there is
+    # really no need and also, the plots then look the same as
+    # in Shape-Out 1.
+    try:
+        iso = isodef.get(
+            lut_identifier=lut_identifier if lut_identifier
+            else "LE-2D-FEM-19",
+            channel_width=channel_width,
+            flow_rate=None,
+            viscosity=None,
+            col1=axis_x,
+            col2=axis_y,
+            add_px_err=True,
+            px_um=pixel_size)
+    except KeyError:
+        return None
+    if not iso:
+        return None
+    parts = []
+    for ss in iso:
+        parts.append(ss[:, :2])
+        parts.append(np.full((1, 2), np.nan))
+    lines = np.concatenate(parts[:-1])
+    lines.flags.writeable = False
+    return lines
+
+
+def get_view_range(data_range, scale="linear"):
+    """Convert a plot range to view box coordinates
+
+    For log scales, the base-10 logarithm is returned and
+    non-positive lower limits are replaced with a sensible value.
+    """
+    data_range = np.array(data_range)
+    if scale == "log":
+        if data_range[0] <= 0:
+            if data_range[1] > 10:
+                data_range[0] = 1e-1
+            else:
+                data_range[0] = 1e-3
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data_range = np.log10(data_range)
+    return data_range
+
+
 def get_hash_flag(hash_set, rtdc_ds):
     """Helper function to determine the hash flag based on the dataset and
     hash set."""
@@ -0,0 +1,194 @@
+"""Compute the data of all plot windows in a worker pool"""
+import concurrent.futures
+import os
+import threading
+
+from PyQt6 import QtCore
+
+from ..pipeline.handle_pool import handle_pool
+from . import pipeline_plot
+
+
+class PlotPrefetcher(QtCore.QObject):
+    #: Emitted with the generation of the jobs when all jobs of the
+    #: current generation are done (in the thread of the prefetcher)
+    finished = QtCore.pyqtSignal(int)
+
+    def __init__(self, max_workers=None, *args, **kwargs):
+        """Compute plot data (scatter and contours) in background threads
+
+        The results are stored in :mod:`shapeout2.plot_cache`, where
+        the plot windows pick them up when they are updated after
+        :const:`PlotPrefetcher.finished` was emitted. Each call to
+        :func:`prefetch` cancels the jobs of previous calls. Jobs
+        that are already running are not waited for; they check
+        the generation between their steps and stop if they are
+        stale.
+
+        Notes
+        -----
+        dclab datasets must not be modified while they are being
+        accessed in the worker threads. The jobs therefore apply
+        the filters while holding
+        :const:`shapeout2.pipeline.Pipeline.dataset_lock` for
+        writing and compute the plot data while holding it for
+        reading. If the pipeline is modified while the filters are
+        applied, the job is stale and stops.
+        """
+        super(PlotPrefetcher, self).__init__(*args, **kwargs)
+        if max_workers is None:
+            max_workers = min(8, os.cpu_count() or 1)
+        #: maximum number of worker threads
+        self.max_workers = max_workers
+        #: incremented with every new set of jobs (stale jobs are skipped)
+        self.generation = 0
+        self._executor = None
+        self._futures = []
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Cancel all pending jobs
+
+        Running jobs are not waited for. They stop at their next
+        generation check and their results are not reported.
+        """
+        with self._lock:
+            self.generation += 1
+            futures = self._futures
+            self._futures = []
+            self._pending = 0
+        for future in futures:
+            future.cancel()
+
+    def on_job_done(self, generation, slot=None):
+        """Called when a job is done or was cancelled"""
+        if slot is not None:
+            handle_pool.unpin(slot)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._pending -= 1
+            done = self._pending == 0
+        if done:
+            self.finished.emit(generation)
+
+    def prefetch(self, pipeline, plot_ids, wait=False):
+        """Compute the plot data of the given plots in the worker pool
+
+        Parameters
+        ----------
+        pipeline: shapeout2.pipeline.Pipeline
+            The current pipeline
+        plot_ids: list of str
+            Identifiers of the plots to compute
+        wait: bool
+            Whether to wait until all jobs are finished
+
+        Returns
+        -------
+        generation: int
+            Generation of the jobs (see :const:`finished`)
+        """
+        self.cancel()
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="PlotPrefetcher")
+        # This checks the contour spacing and may thus modify the plots
+        # (must be done in this thread).
+        plot_states = [pipeline.get_plot(plot_id).__getstate__()
+                       for plot_id in plot_ids]
+        revision = pipeline.revision
+        with self._lock:
+            generation = self.generation
+            self._pending = len(plot_ids)
+            futures = []
+            for plot_id, plot_state in zip(plot_ids, plot_states):
+                futures.append(self._executor.submit(
+                    self.run_plot_job, generation, pipeline, revision,
+                    plot_id, plot_state))
+            self._futures += futures
+        # The callbacks are added without holding the lock, because
+        # they are called immediately for jobs that are already done.
+        for future in futures:
+            future.add_done_callback(
+                lambda _: self.on_job_done(generation))
+        if not plot_ids:
+            self.finished.emit(generation)
+        if wait:
+            self.wait()
+        return generation
+
+    def run_plot_job(self, generation, pipeline, revision, plot_id,
+                     plot_state):
+        """Apply the filters of one plot and submit its jobs (worker)
+
+        For each dataset of the plot, a job computing the plot data
+        (see :func:`run_job`) is submitted.
+        """
+        with pipeline.dataset_lock.writing():
+            if (generation != self.generation
+                    or pipeline.revision != revision):
+                # The pipeline was modified in the meantime; there is
+                # (or will be) a new set of jobs.
+                return
+            dslist, slot_states = pipeline.get_plot_datasets(plot_id)
+            if pipeline.revision != revision:
+                # The pipeline was modified while the filters were
+                # applied (the datasets might not be consistent).
+                return
+            slots = [pipeline.get_slot(ss["identifier"])
+                     for ss in slot_states]
+            with self._lock:
+                if generation != self.generation:
+                    return
+                self._pending += len(dslist)
+                futures = []
+                for rtdc_ds, slot in zip(dslist, slots):
+                    # do not close the dataset until the job is done
+                    handle_pool.pin(slot)
+                    futures.append(self._executor.submit(
+                        self.run_job, generation, plot_state, rtdc_ds,
+                        pipeline.dataset_lock))
+                self._futures += futures
+        for future, slot in zip(futures, slots):
+            future.add_done_callback(
+                lambda _, slot=slot: self.on_job_done(generation, slot))
+
+    def run_job(self, generation, plot_state, rtdc_ds, dataset_lock):
+        """Compute the plot data of one dataset (run in a worker)"""
+        sca = plot_state["scatter"]
+        con = plot_state["contour"]
+        with dataset_lock.reading():
+            if (generation == self.generation
+                    and sca["enabled"] and sca["mode"] == "markers"):
+                pipeline_plot.compute_scatter_data(plot_state=plot_state,
+                                                   rtdc_ds=rtdc_ds,
+                                                   apply_filter=False)
+            if generation == self.generation and con["enabled"]:
+                pipeline_plot.compute_contours(plot_state=plot_state,
+                                               rtdc_ds=rtdc_ds,
+                                               apply_filter=False)
+
+    def shutdown(self):
+        """Cancel all jobs and stop the worker threads"""
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def wait(self):
+        """Wait until all jobs are finished
+
+        Errors in jobs are ignored; they are raised again when the
+        plot windows compute the missing data themselves.
+        """
+        while True:
+            # jobs may submit new jobs
+            with self._lock:
+                futures = [ff for ff in self._futures if not ff.done()]
+                self._futures = futures
+            if not futures:
+                break
+            concurrent.futures.wait(futures)
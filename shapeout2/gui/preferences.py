@@ -12,6 +12,66 @@ from PyQt6.QtCore import QStandardPaths
 
 from .widgets import show_wait_cursor
 from ..extensions import ExtensionManager, SUPPORTED_FORMATS
+from .. import plot_cache
+from ..meta_index import meta_index
+from ..pipeline.handle_pool import handle_pool
+from ..pipeline.mask_store import mask_store
+
+
+def _get_cache_dir():
+    """Return the user cache directory of Shape-Out"""
+    return pathlib.Path(
+        QStandardPaths.writableLocation(
+            QStandardPaths.StandardLocation.CacheLocation))
+
+
+def apply_handle_pool_settings(settings):
+    """Set the maximum number of opened files from `settings`
+
+    (see :mod:`shapeout2.pipeline.handle_pool`)
+    """
+    handle_pool.set_max_open(
+        int(settings.value("advanced/max open files", 256)))
+
+
+def apply_meta_index_settings(settings):
+    """Configure the persistent metadata index from `settings`
+
+    (see :mod:`shapeout2.meta_index`)
+    """
+    meta_index.set_max_measurements(
+        int(settings.value("advanced/meta index size", 10000)))
+    if int(settings.value("advanced/meta index", 1)):
+        path = _get_cache_dir() / "meta_index.sqlite"
+        if meta_index.path != path:
+            meta_index.set_path(path)
+    else:
+        meta_index.set_path(None)
+
+
+def apply_plot_cache_settings(settings):
+    """Configure the plot data caches from `settings`
+
+    (see :mod:`shapeout2.plot_cache`)
+    """
+    plot_cache.cache_data.set_max_bytes(
+        int(settings.value("advanced/plot cache size", 1024)) * 1024**2)
+    plot_cache.disk_cache.set_max_bytes(
+        int(settings.value("advanced/plot disk cache size", 4096)) * 1024**2)
+    if int(settings.value("advanced/plot disk cache", 0)):
+        plot_cache.disk_cache.set_path(_get_cache_dir() / "plot_data")
+    else:
+        plot_cache.disk_cache.set_path(None)
+
+
+def apply_mask_store_settings(settings):
+    """Set the directory of the filter mask store from `settings`
+
+    Filter masks are only kept in memory if no directory is set
+    (see :mod:`shapeout2.pipeline.mask_store`).
+    """
+    path = settings.value("advanced/filter mask dir", "")
+    mask_store.set_path(path or None)
 
 
 class ExtensionErrorWrapper:
@@ -55,6 +115,17 @@ class Preferences(QtWidgets.QDialog):
         #: configuration keys, corresponding widgets, and defaults
         self.config_pairs = [
             ["advanced/developer mode", self.advanced_developer_mode, "0"],
+            ["advanced/filter mask dir", self.advanced_filter_mask_dir, ""],
+            ["advanced/max open files", self.advanced_max_open_files,
+             "256"],
+            ["advanced/meta index", self.advanced_meta_index, "1"],
+            ["advanced/meta index size", self.advanced_meta_index_size,
+             "10000"],
+            ["advanced/plot cache size", self.advanced_plot_cache_size,
+             "1024"],
+            ["advanced/plot disk cache", self.advanced_plot_disk_cache, "0"],
+            ["advanced/plot disk cache size",
+             self.advanced_plot_disk_cache_size, "4096"],
             ["check for updates", self.general_check_for_updates, "1"],
             ["dcor/api key", self.dcor_api_key, ""],
             ["dcor/servers", self.dcor_servers, ["dcor.mpl.mpg.de"]],
@@ -109,6 +180,8 @@ class Preferences(QtWidgets.QDialog):
                 widget.setChecked(bool(int(value)))
             elif isinstance(widget, QtWidgets.QLineEdit):
                 widget.setText(value)
+            elif isinstance(widget, QtWidgets.QSpinBox):
+                widget.setValue(int(value))
             elif widget is self.dcor_servers:
                 self.dcor_servers.clear()
                 self.dcor_servers.addItems(value)
@@ -338,6 +411,8 @@ class Preferences(QtWidgets.QDialog):
                         msg.exec()
             elif isinstance(widget, QtWidgets.QLineEdit):
                 value = widget.text().strip()
+            elif isinstance(widget, QtWidgets.QSpinBox):
+                value = widget.value()
             elif widget is self.dcor_servers:
                 curtext = self.dcor_servers.currentText()
                 items = self.settings.value(key, default)
@@ -356,6 +431,12 @@ class Preferences(QtWidgets.QDialog):
                 raise NotImplementedError("No rule for '{}'".format(key))
             self.settings.setValue(key, value)
 
+        # apply settings that take effect immediately
+        apply_handle_pool_settings(self.settings)
+        apply_mask_store_settings(self.settings)
+        apply_meta_index_settings(self.settings)
+        apply_plot_cache_settings(self.settings)
+
         # reload UI to give visual feedback
         self.reload()
 
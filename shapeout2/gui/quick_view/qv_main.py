@@ -11,6 +11,10 @@ from scipy.ndimage import binary_erosion
 
 from ..compute.comp_stats import STAT_METHODS
 from ... import idiom
+from ...pipeline import Filter
+from ...pipeline.filter_ray import get_mask_fingerprint, set_mask_fingerprint
+from ...pipeline.handle_pool import handle_pool
+from ...util import hashobj
 from ..widgets import show_wait_cursor
 
 
@@ -199,7 +203,7 @@ class QuickView(QtWidgets.QWidget):
         self._rtdc_ds = None
         #: A cache for the event index plotted for a dataset
         self._dataset_event_plot_indices_cache = {}
-        self.slot = None
+        self._slot = None
 
         self._statistics_cache = collections.OrderedDict()
 
@@ -320,7 +324,7 @@ class QuickView(QtWidgets.QWidget):
                 self._rtdc_ds = None
         # now check again
         if self._rtdc_ds is None:
-            self._set_initial_ui()
+            self.clear_dataset()
         return self._rtdc_ds
 
     @rtdc_ds.setter
@@ -341,6 +345,28 @@ class QuickView(QtWidgets.QWidget):
         self.comboBox_y.set_dataset(rtdc_ds)
         self.comboBox_z_hue.set_dataset(rtdc_ds)
 
+    @property
+    def slot(self):
+        """Slot of the dataset shown; set to None if the file is closed"""
+        return self._slot
+
+    @slot.setter
+    def slot(self, slot):
+        # The dataset shown must not be closed by the handle pool,
+        # because `self.rtdc_ds` is a hierarchy child of it.
+        if slot is not self._slot:
+            if slot is not None:
+                handle_pool.pin(slot)
+            if self._slot is not None:
+                handle_pool.unpin(self._slot)
+        self._slot = slot
+
+    def clear_dataset(self):
+        """Stop showing the current dataset and release its slot"""
+        self._rtdc_ds = None
+        self.slot = None
+        self._set_initial_ui()
+
     # Showing image data
     ####################
     def get_event_image(self, ds, event, feat="image"):
@@ -526,7 +552,7 @@ class QuickView(QtWidgets.QWidget):
             # cache statistics from
             dsid = "-".join(features
                             + [self.rtdc_ds.identifier,
-                               self.rtdc_ds.filter._parent_hash]
+                               get_mask_fingerprint(self.rtdc_ds)]
                             )
             if dsid not in self._statistics_cache:
                 stats = dclab.statistics.get_statistics(ds=self.rtdc_ds,
@@ -698,6 +724,8 @@ class QuickView(QtWidgets.QWidget):
             pf.name = name
             pf.inverted = inverted
             pf.points = points
+            # the filters that use `pf` are modified as well
+            Filter.mark_polygon_filter_modified(idp)
             mode = "modify"
         self.on_poly_done(mode)
 
@@ -973,6 +1001,7 @@ class QuickView(QtWidgets.QWidget):
     @QtCore.pyqtSlot(object, object)
     def show_rtdc(self, rtdc_ds, slot):
         """Display an RT-DC measurement given by `path` and `filters`"""
+        self.slot = slot
         if np.all(rtdc_ds.filter.all) and rtdc_ds.format == "hierarchy":
             # No filers applied, no additional hierarchy child required.
             self.rtdc_ds = rtdc_ds
@@ -982,6 +1011,9 @@ class QuickView(QtWidgets.QWidget):
             self.rtdc_ds = dclab.new_dataset(
                 rtdc_ds,
                 identifier=f"child-of-{rtdc_ds.identifier}")
+            set_mask_fingerprint(
+                self.rtdc_ds,
+                hashobj(["child-of", get_mask_fingerprint(rtdc_ds)]))
         event_count = self.rtdc_ds.config["experiment"]["event count"]
         if event_count == 0:
             self.enable_interface(False)
@@ -999,8 +1031,6 @@ class QuickView(QtWidgets.QWidget):
         # remove event state (ill-defined for different datasets)
         state.pop("event")
 
-        self.slot = slot
-
         # check whether axes exist in ds and change them to defaults
         # if necessary
         ds_features = sorted(self.rtdc_ds.features_scalar)
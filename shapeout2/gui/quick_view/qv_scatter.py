@@ -1,10 +1,10 @@
 import numpy as np
 from PyQt6 import QtCore
 import pyqtgraph as pg
-from pyqtgraph.graphicsItems.GradientEditorItem import Gradients
 
 from ... import plot_cache
 
+from .. import colormaps
 from .. import pipeline_plot
 from ..widgets import SimplePlotWidget, SimpleViewBox
 
@@ -119,22 +119,18 @@ class QuickViewScatterWidget(SimplePlotWidget):
         self.data_x = self.rtdc_ds[self.xax]
         #: unfiltered y data
         self.data_y = self.rtdc_ds[self.yax]
-        if self.hue_type == "none":
-            brush = "k"
+        if self.hue_type == "kde":
+            brush = colormaps.map_to_brushes(kde, "viridis")
+        elif self.hue_type == "feature":
+            fdata = self.rtdc_ds[self.hue_kwargs["feat"]][idx]
+            if fdata.size and not np.all(np.isnan(fdata)):
+                vmin, vmax = np.nanmin(fdata), np.nanmax(fdata)
+            else:
+                vmin, vmax = 0, 1
+            brush = colormaps.map_to_brushes(fdata, "viridis",
+                                             vmin=vmin, vmax=vmax)
         else:
-            # define colormap
-            brush = []
-            cmap = pg.ColorMap(*zip(*Gradients["viridis"]["ticks"]))
-            if self.hue_type == "kde":
-                for k in kde:
-                    brush.append(cmap.mapToQColor(k))
-            elif self.hue_type == "feature":
-                fdata = self.rtdc_ds[self.hue_kwargs["feat"]][idx]
-                fdata -= fdata.min()
-                fdata = np.array(fdata, dtype=float)  # cast int to float
-                fdata /= fdata.max()
-                for f in fdata:
-                    brush.append(cmap.mapToQColor(f))
+            brush = "k"
 
         if x.size:  # test for empty x/y (#37)
             # set viewbox
@@ -56,6 +56,9 @@ class RangeControl(QtWidgets.QWidget):
         font = self.label.font()
         font.setPointSize(font.pointSize()-1)
         self.label.setFont(font)
+        self.label_count.setFont(font)
+        # event count is only shown if set via `setCount`
+        self.label_count.hide()
 
         # signals
         self.range_slider.rangeChanged.connect(self.on_range)
@@ -186,6 +189,17 @@ class RangeControl(QtWidgets.QWidget):
     def setActive(self, b=True):
         self.checkBox.setChecked(b)
 
+    def setCount(self, count):
+        """Show the number of events in the current range
+
+        Set `count` to None to hide the event count.
+        """
+        if count is None:
+            self.label_count.hide()
+        else:
+            self.label_count.setText(f"{count}")
+            self.label_count.show()
+
     def setCheckable(self, b=True):
         self.checkBox.setVisible(b)
 
@@ -0,0 +1,163 @@
+"""Additional kernel density estimators for plotting"""
+from dclab.kde import KernelDensityEstimator as DCLabKDE
+from dclab.kde.methods import ignore_nan_inf
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+
+#: default number of grid cells per axis for :func:`kde_binned`
+BINNED_GRID_SIZE = 256
+
+
+@ignore_nan_inf
+def kde_binned(events_x, events_y, xout=None, yout=None, bins=None,
+               bw=None):
+    """Binned approximate Gaussian Kernel Density Estimation
+
+    The events are binned on a regular grid, the grid is smoothed
+    with a separable Gaussian filter, and the density is bilinearly
+    interpolated at the output positions. The computational cost is
+    O(N + bins), independent of the kernel bandwidth.
+
+    Parameters
+    ----------
+    events_x, events_y: 1D ndarray
+        The input points for kernel density estimation. Input
+        is flattened automatically.
+    xout, yout: ndarray
+        The coordinates at which the KDE should be computed.
+        If set to none, input coordinates are used.
+    bins: tuple (binsx, binsy)
+        The number of grid cells; defaults to `BINNED_GRID_SIZE`
+        for each axis
+    bw: tuple (bwx, bwy)
+        Kernel bandwidth; defaults to Scott's rule
+
+    Returns
+    -------
+    density: ndarray, same shape as `xout`
+        The KDE for the points in (xout, yout)
+    """
+    valid_combi = ((xout is None and yout is None) or
+                   (xout is not None and yout is not None)
+                   )
+    if not valid_combi:
+        raise ValueError("Both `xout` and `yout` must be (un)set.")
+
+    if xout is None and yout is None:
+        xout = events_x
+        yout = events_y
+
+    xout = np.asarray(xout, dtype=float)
+    yout = np.asarray(yout, dtype=float)
+    if events_x.size == 0:
+        return np.zeros(xout.shape)
+
+    if bins is None:
+        bins = (BINNED_GRID_SIZE, BINNED_GRID_SIZE)
+
+    if bw is None:
+        # Scott's rule for two dimensions
+        factor = events_x.size ** (-1 / 6)
+        bw = (np.std(events_x) * factor, np.std(events_y) * factor)
+
+    grid = []
+    for ev, nbin, bwi in zip([events_x, events_y], bins, bw):
+        vmin = ev.min()
+        vmax = ev.max()
+        if vmax == vmin:
+            # all events at the same position
+            vmin -= .5
+            vmax += .5
+        # grid cell centers are at `vmin + ii * width`
+        width = (vmax - vmin) / (nbin - 1)
+        grid.append((vmin, width, nbin, bwi / width))
+
+    # Bin events
+    hist, _, _ = np.histogram2d(
+        x=events_x,
+        y=events_y,
+        bins=[nbin for (_, _, nbin, _) in grid],
+        range=[(vmin - width / 2, vmin + (nbin - .5) * width)
+               for (vmin, width, nbin, _) in grid])
+    # Smooth with a Gaussian kernel
+    hist = gaussian_filter(hist, sigma=[sig for (_, _, _, sig) in grid],
+                           mode="constant")
+    hist /= events_x.size * grid[0][1] * grid[1][1]
+
+    # Bilinear interpolation at the output positions
+    indices = []
+    fractions = []
+    outside = np.zeros(xout.size, dtype=bool)
+    for out, (vmin, width, nbin, _) in zip([xout, yout], grid):
+        pos = (out.ravel() - vmin) / width
+        outside |= (pos < -.5) | (pos > nbin - .5)
+        pos = np.clip(pos, 0, nbin - 1)
+        idx = np.minimum(pos.astype(np.intp), nbin - 2)
+        indices.append(idx)
+        fractions.append(pos - idx)
+    ix, iy = indices
+    fx, fy = fractions
+    density = (hist[ix, iy] * (1 - fx) * (1 - fy)
+               + hist[ix + 1, iy] * fx * (1 - fy)
+               + hist[ix, iy + 1] * (1 - fx) * fy
+               + hist[ix + 1, iy + 1] * fx * fy)
+    density[outside] = 0
+    return density.reshape(xout.shape)
+
+
+#: KDE methods in addition to :const:`dclab.kde.methods.methods`
+methods = {"binned": kde_binned}
+
+
+class KernelDensityEstimator(DCLabKDE):
+    """:class:`dclab.kde.KernelDensityEstimator` with additional methods
+
+    The methods defined in :const:`methods` are available via the
+    `kde_type` argument.
+    """
+
+    def get_raster(self, xax="area_um", yax="deform", xacc=None, yacc=None,
+                   kde_type="histogram", kde_kwargs=None, xscale="linear",
+                   yscale="linear"):
+        if kde_type not in methods:
+            return super(KernelDensityEstimator, self).get_raster(
+                xax=xax, yax=yax, xacc=xacc, yacc=yacc, kde_type=kde_type,
+                kde_kwargs=kde_kwargs, xscale=xscale, yscale=yscale)
+        # Let dclab determine the grid (the "none" method is cheap)
+        xmesh, ymesh, _ = super(KernelDensityEstimator, self).get_raster(
+            xax=xax, yax=yax, xacc=xacc, yacc=yacc, kde_type="none",
+            xscale=xscale, yscale=yscale)
+        density = self.get_scatter(
+            xax=xax, yax=yax, positions=(xmesh, ymesh), kde_type=kde_type,
+            kde_kwargs=kde_kwargs, xscale=xscale, yscale=yscale)
+        return xmesh, ymesh, density
+
+    def get_scatter(self, xax="area_um", yax="deform", positions=None,
+                    kde_type="histogram", kde_kwargs=None, xscale="linear",
+                    yscale="linear"):
+        if kde_type not in methods:
+            return super(KernelDensityEstimator, self).get_scatter(
+                xax=xax, yax=yax, positions=positions, kde_type=kde_type,
+                kde_kwargs=kde_kwargs, xscale=xscale, yscale=yscale)
+        if kde_kwargs is None:
+            kde_kwargs = {}
+        x = self.rtdc_ds[xax][self.rtdc_ds.filter.all]
+        y = self.rtdc_ds[yax][self.rtdc_ds.filter.all]
+        xs = self.apply_scale(np.asarray(x, dtype=float), xscale, xax)
+        ys = self.apply_scale(np.asarray(y, dtype=float), yscale, yax)
+        if positions is None:
+            posx = None
+            posy = None
+        else:
+            posx = self.apply_scale(
+                np.asarray(positions[0], dtype=float), xscale, xax)
+            posy = self.apply_scale(
+                np.asarray(positions[1], dtype=float), yscale, yax)
+        if len(x):
+            density = methods[kde_type](events_x=xs, events_y=ys,
+                                        xout=posx, yout=posy,
+                                        **kde_kwargs)
+        else:
+            density = np.array([])
+        return density
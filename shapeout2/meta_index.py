@@ -0,0 +1,197 @@
+"""Persistent index of measurement metadata (see :mod:`.meta_tool`)"""
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+from .util import is_remote_path
+
+
+#: version of the database layout (older databases are recreated)
+SCHEMA_VERSION = 2
+
+
+class MetaIndex:
+    def __init__(self, path=None, max_measurements=10000):
+        """SQLite-based index of metadata of measurement files
+
+        Items (e.g. the configuration, the list of features, or the
+        min/max values of a feature) are stored as JSON strings for
+        each measurement. Local files are identified by their
+        resolved path, modification time and size, i.e. the items
+        of a file are discarded when the file changes. DCOR
+        resources are identified by their URL (DCOR data do not
+        change). If more than `max_measurements` measurements are
+        indexed, the items of the least-recently indexed measurements
+        are removed.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path or None
+            Path to the SQLite database file; set to None to disable
+            the index
+        max_measurements: int
+            Maximum number of indexed measurements
+        """
+        #: number of items found in the index
+        self.hits = 0
+        #: number of items not found in the index
+        self.misses = 0
+        #: maximum number of indexed measurements
+        self.max_measurements = max_measurements
+        self.path = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self.set_path(path)
+
+    @staticmethod
+    def get_key(path):
+        """Return the key and the stamp of a measurement path
+
+        Returns None if the measurement cannot be indexed.
+        """
+        if is_remote_path(path):
+            return path, "dcor"
+        try:
+            full_path = pathlib.Path(path).resolve()
+            stat = full_path.stat()
+        except (OSError, TypeError):
+            return None
+        return str(full_path), f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def clear(self):
+        """Remove all items from the index"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM items")
+                except sqlite3.Error:
+                    pass
+
+    def get(self, path, names):
+        """Return a dictionary with the indexed items of a measurement
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to a measurement or DCOR URL
+        names: list of str
+            Names of the items; names that are not in the index
+            are not in the returned dictionary
+        """
+        items = {}
+        if self._conn is None:
+            return items
+        key = self.get_key(path)
+        with self._lock:
+            if self._conn is not None and key is not None:
+                try:
+                    rows = self._conn.execute(
+                        "SELECT name, value FROM items "
+                        "WHERE path = ? AND stamp = ?", key).fetchall()
+                except sqlite3.Error:
+                    rows = []
+                names = set(names)
+                for name, value in rows:
+                    if name in names:
+                        items[name] = json.loads(value)
+            self.hits += len(items)
+            self.misses += len(set(names)) - len(items)
+        return items
+
+    def _prune(self):
+        """Remove the least-recently indexed measurements
+
+        Must be called with the lock held.
+        """
+        count = self._conn.execute(
+            "SELECT COUNT(DISTINCT path) FROM items").fetchone()[0]
+        excess = count - self.max_measurements
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM items WHERE path IN ("
+                "SELECT path FROM items GROUP BY path "
+                "ORDER BY MAX(updated) LIMIT ?)", (excess,))
+
+    def set(self, path, items):
+        """Store the items (a dictionary) of a measurement
+
+        Items whose values are not JSON-serializable are not stored.
+        Items of a previous version of the measurement file are
+        removed.
+        """
+        if self._conn is None:
+            return
+        key = self.get_key(path)
+        rows = []
+        updated = time.time()
+        for name, value in items.items():
+            try:
+                rows.append(key + (name, json.dumps(value), updated))
+            except (TypeError, ValueError):
+                # not JSON-serializable (e.g. numpy data types)
+                pass
+        with self._lock:
+            if self._conn is None or key is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM items WHERE path = ? AND stamp != ?",
+                        key)
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO items "
+                        "(path, stamp, name, value, updated) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        rows)
+                    self._prune()
+            except sqlite3.Error:
+                pass
+
+    def set_max_measurements(self, max_measurements):
+        """Set the maximum number of indexed measurements"""
+        with self._lock:
+            self.max_measurements = max_measurements
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._prune()
+                except sqlite3.Error:
+                    pass
+
+    def set_path(self, path):
+        """Set the path to the database file (None disables the index)"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if path is not None:
+                path = pathlib.Path(path)
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(str(path), timeout=10,
+                                           check_same_thread=False)
+                    with conn:
+                        version = conn.execute(
+                            "PRAGMA user_version").fetchone()[0]
+                        if version != SCHEMA_VERSION:
+                            conn.execute("DROP TABLE IF EXISTS items")
+                            conn.execute(
+                                f"PRAGMA user_version = {SCHEMA_VERSION}")
+                        conn.execute(
+                            "CREATE TABLE IF NOT EXISTS items ("
+                            "path TEXT, stamp TEXT, name TEXT, value TEXT, "
+                            "updated REAL, PRIMARY KEY (path, name))")
+                except (OSError, sqlite3.Error):
+                    path = None
+                else:
+                    self._conn = conn
+            self.path = path
+
+
+#: global metadata index used by :mod:`.meta_tool`
+meta_index = MetaIndex()
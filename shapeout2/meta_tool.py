@@ -1,18 +1,30 @@
 """Convenience methods to retrieve meta data from .rtdc files"""
+import concurrent.futures
 import functools
+import os
 import pathlib
 
 import dclab
+from dclab.rtdc_dataset.config import Configuration
 
 import numpy as np
 
+from .meta_index import meta_index
+from .util import is_remote_path
+
+
+#: maximum number of threads for bulk queries of local files
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+#: maximum number of threads for bulk queries of remote (DCOR) data
+MAX_NETWORK_WORKERS = 4
+
 
 class dataset_monitoring_lru_cache:
     """Decorator for caching RT-DC data extracted from DCOR or files
 
     This is a modification of dclab.util.file_monitoring_lru_cache
-    with an exception that when the `path` starts with "https://",
-    then caching is done as well.
+    with an exception that when the `path` is a URL (see
+    :func:`.util.is_remote_path`), then caching is done as well.
     """
 
     def __init__(self, maxsize=100):
@@ -32,15 +44,15 @@ class dataset_monitoring_lru_cache:
                 full_path = local_path.resolve()
                 path_stat = full_path.stat()
                 return cached_wrapper(
-                    path=full_path,
-                    path_stats=(path_stat.st_mtime_ns, path_stat.st_size),
+                    full_path,
+                    (path_stat.st_mtime_ns, path_stat.st_size),
                     *args,
                     **kwargs)
-            elif isinstance(path, str) and path.startswith("https://"):
+            elif is_remote_path(path):
                 # DCOR metadata does not change
                 return cached_wrapper(
-                    path=path,
-                    path_stats="placeholder",
+                    path,
+                    "placeholder",
                     *args,
                     **kwargs)
             else:
@@ -52,6 +64,37 @@ class dataset_monitoring_lru_cache:
         return wrapper
 
 
+def _map_paths(func, paths, max_workers=None, max_network_workers=None):
+    """Call `func` for each path in a thread pool
+
+    Local files and remote data (URLs) are processed in separate
+    thread pools with separate limits for the number of threads.
+
+    Returns
+    -------
+    results: list
+        The results of `func` in the order of `paths`; the first
+        exception (in the order of `paths`) is raised
+    """
+    paths = list(paths)
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+    if max_network_workers is None:
+        max_network_workers = MAX_NETWORK_WORKERS
+    remote = [is_remote_path(pp) for pp in paths]
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(paths))),
+            thread_name_prefix="MetaToolLocal") as local_pool, \
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(max_network_workers, sum(remote))),
+            thread_name_prefix="MetaToolNetwork") as network_pool:
+        futures = []
+        for pp, is_remote in zip(paths, remote):
+            pool = network_pool if is_remote else local_pool
+            futures.append(pool.submit(func, pp))
+        return [future.result() for future in futures]
+
+
 def get_info(path, section, key):
     config = get_rtdc_config(path)
     return config[section][key]
@@ -71,14 +114,31 @@ def get_repr(path, append_path=False):
 
 @dataset_monitoring_lru_cache(maxsize=100)
 def get_rtdc_config(path):
+    """Return the configuration of a dataset
+
+    The configuration is stored in the persistent metadata index
+    (:data:`.meta_index.meta_index`).
+    """
+    indexed = meta_index.get(path, ["config"])
+    if "config" in indexed:
+        return Configuration(cfg=indexed["config"], disable_checks=True)
     with dclab.new_dataset(path) as ds:
         config = ds.config.copy()
+    meta_index.set(path, {"config": config.as_dict()})
     return config
 
 
 @dataset_monitoring_lru_cache(maxsize=100)
 def get_rtdc_features(path, scalar=True, only_loaded=False):
-    """Return available features in a dataset"""
+    """Return available features in a dataset
+
+    The features are stored in the persistent metadata index
+    (:data:`.meta_index.meta_index`).
+    """
+    name = f"features scalar={scalar} only_loaded={only_loaded}"
+    indexed = meta_index.get(path, [name])
+    if name in indexed:
+        return indexed[name]
     av_feat = []
     with dclab.new_dataset(path) as ds:
         if scalar:
@@ -92,47 +152,96 @@ def get_rtdc_features(path, scalar=True, only_loaded=False):
             else:
                 if feat in ds:
                     av_feat.append(feat)
+    meta_index.set(path, {name: av_feat})
     return av_feat
 
 
-def get_rtdc_features_bulk(paths, scalar=True):
-    """Return available features for a list of dataset paths"""
+def get_rtdc_features_bulk(paths, scalar=True, max_workers=None):
+    """Return available features for a list of dataset paths
+
+    The datasets are queried concurrently (see `MAX_WORKERS`
+    and `MAX_NETWORK_WORKERS`).
+    """
     features = []
-    for pp in paths:
-        features += get_rtdc_features(path=pp, scalar=scalar)
+    for feats in _map_paths(
+            functools.partial(get_rtdc_features, scalar=scalar),
+            paths,
+            max_workers=max_workers):
+        features += feats
     return sorted(set(features))
 
 
 @dataset_monitoring_lru_cache(maxsize=10000)
 def get_rtdc_features_minmax(path, *features):
-    """Return dict with min/max of scalar features in a dataset"""
+    """Return dict with min/max of scalar features in a dataset
+
+    If no `features` are given, the min/max values of all loaded
+    scalar features are returned (non-scalar features such as
+    "image" or "contour" are ignored). Features that are not
+    available in the dataset are not in the returned dictionary.
+
+    The min/max values of each feature (None if the feature is not
+    available) are stored in the persistent metadata index
+    (:data:`.meta_index.meta_index`).
+    """
+    if len(features) == 0:
+        names = ["scalar features loaded"]
+    else:
+        names = [f"minmax {feat}" for feat in features]
+    indexed = meta_index.get(path, names)
+    if len(features) == 0 and "scalar features loaded" in indexed:
+        features = indexed["scalar features loaded"]
+        names = [f"minmax {feat}" for feat in features]
+        indexed = meta_index.get(path, names)
+    if len(indexed) == len(names):
+        mmdict = {}
+        for feat, name in zip(features, names):
+            if indexed[name] is not None:
+                mmdict[feat] = tuple(indexed[name])
+        return mmdict
+
     mmdict = {}
+    items = {}
     with dclab.new_dataset(path) as ds:
         if len(features) == 0:
-            features = ds.features_loaded
+            features = [f for f in ds.features_loaded
+                        if dclab.dfn.scalar_feature_exists(f)]
+            items["scalar features loaded"] = list(features)
         for feat in features:
             assert dclab.dfn.scalar_feature_exists(feat)
             if feat in ds:
                 mmdict[feat] = np.min(ds[feat]), np.max(ds[feat])
+                items[f"minmax {feat}"] = [mmdict[feat][0].item(),
+                                           mmdict[feat][1].item()]
+            else:
+                items[f"minmax {feat}"] = None
+    meta_index.set(path, items)
     return mmdict
 
 
-def get_rtdc_features_minmax_bulk(paths, features=None):
+def get_rtdc_features_minmax_bulk(paths, features=None, max_workers=None):
     """Perform `get_rtdc_features_minmax` on a list of paths
 
+    The datasets are queried concurrently (see `MAX_WORKERS`
+    and `MAX_NETWORK_WORKERS`).
+
     Parameters
     ----------
     paths: list of str or list of pathlib.Path
         Paths to measurement files
     features: list of str or empty list
         Names of the features to compute the min/max values for.
-        If empty, all loaded features will be used.
+        If empty, all loaded scalar features will be used.
+    max_workers: int
+        Maximum number of threads for local files
     """
     if features is None:
         features = []
     mmdict = {}
-    for pp in paths:
-        mmdi = get_rtdc_features_minmax(pp, *features)
+    for mmdi in _map_paths(
+            lambda pp: get_rtdc_features_minmax(pp, *features),
+            paths,
+            max_workers=max_workers):
         for feat in mmdi:
             if feat in mmdict:
                 fmin = min(mmdict[feat][0], mmdi[feat][0])
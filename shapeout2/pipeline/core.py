@@ -1,14 +1,19 @@
+import concurrent.futures
 import copy
+import os
 import warnings
 
 import dclab
 import numpy as np
 
-from ..idiom import SLOPING_FEATURES
-
+from .dataset_lock import DatasetLock
 from .dataslot import Dataslot
 from .filter import Filter
 from .filter_ray import FilterRay
+from .handle_pool import handle_pool
+from .min_max import get_min_max
+from .range_index import get_range_index
+from .revision import next_revision
 from .plot import Plot
 
 
@@ -30,8 +35,30 @@ class Pipeline(object):
         self.rays = {}
         #: Slots are instances of :class:`shapeout2.pipeline.Dataslot`
         self.slots = []
-        #: individual element states
-        self.element_states = {}
+        # identifier-to-index registries (see `_update_registry`)
+        self._filter_index = {}
+        self._plot_index = {}
+        self._slot_index = {}
+        # element states (slots x filters and slots x plots), see
+        # `element_states`
+        self._filter_states = np.zeros((0, 0), dtype=bool)
+        self._plot_states = np.zeros((0, 0), dtype=bool)
+        # plot revision, slots, and slot revisions of the last contour
+        # spacing check for each plot (see `check_contour_spacing`)
+        self._spacing_checks = {}
+        #: maximum number of threads for applying the filters of
+        #: several slots (see :func:`Pipeline.get_datasets`); set
+        #: to 1 to apply the filters sequentially
+        self.filter_workers = min(8, os.cpu_count() or 1)
+        # thread pool for applying filters and its number of workers
+        # (see `_get_filter_executor`)
+        self._filter_executor = None
+        self._filter_executor_workers = 0
+        #: lock for reading the datasets in other threads while the
+        #: filters are applied (see :class:`.dataset_lock.DatasetLock`)
+        self.dataset_lock = DatasetLock()
+        # revision of the pipeline structure (see `revision`)
+        self._revision = next_revision()
 
         self.reset()
         #: previous state (see __setstate__)
@@ -54,6 +81,7 @@ class Pipeline(object):
             self.add_slot(slot=slot_state)
         # set element states at the end
         self.element_states = state["elements"]
+        self._revision = next_revision()
 
         # sanity checks
         if set(self.filters_used) != set(state["filters used"]):
@@ -62,7 +90,7 @@ class Pipeline(object):
             raise ValueError("Bad pipeline state ('slots used' don't match)")
 
     def __getstate__(self):
-        state = {"elements": copy.deepcopy(self.element_states),
+        state = {"elements": self.element_states,
                  "filters": [filt.__getstate__() for filt in self.filters],
                  "filters used": self.filters_used,
                  "plots": [plot.__getstate__() for plot in self.plots],
@@ -70,9 +98,46 @@ class Pipeline(object):
                  "slots used": self.slots_used}
         return state
 
+    @property
+    def element_states(self):
+        """Individual element states
+
+        This is a dictionary with slot identifiers as keys, each
+        item being a dictionary with filter and plot identifiers
+        as keys and booleans as values. Internally, the states
+        are stored as boolean arrays; use :func:`set_element_active`
+        to modify them.
+        """
+        states = {}
+        for ii, slot_id in enumerate(self._slot_index):
+            sstates = {}
+            for jj, filt_id in enumerate(self._filter_index):
+                sstates[filt_id] = bool(self._filter_states[ii, jj])
+            for jj, plot_id in enumerate(self._plot_index):
+                sstates[plot_id] = bool(self._plot_states[ii, jj])
+            states[slot_id] = sstates
+        return states
+
+    @element_states.setter
+    def element_states(self, states):
+        self._filter_states[:] = False
+        self._plot_states[:] = False
+        for slot_id, sstates in states.items():
+            if slot_id not in self._slot_index:
+                continue
+            ii = self._slot_index[slot_id]
+            for filt_plot_id, active in sstates.items():
+                if filt_plot_id in self._filter_index:
+                    jj = self._filter_index[filt_plot_id]
+                    self._filter_states[ii, jj] = active
+                elif filt_plot_id in self._plot_index:
+                    jj = self._plot_index[filt_plot_id]
+                    self._plot_states[ii, jj] = active
+        self._revision = next_revision()
+
     @property
     def filter_ids(self):
-        return [filt.identifier for filt in self.filters]
+        return list(self._filter_index)
 
     @property
     def filters_used(self):
@@ -80,11 +145,26 @@ class Pipeline(object):
 
     @property
     def plot_ids(self):
-        return [plot.identifier for plot in self.plots]
+        return list(self._plot_index)
+
+    @property
+    def revision(self):
+        """Combined revision of the pipeline and all of its elements
+
+        The revision changes whenever a filter, plot or slot is
+        modified (see :class:`.revision.RevisionMixin`) or when the
+        structure of the pipeline changes. Changes of
+        :class:`dclab.PolygonFilter` instances are only tracked
+        if :func:`.Filter.mark_polygon_filter_modified` is called.
+        """
+        revisions = [self._revision]
+        for item in self.filters + self.plots + self.slots:
+            revisions.append(item.revision)
+        return max(revisions)
 
     @property
     def slot_ids(self):
-        return [slot.identifier for slot in self.slots]
+        return list(self._slot_index)
 
     @property
     def slots_used(self):
@@ -136,10 +216,10 @@ class Pipeline(object):
                 filt = Filter()
             filt.__setstate__(state)
         self.filters.insert(index, filt)
-        filt_id = filt.identifier
-        for slot_id in self.slot_ids:
-            self.element_states[slot_id][filt_id] = False
-        return filt_id
+        self._filter_states = np.insert(self._filter_states, index, False,
+                                        axis=1)
+        self._update_registry()
+        return filt.identifier
 
     def add_plot(self, plot=None, index=None):
         """Add a plot to the pipeline
@@ -172,10 +252,9 @@ class Pipeline(object):
             plot.__setstate__(state)
 
         self.plots.insert(index, plot)
-        plot_id = plot.identifier
-        for slot_id in self.slot_ids:
-            self.element_states[slot_id][plot_id] = False
-
+        self._plot_states = np.insert(self._plot_states, index, False,
+                                      axis=1)
+        self._update_registry()
         return plot.identifier
 
     def add_slot(self, slot=None, path=None, index=None):
@@ -218,12 +297,11 @@ class Pipeline(object):
             slot.__setstate__(state)
 
         self.slots.insert(index, slot)
-        slot_id = slot.identifier
-        self.element_states[slot_id] = {}
-        for filt_id in self.filter_ids:
-            self.element_states[slot_id][filt_id] = False
-        for plot_id in self.plot_ids:
-            self.element_states[slot_id][plot_id] = False
+        self._filter_states = np.insert(self._filter_states, index, False,
+                                        axis=0)
+        self._plot_states = np.insert(self._plot_states, index, False,
+                                      axis=0)
+        self._update_registry()
         return slot.identifier
 
     def apply_filter_ray(self, rtdc_ds, slot_id):
@@ -240,7 +318,7 @@ class Pipeline(object):
             Identifier of the slot from which the filters are taken
         """
         # make sure the current ray is built correctly
-        self.get_dataset(self.slot_ids.index(slot_id), apply_filter=False)
+        self.get_dataset(self._slot_index[slot_id], apply_filter=False)
         # get the ray
         ray = self.get_ray(slot_id)
         ds = ray.get_final_child(rtdc_ds)
@@ -251,17 +329,25 @@ class Pipeline(object):
 
         This method was implemented to avoid tiny contour spacings for
         plotting, which could lead to OOM events.
+
+        The check is only done again if the plot or one of its slots
+        was modified or if the slots of the plot changed (the sane
+        spacing ranges are cached per slot configuration).
         """
-        plot = self.plots[self.plot_ids.index(plot_id)]
+        plot = self.plots[self._plot_index[plot_id]]
+        slot_indices = self._get_plot_slot_indices(plot_id)
+        slot_ids = tuple(self.slots[ii].identifier for ii in slot_indices)
+        slot_revs = tuple(self.slots[ii].revision for ii in slot_indices)
+        if (self._spacing_checks.get(plot_id)
+                == (plot.revision, slot_ids, slot_revs)):
+            return
         plot_state = plot.__getstate__()
         old_plot_state = copy.deepcopy(plot_state)
         if plot_state["general"]["auto range"]:
             for ax in ["x", "y"]:
                 feat = plot_state["general"][f"axis {ax}"]
                 spacing = plot_state["contour"][f"spacing {ax}"]
-                for ds, slot_state in zip(*self.get_plot_datasets(
-                        plot_id, apply_filter=False)):
-                    slot_id = slot_state["identifier"]
+                for slot_id in slot_ids:
                     slot = self.get_slot(slot_id)
                     sp_min, sp_max = slot.get_sane_spacing_range(feat=feat)
                     if spacing < sp_min:
@@ -275,6 +361,70 @@ class Pipeline(object):
                     plot_state["contour"][f"spacing {ax}"] = spacing
         if old_plot_state != plot_state:
             plot.__setstate__(plot_state)
+        self._spacing_checks[plot_id] = (plot.revision, slot_ids, slot_revs)
+
+    def _get_slot_datasets(self, slot_indices, filt_index=-1,
+                           apply_filter=True):
+        """Return the datasets of several slots (see :func:`get_dataset`)
+
+        The filter rays of the slots are independent of each other,
+        so they are computed in a thread pool (if there is more than
+        one slot and :const:`Pipeline.filter_workers` is larger than
+        one). The datasets are returned in the order of `slot_indices`.
+        If computing a dataset fails, the exception of the first
+        failing slot is raised after all other slots are done.
+
+        The slots are pinned in the handle pool while the datasets
+        are computed, so that the datasets of the slots are not
+        closed by one another (see :mod:`.handle_pool`), and
+        :const:`Pipeline.dataset_lock` is held for writing.
+        """
+        slot_indices = list(slot_indices)
+        with self.dataset_lock.writing(), \
+                handle_pool.pinned([self.slots[ii] for ii in slot_indices]):
+            return self._compute_slot_datasets(slot_indices, filt_index,
+                                               apply_filter)
+
+    def _compute_slot_datasets(self, slot_indices, filt_index,
+                               apply_filter):
+        """Helper for :func:`_get_slot_datasets` (slots are pinned)"""
+        workers = min(self.filter_workers, len(slot_indices))
+        if filt_index is None or workers <= 1:
+            return [self.get_dataset(ii, filt_index=filt_index,
+                                     apply_filter=apply_filter)
+                    for ii in slot_indices]
+        # Determine the filters and rays in this thread (the
+        # pipeline itself must not be modified in the workers).
+        jobs = []
+        for ii in slot_indices:
+            slot_id = self.slots[ii].identifier
+            filters = self.get_filters_for_slot(slot_id=slot_id,
+                                                max_filter_index=filt_index)
+            jobs.append((self.get_ray(slot_id), filters))
+        executor = self._get_filter_executor()
+        futures = [executor.submit(ray.get_dataset, filters,
+                                   apply_filter=apply_filter)
+                   for ray, filters in jobs]
+        concurrent.futures.wait(futures)
+        # All jobs are done; `result` raises the exception of a slot.
+        return [ff.result() for ff in futures]
+
+    def _get_filter_executor(self):
+        """Return the thread pool for applying the filters of slots
+
+        The pool is created on first use and reused afterwards (it
+        is only recreated when :const:`Pipeline.filter_workers`
+        changed). Idle worker threads exit when the pipeline is
+        garbage-collected.
+        """
+        if self._filter_executor_workers != self.filter_workers:
+            if self._filter_executor is not None:
+                self._filter_executor.shutdown(wait=False)
+            self._filter_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.filter_workers,
+                thread_name_prefix="PipelineFilter")
+            self._filter_executor_workers = self.filter_workers
+        return self._filter_executor
 
     def get_dataset(self, slot_index, filt_index=-1, apply_filter=True):
         """Return dataset with all filters updated (optionally applied)
@@ -291,10 +441,19 @@ class Pipeline(object):
             whether to call `dataset.apply_filter` in the end;
             if set to `False`, only the filtering configuration
             of the dataset and its hierarchy parents are updated
+
+        Notes
+        -----
+        This holds :const:`Pipeline.dataset_lock` for writing.
         """
         if not isinstance(slot_index, int):
             raise ValueError(
                 f"`slot_index` must be an integer, got '{slot_index}'")
+        with self.dataset_lock.writing():
+            return self._get_dataset(slot_index, filt_index, apply_filter)
+
+    def _get_dataset(self, slot_index, filt_index, apply_filter):
+        """Helper for :func:`get_dataset` (holds the dataset lock)"""
         slot = self.slots[slot_index]
         if filt_index is None or (filt_index == -1 and len(self.slots) == 0):
             # return the unfiltered dataset
@@ -313,6 +472,8 @@ class Pipeline(object):
         """Return all datasets with filters applied
 
         The parameters are passed to :func:`Pipeline.get_dataset`.
+        If :const:`Pipeline.filter_workers` is larger than one, the
+        filters of the individual slots are applied in a thread pool.
 
         Parameters
         ----------
@@ -325,9 +486,9 @@ class Pipeline(object):
             if set to `False`, only the filtering configuration
             of the dataset and its hierarchy parents are updated
         """
-        kw = {"filt_index": filt_index,
-              "apply_filter": apply_filter}
-        return [self.get_dataset(ii, **kw) for ii in range(len(self.slots))]
+        return self._get_slot_datasets(slot_indices=range(len(self.slots)),
+                                       filt_index=filt_index,
+                                       apply_filter=apply_filter)
 
     def get_features(self, scalar=False, label_sort=False, union=False,
                      plot_id=None, ret_labels=False):
@@ -360,11 +521,11 @@ class Pipeline(object):
             features = set()
         else:
             features = None
-        for slot_index in range(self.num_slots):
-            slot_id = self.slot_ids[slot_index]
+        if plot_id is not None:
+            plot_states = self._plot_states[:, self._plot_index[plot_id]]
+        for slot_index, slot in enumerate(self.slots):
             if (plot_id is None
-                or (self.element_states[slot_id][plot_id]
-                    and slot_id in self.slots_used)):
+                    or (plot_states[slot_index] and slot.slot_used)):
                 ds = self.get_dataset(slot_index=slot_index, filt_index=None)
                 if scalar:
                     ds_features = set(ds.features_scalar)
@@ -396,9 +557,9 @@ class Pipeline(object):
 
     def get_filter(self, filt_id):
         """Return the Filter matching the identifier"""
-        if filt_id not in self.filter_ids:
+        if filt_id not in self._filter_index:
             raise ValueError(f"Filter '{filt_id}' not part of this pipeline!")
-        return self.filters[self.filter_ids.index(filt_id)]
+        return self.filters[self._filter_index[filt_id]]
 
     def get_filters_for_slot(self, slot_id, max_filter_index=-1):
         """Return list of filters for a slot
@@ -414,14 +575,15 @@ class Pipeline(object):
             value. Set to a negative value (default) to include all
             filters applied to a dataset.
         """
-        filters = []
         if max_filter_index < 0:
             # include all filters that are used for this slot
             max_filter_index = len(self.filters) - 1
-        for filt_id in self.filter_ids[:max_filter_index + 1]:
-            if (self.is_element_active(slot_id, filt_id)
-                    and filt_id in self.filters_used):
-                filters.append(self.get_filter(filt_id))
+        states = self._filter_states[self._slot_index[slot_id],
+                                     :max_filter_index + 1]
+        filters = []
+        for filt, active in zip(self.filters, states):
+            if active and filt.filter_used:
+                filters.append(filt)
         return filters
 
     def get_min_max(self, feat, plot_id=None, margin=0.0):
@@ -444,6 +606,11 @@ class Pipeline(object):
             Minimum and maximum values of the feature. If the feature
             is empty or only-nan, an :class:`EmptyDatasetWarning` is
             issued and both return values are set to zero.
+
+        Notes
+        -----
+        The values of the individual datasets are cached (see
+        :func:`shapeout2.pipeline.min_max.get_min_max`).
         """
         if plot_id is not None:
             dslist = self.get_plot_datasets(plot_id)[0]
@@ -454,21 +621,7 @@ class Pipeline(object):
         for ds in dslist:
             if np.any(ds.filter.all):
                 if feat in ds:
-                    fdata = ds[feat][ds.filter.all]
-                    invalid = np.isinf(fdata)
-                    if np.any(invalid):
-                        vdata = fdata[~invalid]
-                    else:
-                        vdata = fdata
-                    if feat in SLOPING_FEATURES:
-                        # We are a little faster here.
-                        vmin = min(np.nanmin(vdata[:1000]),
-                                   np.nanmin(vdata[-1000:]))
-                        vmax = max(np.nanmax(vdata[:1000]),
-                                   np.nanmax(vdata[-1000:]))
-                    else:
-                        vmin = np.nanmin(vdata)
-                        vmax = np.nanmax(vdata)
+                    vmin, vmax = get_min_max(ds, feat)
                     fmin = min(fmin, vmin)
                     fmax = max(fmax, vmax)
                 else:
@@ -490,27 +643,26 @@ class Pipeline(object):
         return [fmin, fmax]
 
     def get_plot(self, plot_id):
-        if plot_id not in self.plot_ids:
+        if plot_id not in self._plot_index:
             raise ValueError(f"Plot '{plot_id}' not part of this pipeline!")
         self.check_contour_spacing(plot_id)
-        return self.plots[self.plot_ids.index(plot_id)]
+        return self.plots[self._plot_index[plot_id]]
 
     def get_plot_datasets(self, plot_id, apply_filter=True):
         """Return a list of datasets with slot states that belong to a plot"""
-        datasets = []
-        states = []
-        # keep the same order as in self.slots
-        for slot_index in range(len(self.slots)):
-            slot = self.slots[slot_index]
-            slot_id = slot.identifier
-            if (self.element_states[slot_id][plot_id]
-                    and slot_id in self.slots_used):
-                ds = self.get_dataset(slot_index=slot_index,
-                                      apply_filter=apply_filter)
-                datasets.append(ds)
-                states.append(slot.__getstate__())
+        slot_indices = self._get_plot_slot_indices(plot_id)
+        states = [self.slots[ii].__getstate__() for ii in slot_indices]
+        datasets = self._get_slot_datasets(slot_indices=slot_indices,
+                                           apply_filter=apply_filter)
         return datasets, states
 
+    def _get_plot_slot_indices(self, plot_id):
+        """Return the indices of the used slots that belong to a plot"""
+        plot_states = self._plot_states[:, self._plot_index[plot_id]]
+        # keep the same order as in self.slots
+        return [ii for ii, slot in enumerate(self.slots)
+                if plot_states[ii] and slot.slot_used]
+
     def get_plot_col_row_count(self, plot_id, pipeline_state=None):
         """Compute how many rows a plot layout requires
 
@@ -555,11 +707,39 @@ class Pipeline(object):
         row_count = int(np.ceil(num_plots/col_count))
         return col_count, row_count
 
+    def get_range_count(self, feat, start, end):
+        """Return the number of events within a feature range
+
+        The events are counted in the unfiltered datasets of all
+        used slots. When the range of a feature is changed repeatedly,
+        a sorted range index is used (see :mod:`.range_index`), so
+        this is cheap enough for updating the user interface while a
+        range slider is moved.
+
+        Parameters
+        ----------
+        feat: str
+            Feature name
+        start, end: float
+            Feature range (boundaries are included)
+        """
+        count = 0
+        for slot_id in self.slots_used:
+            ds = self.get_slot(slot_id).get_dataset()
+            if feat in ds:
+                index = get_range_index(ds, feat)
+                if index is None:
+                    data = ds[feat]
+                    count += np.sum((start <= data) & (data <= end))
+                else:
+                    count += index.count(start, end)
+        return count
+
     def get_ray(self, slot_id):
         """Convenience function that creates and returns a filter ray"""
         # cleanup (just in case)
         for key in list(self.rays.keys()):
-            if key not in self.slot_ids:
+            if key not in self._slot_index:
                 self.rays.pop(key)
         if slot_id not in self.rays:
             # create filter ray if it does not exist
@@ -569,37 +749,46 @@ class Pipeline(object):
     def get_slot(self, slot_id):
         """Return the Dataslot matching the RTDCBase identifier"""
         slot_id = slot_id.split("-")[0]  # this is how FilterRay names children
-        if slot_id in self.slot_ids:
-            slot = self.slots[self.slot_ids.index(slot_id)]
+        if slot_id in self._slot_index:
+            slot = self.slots[self._slot_index[slot_id]]
         else:
             raise ValueError(f"Unknown dataset identifier: `{slot_id}`")
         return slot
 
+    def _get_element_index(self, slot_id, filt_plot_id):
+        """Return the element state array and the index of an element"""
+        ii = self._slot_index[slot_id]
+        if filt_plot_id in self._filter_index:
+            return self._filter_states, (ii, self._filter_index[filt_plot_id])
+        else:
+            return self._plot_states, (ii, self._plot_index[filt_plot_id])
+
     def is_element_active(self, slot_id, filt_plot_id):
-        return self.element_states[slot_id][filt_plot_id]
+        states, index = self._get_element_index(slot_id, filt_plot_id)
+        return bool(states[index])
 
     def remove_filter(self, filt_id):
         """Remove a filter by filter identifier"""
-        index = self.filter_ids.index(filt_id)
+        index = self._filter_index[filt_id]
         self.filters.pop(index)
-        for slot_id in self.element_states:
-            if filt_id in self.element_states[slot_id]:
-                self.element_states[slot_id].pop(filt_id)
+        self._filter_states = np.delete(self._filter_states, index, axis=1)
+        self._update_registry()
 
     def remove_plot(self, plot_id):
         """Remove a filter by plot identifier"""
-        index = self.plot_ids.index(plot_id)
+        index = self._plot_index[plot_id]
         self.plots.pop(index)
-        for slot_id in self.element_states:
-            if plot_id in self.element_states[slot_id]:
-                self.element_states[slot_id].pop(plot_id)
+        self._plot_states = np.delete(self._plot_states, index, axis=1)
+        self._spacing_checks.pop(plot_id, None)
+        self._update_registry()
 
     def remove_slot(self, slot_id):
         """Remove a slot by slot identifier"""
-        index = self.slot_ids.index(slot_id)
+        index = self._slot_index[slot_id]
         self.slots.pop(index)
-        if slot_id in self.element_states:
-            self.element_states.pop(slot_id)
+        self._filter_states = np.delete(self._filter_states, index, axis=0)
+        self._plot_states = np.delete(self._plot_states, index, axis=0)
+        self._update_registry()
 
     def reorder_slots(self, indices):
         """Change the order of data slots
@@ -618,6 +807,9 @@ class Pipeline(object):
         for idx in indices:
             new_slots.append(self.slots[idx])
         self.slots = new_slots
+        self._filter_states = self._filter_states[indices]
+        self._plot_states = self._plot_states[indices]
+        self._update_registry()
 
     def reset(self):
         """Reset the pipeline"""
@@ -625,8 +817,27 @@ class Pipeline(object):
         self.plots.clear()
         self.rays.clear()
         self.slots.clear()
-        self.element_states.clear()
+        self._filter_states = np.zeros((0, 0), dtype=bool)
+        self._plot_states = np.zeros((0, 0), dtype=bool)
+        self._spacing_checks.clear()
+        self._update_registry()
 
     def set_element_active(self, slot_id, filt_plot_id, active=True):
         """Activate an element in the block matrix"""
-        self.element_states[slot_id][filt_plot_id] = active
+        states, index = self._get_element_index(slot_id, filt_plot_id)
+        states[index] = active
+        self._revision = next_revision()
+
+    def _update_registry(self):
+        """Update the identifier-to-index dictionaries
+
+        This must be called whenever filters, plots or slots are
+        added, removed or reordered.
+        """
+        self._filter_index = {filt.identifier: ii
+                              for ii, filt in enumerate(self.filters)}
+        self._plot_index = {plot.identifier: ii
+                            for ii, plot in enumerate(self.plots)}
+        self._slot_index = {slot.identifier: ii
+                            for ii, slot in enumerate(self.slots)}
+        self._revision = next_revision()
@@ -0,0 +1,66 @@
+"""Coordinate access to the datasets of a pipeline from several threads"""
+import contextlib
+import threading
+
+
+class DatasetLock:
+    def __init__(self):
+        """Readers-writer lock for the datasets of a pipeline
+
+        Applying filters modifies the datasets of a pipeline (e.g.
+        the filter arrays of the hierarchy children of a filter ray),
+        so this must not happen while other threads read from the
+        datasets. Worker threads that read the datasets (e.g. to
+        compute plot data) hold :func:`reading`. The thread that
+        modifies the datasets holds :func:`writing`, which waits for
+        all readers to finish.
+
+        Writing is reentrant and waiting writers have priority, i.e.
+        new readers wait until the writer is done.
+        """
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._write_count = 0
+        self._writers_waiting = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        """Context manager for reading the datasets"""
+        with self._cond:
+            if self._writer == threading.get_ident():
+                # the writer may read
+                reentrant = True
+            else:
+                reentrant = False
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not reentrant:
+                with self._cond:
+                    self._readers -= 1
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def writing(self):
+        """Context manager for modifying the datasets"""
+        ident = threading.get_ident()
+        with self._cond:
+            if self._writer != ident:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = ident
+            self._write_count += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_count -= 1
+                if self._write_count == 0:
+                    self._writer = None
+                    self._cond.notify_all()
@@ -1,30 +1,55 @@
+import concurrent.futures
 import copy
 import functools
+import os
 
 import dclab
 from dclab.features.emodulus.viscosity import KNOWN_MEDIA
 import numpy as np
 
 from ..idiom import SLOPING_FEATURES
-from .. import meta_tool
 from ..util import hashobj
 
+from .handle_pool import handle_pool
+from .revision import RevisionMixin
 
-class Dataslot(object):
+
+class Dataslot(RevisionMixin):
     """Handles datasets in a pipeline"""
     _instance_counter = 0
     _instances = {}
 
-    def __init__(self, path, identifier=None, name=None):
+    def __init__(self, path, identifier=None, name=None, dataset=None):
+        """Data slot of a pipeline
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Path to a measurement or DCOR URL
+        identifier: str
+            Unique identifier of the slot; generated if not given
+        name: str
+            Name of the slot; defaults to the sample name
+        dataset: dclab.rtdc_dataset.RTDCBase
+            Dataset opened from `path`; if not given, `path` is
+            opened (see :func:`load_dataslots` for opening several
+            datasets in parallel)
+        """
         Dataslot._instance_counter += 1
         self.path = path
-        self._dataset = None
+        if dataset is None:
+            dataset = dclab.new_dataset(path)
+        self._dataset = dataset
+        # incremented whenever the dataset is closed by the handle pool
+        self._dataset_generation = 0
+        # filtering configuration and manual filter of a closed dataset
+        self._filter_state = None
         if identifier is None:
             identifier = "Dataslot_{}".format(Dataslot._instance_counter)
             while identifier in Dataslot._instances:
                 Dataslot._instance_counter += 1
                 identifier = "Dataslot_{}".format(Dataslot._instance_counter)
-        cfg = meta_tool.get_rtdc_config(path)
+        cfg = dataset.config
         if name is None:
             name = cfg["experiment"]["sample"]
         #: session-unique identifier of the slot
@@ -114,6 +139,7 @@ class Dataslot(object):
         self.name = state["name"]
         self.path = state["path"]
         self.slot_used = state["slot used"]
+        self.mark_modified()
 
     @staticmethod
     def get_slot(slot_id):
@@ -128,12 +154,22 @@ class Dataslot(object):
     def remove_slot(slot_id):
         """Remove a slot taking care of closing any opened files"""
         slot = Dataslot.get_slot(slot_id)
+        handle_pool.remove(slot)
         ds = slot._dataset
         if ds is not None:
             if isinstance(ds, dclab.rtdc_dataset.RTDC_HDF5):
                 ds.h5file.close()
         Dataslot._instances.pop(slot_id)
 
+    @property
+    def dataset_generation(self):
+        """Number of times the dataset was closed by the handle pool
+
+        Datasets derived from the dataset of this slot (e.g.
+        hierarchy children) become invalid when this number changes.
+        """
+        return self._dataset_generation
+
     @property
     def hash(self):
         """Return the hash of the slot"""
@@ -189,18 +225,52 @@ class Dataslot(object):
         ds: dclab.RTDCBase
             Loaded dataset
         """
-        if self._dataset is None:
+        ds = self._dataset
+        if ds is None:
+            # (re)open the dataset
             ds = dclab.new_dataset(self.path)
+            if self._filter_state is not None:
+                cfg, manual = self._filter_state
+                ds.config["filtering"].update(copy.deepcopy(cfg))
+                ds.filter.manual[:] = manual
+                ds.apply_filter()
+                self._filter_state = None
             self._dataset = ds
-        else:
-            ds = self._dataset
+        if isinstance(ds, dclab.rtdc_dataset.RTDC_HDF5):
+            # limit the number of opened files
+            handle_pool.touch(self)
         self.update_dataset(ds)
         return ds
 
+    def close_dataset(self):
+        """Close the dataset of this slot
+
+        The dataset is reopened on the next call to :func:`get_dataset`
+        (with the same filtering configuration and manual filter).
+        This is used by :const:`.handle_pool.handle_pool` to limit the
+        number of opened files.
+        """
+        ds = self._dataset
+        if ds is None:
+            return
+        handle_pool.discard(self)
+        self._filter_state = (copy.deepcopy(dict(ds.config["filtering"])),
+                              ds.filter.manual.copy())
+        self._dataset = None
+        self._dataset_generation += 1
+        if isinstance(ds, dclab.rtdc_dataset.RTDC_HDF5):
+            ds.h5file.close()
+
     def get_sane_spacing_range(self, feat):
-        """Return sane contour spacing range for this dataset and feature"""
+        """Return sane contour spacing range for this dataset and feature
+
+        The range is cached by slot identifier, Young's modulus and
+        crosstalk configuration, and feature name.
+        """
+        config_hash = hashobj([self.config["emodulus"],
+                               self.config["crosstalk"]])
         return get_sane_contour_spacing_range_for_slot_id(
-            self.identifier, feat)
+            self.identifier, feat, config_hash)
 
     def update_dataset(self, dataset):
         """Update the configuration of an instance of RTDCBase
@@ -222,43 +292,212 @@ class Dataslot(object):
 
 
 @functools.lru_cache(1000)
-def get_sane_contour_spacing_range_for_slot_id(slot_id, feat):
+def get_sane_contour_spacing_range_for_slot_id(slot_id, feat,
+                                               config_hash=None):
+    """Return the (cached) sane contour spacing range for a slot
+
+    `config_hash` is only used as a cache key; it must change
+    whenever the configuration of the slot changes in a way that
+    affects the feature data (see
+    :func:`Dataslot.get_sane_spacing_range`).
+    """
     slot = Dataslot.get_instances()[slot_id]
     ds = slot.get_dataset()
-    sp_min, sp_max = get_sane_contour_spacing_range(feat, ds[feat][:])
+    # Do not load the entire feature (`ds[feat][:]`), only the stored
+    # min/max values or the required events are read.
+    sp_min, sp_max = get_sane_contour_spacing_range(feat, ds[feat])
     return sp_min, sp_max
 
 
+def load_dataslots(paths, max_workers=None, callback=None):
+    """Create data slots for several measurements
+
+    The measurements are opened in parallel (see
+    :func:`open_datasets`) and the slots are created in
+    the calling thread.
+
+    Parameters
+    ----------
+    paths: list of str or pathlib.Path
+        Paths to measurements or DCOR URLs
+    max_workers: int
+        Maximum number of threads for opening the measurements
+    callback: callable
+        Progress callback (see :func:`open_datasets`)
+
+    Returns
+    -------
+    slots: list of Dataslot or None
+        Data slots in the order of `paths`; None if the
+        measurement could not be loaded
+    errors: list of tuple
+        Path and exception of each measurement that could
+        not be loaded
+    """
+    datasets, errors = open_datasets(paths, max_workers=max_workers,
+                                     callback=callback)
+    slots = []
+    for path, ds in zip(paths, datasets):
+        if ds is None:
+            slots.append(None)
+            continue
+        try:
+            slot = Dataslot(path=path, dataset=ds)
+        except BaseException as exc:
+            slots.append(None)
+            errors.append((path, exc))
+        else:
+            slots.append(slot)
+    return slots, errors
+
+
+def open_datasets(paths, max_workers=None, callback=None):
+    """Open several measurements in a thread pool
+
+    The datasets can be passed to :class:`Dataslot`, so that
+    every measurement is opened only once.
+
+    Parameters
+    ----------
+    paths: list of str or pathlib.Path
+        Paths to measurements or DCOR URLs
+    max_workers: int
+        Maximum number of threads for opening the measurements
+    callback: callable
+        Called in the calling thread with the number of opened
+        measurements and the total number of measurements
+        whenever a measurement was opened (e.g. for a progress bar)
+
+    Returns
+    -------
+    datasets: list of dclab.rtdc_dataset.RTDCBase or None
+        Datasets in the order of `paths`; None if the
+        measurement could not be opened
+    errors: list of tuple
+        Path and exception of each measurement that could
+        not be opened
+    """
+    paths = list(paths)
+    if max_workers is None:
+        max_workers = min(8, os.cpu_count() or 1)
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(paths))),
+            thread_name_prefix="DatasetLoader") as executor:
+        futures = [executor.submit(dclab.new_dataset, pp) for pp in paths]
+        for ii, _ in enumerate(concurrent.futures.as_completed(futures)):
+            if callback is not None:
+                callback(ii + 1, len(paths))
+    datasets = []
+    errors = []
+    for path, future in zip(paths, futures):
+        exc = future.exception()
+        if exc is None:
+            datasets.append(future.result())
+        else:
+            datasets.append(None)
+            errors.append((path, exc))
+    return datasets, errors
+
+
 def get_sane_contour_spacing_range(feat, data):
     """Return a sane range for contour spacing for a feature
 
+    If the min/max values of the feature are stored in the
+    measurement file (see :func:`get_stored_feature_range`),
+    the spacing is computed from those. Otherwise, only the
+    required events are read from `data` (e.g. the first 10000
+    events), so that the feature does not have to be loaded
+    completely from an HDF5 file or a remote location.
+
     Parameters
     ----------
     feat: str
         Name of the feature; If this is in :const:`.SLOPING_FEATURES`,
-        then spacing takes into account first and last item in `data`.
-        Otherwise, the first 10000 elements of `data` are used to
-        guess a sane contour spacing.
-    data: 1d ndarray
-        feature data
+        then spacing takes into account first and last valid item in
+        `data`. Otherwise, the first 10000 valid elements of `data`
+        are used to guess a sane contour spacing.
+    data: 1d array-like
+        feature data (supports slicing)
     """
+    stored = get_stored_feature_range(data)
+    if stored is not None:
+        frange = stored[1] - stored[0]
+        return frange / 1000, frange / 5
+    if hasattr(data, "h5ds"):
+        # slicing a dclab `H5ScalarEvent` loads the entire feature
+        data = data.h5ds
     if feat in SLOPING_FEATURES:
         frange = np.abs(data[-1] - data[0])
         if np.isnan(frange) or np.isinf(frange):
-            invalid = np.logical_or(np.isinf(data), np.isnan(data))
-            data_valid = data[~invalid]
-            frange = np.abs(data_valid[-1] - data_valid[0])
+            first = _get_finite_values(data, 1)
+            last = _get_finite_values(data, 1, from_end=True)
+            frange = np.abs(last[-1] - first[0]) if first.size else np.nan
     else:
         frange = np.ptp(data[:10000])
         if np.isnan(frange) or np.isinf(frange):
-            invalid = np.logical_or(np.isinf(data), np.isnan(data))
-            data_valid = data[~invalid]
-            frange = np.ptp(data_valid[:10000])
+            data_valid = _get_finite_values(data, 10000)
+            frange = np.ptp(data_valid) if data_valid.size else np.nan
     spmin = frange / 1000
     spmax = frange / 5
     return spmin, spmax
 
 
+def get_stored_feature_range(data):
+    """Return the min/max values stored with the feature data
+
+    dclab stores the min/max values of scalar features in the
+    attributes of the HDF5 datasets when writing .rtdc files.
+
+    Parameters
+    ----------
+    data: 1d array-like
+        feature data (e.g. `rtdc_ds[feat]`)
+
+    Returns
+    -------
+    frange: tuple of float or None
+        Stored (min, max) values; None if they are not stored or
+        not finite
+    """
+    attrs = getattr(getattr(data, "h5ds", None), "attrs", None)
+    if attrs is None:
+        return None
+    try:
+        fmin = float(attrs["min"])
+        fmax = float(attrs["max"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (np.isfinite(fmin) and np.isfinite(fmax)):
+        return None
+    return fmin, fmax
+
+
+def _get_finite_values(data, count, from_end=False, chunk_size=10000):
+    """Return the first (or last) `count` finite values of `data`
+
+    The data are read chunk by chunk until enough finite values
+    are found.
+    """
+    size = len(data)
+    found = []
+    num = 0
+    for start in range(0, size, chunk_size):
+        if from_end:
+            chunk = np.asarray(data[max(size - start - chunk_size, 0):
+                                    size - start])
+        else:
+            chunk = np.asarray(data[start:start + chunk_size])
+        chunk = chunk[np.isfinite(chunk)]
+        found.append(chunk)
+        num += chunk.size
+        if num >= count:
+            break
+    if from_end:
+        found = found[::-1]
+    values = np.concatenate(found) if found else np.zeros(0)
+    return values[-count:] if from_end else values[:count]
+
+
 def random_color():
     color = "#"
     for _ in range(3):
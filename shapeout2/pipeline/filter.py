@@ -2,11 +2,14 @@
 import copy
 
 import dclab
+import numpy as np
 
 from ..util import hashobj
 
+from .revision import RevisionMixin
 
-class Filter(object):
+
+class Filter(RevisionMixin):
     """Handles filters in a pipeline"""
     _instance_counter = 0
     _instances = {}
@@ -73,6 +76,7 @@ class Filter(object):
         self.general["remove invalid events"] = state["remove invalid events"]
         self.boxdict = state["box filters"]
         self.polylist = state["polygon filters"]
+        self.mark_modified()
 
     @staticmethod
     def get_filter(identifier):
@@ -92,6 +96,18 @@ class Filter(object):
     def get_instances():
         return Filter._instances
 
+    @staticmethod
+    def mark_polygon_filter_modified(pf_id):
+        """Mark all filters that use a polygon filter as modified
+
+        Call this after modifying the :class:`dclab.PolygonFilter`
+        with the unique identifier `pf_id` (changes of polygon
+        filters are not tracked by the filter revisions).
+        """
+        for filt in Filter._instances.values():
+            if pf_id in filt.polylist:
+                filt.mark_modified()
+
     @property
     def filter_used(self):
         return self.general["enable filters"]
@@ -137,25 +153,41 @@ class Filter(object):
     def update_dataset(self, dataset):
         """Update the filtering configuration of a dataset
 
+        Only the configuration keys that differ are modified, so
+        that the filter of the dataset only has to recompute the
+        criteria that changed.
+
         Notes
         -----
         Due to the design of the filtering pipeline, it is not
         possible to use manual filters. If any are set, they
         are removed from the filter.
         """
-        # remove all previous filters
-        dataset.reset_filter()
+        if not np.all(dataset.filter.manual):
+            # remove all previous filters
+            dataset.reset_filter()
         cfgfilt = dataset.config["filtering"]
 
-        # set general options
-        cfgfilt.update(self.general)
-        cfgfilt["limit events"] = self.limit_events[0] * self.limit_events[1]
-        # set box filters
+        # general options
+        newcfg = dict(self.general)
+        newcfg["limit events"] = self.limit_events[0] * self.limit_events[1]
+        # box filters
         for feat in self.boxdict:
             if self.boxdict[feat]["active"]:
-                cfgfilt["{} min".format(feat)] = self.boxdict[feat]["start"]
-                cfgfilt["{} max".format(feat)] = self.boxdict[feat]["end"]
-
-        # set polygon filters
-        for pid in self.polylist:
-            dataset.polygon_filter_add(pid)
+                newcfg["{} min".format(feat)] = self.boxdict[feat]["start"]
+                newcfg["{} max".format(feat)] = self.boxdict[feat]["end"]
+        # remove box filters that are not used anymore
+        for key in list(cfgfilt.keys()):
+            if (key not in newcfg
+                    and (key.endswith(" min") or key.endswith(" max"))
+                    and dclab.dfn.scalar_feature_exists(key[:-4])):
+                cfgfilt.pop(key)
+        for key in newcfg:
+            if cfgfilt.get(key) != newcfg[key]:
+                cfgfilt[key] = newcfg[key]
+
+        # polygon filters
+        if list(cfgfilt["polygon filters"]) != list(self.polylist):
+            cfgfilt["polygon filters"] = []
+            for pid in self.polylist:
+                dataset.polygon_filter_add(pid)
@@ -1,4 +1,18 @@
+import collections
+import weakref
+
 import dclab
+from ..util import hashobj
+
+from .ray_filter import RayHierarchy, set_mask_key
+
+
+#: mask fingerprints of datasets created by filter rays
+_fingerprints = weakref.WeakKeyDictionary()
+
+
+class RayModifiedError(RuntimeError):
+    """The slot or a filter was modified while the ray was updated"""
 
 
 class FilterRay(object):
@@ -16,25 +30,77 @@ class FilterRay(object):
         self.steps = []
         #: corresponds to hashes of the applied filters
         self.step_hashes = []
+        #: maximum number of steps kept in the step cache
+        self.max_cached_steps = 32
+        # all recently computed steps, keyed by the cumulative hash of
+        # the filters up to and including that step
+        self._step_cache = collections.OrderedDict()
         # holds the filters (protected so that users use set_filters)
         self._filters = []
         # used for testing (incremented when the ray is cut)
         self._generation = 0
         # used for checking validity of the ray
+        self._slot_revision = None
         self._slot_hash = "unset"
+        self._slot_generation = None
         self._root_child = None
+        # identifies the data of the root dataset (for the mask keys)
+        self._root_hash = None
 
     def __repr__(self):
         repre = "<Pipeline Filter Ray '{}' at {}>".format(self.identifier,
                                                           hex(id(self)))
         return repre
 
-    def _add_step(self, ds, filt):
-        """Add a filter step"""
-        self.step_hashes.append(filt.hash)
-        filt.update_dataset(ds)
-        self.steps.append(ds)
-        return self._new_child(ds, filt)
+    def _get_step(self, ii, step_key, filt, parent_ds, parent_filt):
+        """Return the cached step for `step_key` or create a new one
+
+        Parameters
+        ----------
+        ii: int
+            index of the step in the ray
+        step_key: str
+            cumulative hash of the filters up to and including `filt`
+        filt: Filter
+            filter applied to the step
+        parent_ds: RTDCBase
+            dataset of the previous step (or the slot dataset)
+        parent_filt: Filter or None
+            filter of the previous step (None for the first step)
+        """
+        ds = self._step_cache.get(step_key)
+        if ds is None:
+            ds = self._new_child(parent_ds, parent_filt,
+                                 apply_filter=parent_filt is None)
+            filt.update_dataset(ds)
+            self._step_cache[step_key] = ds
+            while len(self._step_cache) > self.max_cached_steps:
+                self._step_cache.popitem(last=False)
+        else:
+            self._step_cache.move_to_end(step_key)
+        if ii < len(self.steps) and self.steps[ii] is not ds:
+            # the filter ray is changing here
+            self.steps = self.steps[:ii]
+            self.step_hashes = self.step_hashes[:ii]
+            self._generation += 1  # for testing
+        if ii == len(self.steps):
+            self.steps.append(ds)
+            self.step_hashes.append(filt.hash)
+        return ds
+
+    @staticmethod
+    def _get_mask_key(parent_key, filt):
+        """Return the mask store key for a ray step
+
+        The key identifies the filter mask of the hierarchy child
+        to which `filt` is applied; `parent_key` is the key of the
+        previous step (or identifies the root dataset).
+        """
+        tohash = [parent_key, filt.hash]
+        for pid in filt.polylist:
+            pf = dclab.PolygonFilter.get_instance_from_id(pid)
+            tohash.append(pf.hash)
+        return hashobj(tohash)
 
     def _new_child(self, ds, filt=None, apply_filter=False):
         identifier = self.slot.identifier
@@ -42,7 +108,7 @@ class FilterRay(object):
             identifier += "-root"
         else:
             identifier += "-" + filt.identifier + "-child"
-        ds = dclab.rtdc_dataset.RTDC_Hierarchy(
+        ds = RayHierarchy(
             ds, apply_filter=apply_filter, identifier=identifier)
         return ds
 
@@ -63,15 +129,39 @@ class FilterRay(object):
         """This is the first element in self.steps
         (Will return a dataset even if self.steps is empty)
         """
-        if self._slot_hash != self.slot.hash:
-            # reset everything (e.g. emodulus recipe might have changed)
-            self.steps = []
-            self.step_hashes = []
+        self._check_slot()
+        if self.steps:
+            return self.steps[0]
+        if self._root_child is None:
             self._root_child = self._new_child(self.slot.get_dataset(),
                                                apply_filter=True)
-            self._slot_hash = self.slot.hash
         return self._root_child
 
+    def _check_slot(self):
+        """Reset the ray if the slot changed"""
+        generation = self.slot.dataset_generation
+        revision = self.slot.revision
+        if (self._slot_revision == revision
+                and self._slot_generation == generation):
+            return
+        # only reset the ray if the slot state actually changed
+        slot_hash = self.slot.hash
+        self._slot_revision = revision
+        if (self._slot_hash != slot_hash
+                or self._slot_generation != generation):
+            # reset everything (e.g. emodulus recipe might have changed
+            # or the dataset was closed by the handle pool)
+            self.steps = []
+            self.step_hashes = []
+            self._step_cache.clear()
+            self._root_child = None
+            root_ds = self.slot.get_dataset()
+            self._root_hash = hashobj([root_ds.hash,
+                                       get_mask_fingerprint(root_ds),
+                                       slot_hash])
+            self._slot_hash = slot_hash
+            self._slot_generation = generation
+
     def get_final_child(self, rtdc_ds=None, apply_filter=True):
         """Return the final ray child of `rtdc_ds`
 
@@ -92,13 +182,17 @@ class FilterRay(object):
         if rtdc_ds is None:
             # normal case
             external = False
+            # for detecting modifications in other threads (e.g. when
+            # the ray is updated in a worker thread)
+            revisions = [self.slot.revision] + [f.revision for f in filters]
+            self._check_slot()
             rtdc_ds = self.slot.get_dataset()
-            ds = self.root_child
+            mask_key = self._root_hash
         else:
             # ray is applied to other data
             external = True
-            # do not modify rtdc_ds (create a child to work with)
-            ds = self._new_child(rtdc_ds, apply_filter=True)
+            mask_key = hashobj([rtdc_ds.hash, get_mask_fingerprint(rtdc_ds),
+                                self.slot.hash])
 
         # Dear future self,
         #
@@ -106,37 +200,43 @@ class FilterRay(object):
         #
         # Sincerely,
         # past self
+        #
+        # P.S.: Well, there is a little bit of branching now. Every
+        # step is cached under the cumulative hash of its filters, so
+        # different filter prefixes (e.g. intermediate datasets in the
+        # analysis view) share all common steps.
 
-        if filters:
-            # apply all filters
-            for ii, filt in enumerate(filters):
-                # remember the previous hierarchy parent
-                # (ds is always used for the next iteration)
-                prev_ds = ds
-                if external:
-                    # do not touch self.steps or self.step_hashes
-                    filt.update_dataset(ds)
-                    ds = self._new_child(ds, filt)
-                elif len(self.steps) < ii+1:
-                    # just create a new step
-                    ds = self._add_step(ds, filt)
-                elif filt.hash != self.step_hashes[ii]:
-                    # the filter ray is changing here;
-                    # cut it and add a new step
-                    self.steps = self.steps[:ii]
-                    self.step_hashes = self.step_hashes[:ii]
-                    ds = self._add_step(ds, filt)
-                    self._generation += 1  # for testing
-                else:
-                    # the filters match so far
-                    if len(self.steps) > ii + 1:  # next child exists
-                        ds = self.steps[ii + 1]
-                    else:  # next child does not exist
-                        ds = self._new_child(ds, filt)
-            # we now have the entire filter pipeline in self.steps
-            final_ds = prev_ds
-        else:
-            final_ds = rtdc_ds
+        ds = rtdc_ds
+        step_key = self._root_hash
+        prev_filt = None
+        for ii, filt in enumerate(filters):
+            if external:
+                # do not touch self.steps or self.step_hashes
+                # (create a child to work with)
+                ds = self._new_child(ds, prev_filt,
+                                     apply_filter=prev_filt is None)
+                filt.update_dataset(ds)
+            else:
+                step_key = hashobj([step_key, filt.hash])
+                ds = self._get_step(ii, step_key, filt, ds, prev_filt)
+            # The key must be updated for existing steps as well,
+            # because polygon filters may have changed.
+            events_key = mask_key
+            mask_key = self._get_mask_key(events_key, filt)
+            set_mask_key(ds, mask_key, events_key=events_key)
+            prev_filt = filt
+        final_ds = ds
+        if (not external and revisions
+                != [self.slot.revision] + [f.revision for f in filters]):
+            # The steps and mask keys might not match the filters.
+            self.steps = []
+            self.step_hashes = []
+            self._step_cache.clear()
+            self._slot_revision = None
+            raise RayModifiedError(
+                f"The filters of {self} were modified in another thread!")
+        if not external:
+            set_mask_fingerprint(final_ds, self.get_mask_fingerprint())
         if apply_filter:
             final_ds.apply_filter()
         return final_ds
@@ -164,7 +264,52 @@ class FilterRay(object):
         ds = self.get_final_child(apply_filter=apply_filter)
         return ds
 
+    def get_mask_fingerprint(self):
+        """Return a fingerprint of the filter mask of the final dataset
+
+        The fingerprint is computed from the slot state that defines
+        the events (path, crosstalk and Young's modulus configuration)
+        and the hashes of the filters (including the polygon filters
+        they use), not from the actual filter array. It does not
+        depend on the slot identifier or appearance (e.g. the random
+        slot color), so it is the same in a new session.
+        """
+        tohash = [self.slot.path,
+                  self.slot.config["crosstalk"],
+                  self.slot.config["emodulus"]]
+        for filt in self.filters:
+            tohash.append(filt.hash)
+            for pid in filt.polylist:
+                pf = dclab.PolygonFilter.get_instance_from_id(pid)
+                tohash.append(pf.hash)
+        return hashobj(tohash)
+
     def set_filters(self, filters):
         """Set the filters of the current ray"""
         # only take into account active filters
         self._filters = [f for f in filters if f.filter_used]
+
+
+def get_mask_fingerprint(rtdc_ds):
+    """Return a fingerprint of the filtered events of a dataset
+
+    For datasets created by a :class:`FilterRay`, this is a cheap
+    operation. For all other datasets, the filter arrays of the
+    dataset and its hierarchy parents are hashed.
+    """
+    fingerprint = _fingerprints.get(rtdc_ds)
+    if fingerprint is None:
+        tohash = [rtdc_ds.filter.all]
+        if isinstance(rtdc_ds, dclab.rtdc_dataset.RTDC_Hierarchy):
+            tohash.append(get_mask_fingerprint(rtdc_ds.hparent))
+        fingerprint = hashobj(tohash)
+    return fingerprint
+
+
+def set_mask_fingerprint(rtdc_ds, fingerprint):
+    """Register the mask fingerprint of a dataset
+
+    Use this for datasets whose filtered events are fully defined
+    by a known state (e.g. the hierarchy children of a filter ray).
+    """
+    _fingerprints[rtdc_ds] = fingerprint
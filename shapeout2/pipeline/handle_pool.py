@@ -0,0 +1,128 @@
+"""Limit the number of concurrently opened measurement files"""
+import collections
+import contextlib
+import threading
+
+
+class HandlePool:
+    def __init__(self, max_open=256):
+        """Least-recently-used pool of open datasets
+
+        Data slots register their HDF5-based datasets with
+        :func:`touch` whenever they are accessed. If more than
+        `max_open` datasets are open, the least-recently-used
+        datasets are closed via :func:`Dataslot.close_dataset
+        <shapeout2.pipeline.Dataslot.close_dataset>` and reopened
+        by the slot on the next access.
+
+        Datasets of pinned slots (see :func:`pinned`) are never
+        closed, i.e. the number of opened datasets may exceed
+        `max_open` while many slots are pinned. Pin the slots
+        whose datasets are in use (e.g. during plotting or in
+        worker threads).
+
+        Parameters
+        ----------
+        max_open: int
+            Maximum number of concurrently opened datasets
+        """
+        #: maximum number of concurrently opened datasets
+        self.max_open = max_open
+        self._slots = collections.OrderedDict()
+        #: number of pins for each slot identifier
+        self._pins = collections.Counter()
+        self._lock = threading.RLock()
+
+    def __contains__(self, slot):
+        return slot.identifier in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _evict(self, keep=None):
+        """Close least-recently-used datasets of unpinned slots
+
+        The slot `keep` (e.g. the slot that was just accessed) is
+        not closed.
+        """
+        with self._lock:
+            excess = len(self._slots) - self.max_open
+            if excess <= 0:
+                return
+            evicted = []
+            for slot_id, slot in self._slots.items():
+                if len(evicted) == excess:
+                    break
+                if slot is not keep and not self._pins[slot_id]:
+                    evicted.append(slot)
+            for slot in evicted:
+                # removes the slot from the pool
+                slot.close_dataset()
+
+    def discard(self, slot):
+        """Remove a slot from the pool (without closing its dataset)"""
+        with self._lock:
+            self._slots.pop(slot.identifier, None)
+
+    def is_pinned(self, slot):
+        """Return whether the dataset of `slot` must not be closed"""
+        with self._lock:
+            return self._pins[slot.identifier] > 0
+
+    def pin(self, slot):
+        """Prevent closing the dataset of `slot` (see :func:`unpin`)"""
+        with self._lock:
+            self._pins[slot.identifier] += 1
+
+    @contextlib.contextmanager
+    def pinned(self, slots):
+        """Context manager that pins `slots` (see :func:`pin`)"""
+        slots = list(slots)
+        for slot in slots:
+            self.pin(slot)
+        try:
+            yield
+        finally:
+            for slot in slots:
+                self.unpin(slot)
+
+    def remove(self, slot):
+        """Remove a slot that is not used anymore
+
+        Other than :func:`discard`, this also removes all pins of
+        `slot` (e.g. a slot removed from the session).
+        """
+        with self._lock:
+            self._slots.pop(slot.identifier, None)
+            self._pins.pop(slot.identifier, None)
+
+    def set_max_open(self, max_open):
+        """Set the maximum number of opened datasets"""
+        self.max_open = max_open
+        self._evict()
+
+    def touch(self, slot):
+        """Mark the dataset of `slot` as recently used
+
+        Datasets of other (unpinned) slots are closed if there are
+        too many opened datasets.
+        """
+        with self._lock:
+            self._slots[slot.identifier] = slot
+            self._slots.move_to_end(slot.identifier)
+            self._evict(keep=slot)
+
+    def unpin(self, slot):
+        """Undo one call to :func:`pin`
+
+        Pending evictions take place with the next call to
+        :func:`touch`.
+        """
+        with self._lock:
+            self._pins[slot.identifier] -= 1
+            if self._pins[slot.identifier] <= 0:
+                del self._pins[slot.identifier]
+
+
+#: global pool of opened HDF5 datasets of data slots
+handle_pool = HandlePool()
@@ -0,0 +1,201 @@
+"""Stores for the filter masks of filter ray steps"""
+import collections
+import os
+import pathlib
+import threading
+import uuid
+
+import numpy as np
+
+
+class MaskStore:
+    def __init__(self, path=None, max_bytes=256 * 1024**2,
+                 max_disk_bytes=1024**3):
+        """Least-recently-used store for boolean filter masks
+
+        Masks are kept as bitsets (:func:`numpy.packbits`), i.e.
+        one bit per event. If `path` is set, masks are also written
+        to ``.npy`` files in that directory, so that they can be
+        reused in a later session. The directory is scanned once
+        in :func:`set_path`; afterwards, the size of the files is
+        tracked by the store.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path or None
+            Directory for persistent storage; set to None to keep
+            masks only in memory
+        max_bytes: int
+            Maximum number of bytes of the bitsets in memory
+        max_disk_bytes: int
+            Maximum number of bytes of the bitsets on disk
+        """
+        #: maximum size of the bitsets in memory [B]
+        self.max_bytes = max_bytes
+        #: maximum size of the bitsets on disk [B]
+        self.max_disk_bytes = max_disk_bytes
+        #: number of successful lookups
+        self.hits = 0
+        #: number of failed lookups
+        self.misses = 0
+        #: current size of the bitsets in memory [B]
+        self.nbytes = 0
+        #: current size of the files on disk [B]
+        self.disk_nbytes = 0
+        self.path = None
+        self._items = collections.OrderedDict()
+        # sizes of the files on disk in least-recently-used order
+        self._files = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self.set_path(path)
+
+    def __contains__(self, key):
+        return key in self._items or (
+            self.path is not None and (self.path / f"{key}.npy").exists())
+
+    def _evict(self):
+        """Remove least-recently-used bitsets until we are within limits"""
+        while self.nbytes > self.max_bytes and self._items:
+            _, (bits, _) = self._items.popitem(last=False)
+            self.nbytes -= bits.nbytes
+
+    def _evict_disk(self):
+        """Remove least-recently-used files until we are within limits"""
+        while self.disk_nbytes > self.max_disk_bytes and self._files:
+            key, size = self._files.popitem(last=False)
+            self.disk_nbytes -= size
+            try:
+                (self.path / f"{key}.npy").unlink()
+            except OSError:
+                pass
+
+    def _scan_disk(self):
+        """Determine the files in `self.path` in least-recently-used order
+
+        Temporary files of masks that are being written (possibly
+        by another process) are ignored.
+        """
+        files = []
+        for pp in self.path.glob("*.npy"):
+            if pp.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = pp.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, pp.stem, stat.st_size))
+        self._files.clear()
+        for _, key, size in sorted(files):
+            self._files[key] = size
+        self.disk_nbytes = sum(self._files.values())
+
+    def clear(self):
+        """Remove all masks (from memory and disk)"""
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            if self.path is not None:
+                self._scan_disk()
+                for key in self._files:
+                    try:
+                        (self.path / f"{key}.npy").unlink()
+                    except OSError:
+                        pass
+                self._files.clear()
+                self.disk_nbytes = 0
+
+    def get(self, key):
+        """Return the boolean mask for `key` or None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                if key in self._files:
+                    self._files.move_to_end(key)
+        if item is None and self.path is not None:
+            path = self.path / f"{key}.npy"
+            try:
+                data = np.load(path, allow_pickle=False)
+                os.utime(path)
+            except (OSError, ValueError):
+                pass
+            else:
+                # the first eight bytes hold the number of events
+                item = (data[8:], int(data[:8].view(np.uint64)[0]))
+                self._set_item(key, item)
+                with self._lock:
+                    if key in self._files:
+                        self._files.move_to_end(key)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        bits, size = item
+        return np.unpackbits(bits, count=size).astype(bool)
+
+    def set(self, key, mask):
+        """Store the boolean array `mask` under `key`"""
+        mask = np.asarray(mask, dtype=bool)
+        item = (np.packbits(mask), mask.size)
+        self._set_item(key, item)
+        if self.path is not None:
+            path = self.path / f"{key}.npy"
+            if path.exists():
+                return
+            header = np.array([mask.size], dtype=np.uint64).view(np.uint8)
+            temp_path = self.path / f".tmp-{key}-{uuid.uuid4().hex}.npy"
+            try:
+                np.save(temp_path, np.concatenate([header, item[0]]),
+                        allow_pickle=False)
+                size = temp_path.stat().st_size
+                temp_path.replace(path)
+            except OSError:
+                try:
+                    temp_path.unlink()
+                except OSError:
+                    pass
+            else:
+                with self._lock:
+                    if key not in self._files:
+                        self._files[key] = size
+                        self.disk_nbytes += size
+                        self._evict_disk()
+
+    def _set_item(self, key, item):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return
+            if item[0].nbytes > self.max_bytes:
+                return
+            self._items[key] = item
+            self.nbytes += item[0].nbytes
+            self._evict()
+
+    def set_path(self, path):
+        """Set the directory for persistent storage (None disables it)"""
+        with self._lock:
+            if path is not None:
+                path = pathlib.Path(path)
+                try:
+                    path.mkdir(parents=True, exist_ok=True)
+                except OSError:
+                    path = None
+            if path == self.path:
+                return
+            self.path = path
+            self._files.clear()
+            self.disk_nbytes = 0
+            if self.path is not None:
+                self._scan_disk()
+                self._evict_disk()
+
+
+#: global mask store for the filter masks of filter ray steps
+mask_store = MaskStore()
+
+#: memory-only store for the masks of individual filter criteria
+criterion_store = MaskStore(max_bytes=128 * 1024**2)
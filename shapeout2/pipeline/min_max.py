@@ -0,0 +1,105 @@
+"""Cached minimum and maximum values of filtered features"""
+import collections
+import threading
+
+import numpy as np
+
+from ..idiom import SLOPING_FEATURES
+from ..util import hashobj
+
+from .filter_ray import get_mask_fingerprint
+
+
+#: number of events that are reduced at once
+CHUNK_SIZE = 2**20
+#: maximum number of cached min/max values
+MAX_CACHED_ITEMS = 100000
+
+#: cached min/max values (see :func:`get_min_max`)
+_cache = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def clear_min_max_cache():
+    """Remove all cached min/max values"""
+    with _lock:
+        _cache.clear()
+
+
+def compute_min_max(data, mask, chunk_size=CHUNK_SIZE):
+    """Return minimum and maximum of the finite, filtered values
+
+    The data are reduced chunk by chunk with boolean `where`
+    masks, so that no copy of the filtered data is created
+    (and e.g. HDF5 datasets are read in chunks).
+
+    Parameters
+    ----------
+    data: 1D array-like
+        Feature data (supports slicing)
+    mask: 1D boolean ndarray
+        Filter array of the events
+    chunk_size: int
+        Number of events that are reduced at once
+
+    Returns
+    -------
+    vmin, vmax: float
+        Minimum and maximum; `np.inf` and `-np.inf` if there are
+        no finite, filtered values
+    """
+    vmin = np.inf
+    vmax = -np.inf
+    for start in range(0, len(mask), chunk_size):
+        stop = start + chunk_size
+        chunk = np.asarray(data[start:stop])
+        valid = np.isfinite(chunk)
+        valid &= mask[start:stop]
+        if not np.any(valid):
+            continue
+        if not np.issubdtype(chunk.dtype, np.floating):
+            # integer data cannot be reduced with an infinite initial
+            chunk = chunk.astype(float)
+        vmin = min(vmin, np.min(chunk, where=valid, initial=np.inf))
+        vmax = max(vmax, np.max(chunk, where=valid, initial=-np.inf))
+    return float(vmin), float(vmax)
+
+
+def get_min_max(rtdc_ds, feat):
+    """Return the (cached) min/max values of a filtered feature
+
+    The values are cached by dataset identifier, filter mask
+    fingerprint (see :func:`.filter_ray.get_mask_fingerprint`),
+    "calculation" configuration and feature name, i.e. they are
+    computed again when the filters of a ray change.
+
+    For features in :const:`shapeout2.idiom.SLOPING_FEATURES`,
+    only the first and last 1000 filtered events are used.
+
+    Returns
+    -------
+    vmin, vmax: float
+        Minimum and maximum; `np.inf` and `-np.inf` if there are
+        no finite, filtered values
+    """
+    key = hashobj([rtdc_ds.identifier, get_mask_fingerprint(rtdc_ds),
+                   rtdc_ds.config.get("calculation", ""), feat])
+    with _lock:
+        item = _cache.get(key)
+        if item is not None:
+            _cache.move_to_end(key)
+            return item
+    mask = rtdc_ds.filter.all
+    if feat in SLOPING_FEATURES:
+        # We are a little faster here.
+        idx = np.flatnonzero(mask)
+        idx = np.unique(np.concatenate([idx[:1000], idx[-1000:]]))
+        item = compute_min_max(rtdc_ds[feat][idx],
+                               np.ones(idx.size, dtype=bool))
+    else:
+        item = compute_min_max(rtdc_ds[feat], mask)
+    with _lock:
+        _cache[key] = item
+        while len(_cache) > MAX_CACHED_ITEMS:
+            _cache.popitem(last=False)
+    return item
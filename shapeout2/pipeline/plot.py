@@ -4,8 +4,11 @@ import dclab
 from dclab.kde import methods as kdem
 import numpy as np
 
+from .. import kde
 from ..util import hashobj
 
+from .revision import RevisionMixin
+
 
 DEFAULT_STATE = {
     "identifier": "no default",
@@ -22,7 +25,7 @@ DEFAULT_STATE = {
         "axis x": "area_um",
         "axis y": "deform",
         "isoelastics": True,  # display isoelasticity lines
-        "kde": "histogram",  # see dclab.kde.methods.methods
+        "kde": "histogram",  # see dclab.kde.methods.methods and kde.methods
         "range x": [0, 0],  # equal means no preference
         "range y": [0, 0],
         "scale x": "linear",
@@ -30,6 +33,7 @@ DEFAULT_STATE = {
     },
     "scatter": {
         "colormap": "viridis",  # only applies when hue is "kde" or "feature"
+        "density scale": "log",  # count scaling for mode "density image"
         "downsample": True,
         "downsampling value": 5000,
         "enabled": True,
@@ -39,6 +43,7 @@ DEFAULT_STATE = {
         "marker alpha": 0.3,  # alpha value for feature-hue plots
         "marker hue": "kde",  # hue defined by: kde, dataset, feature, none
         "marker size": 3.0,  # marker size [pt]
+        "mode": "markers",  # "markers" or "density image" (all events)
         "show event count": True,  # display event count
     },
     "contour": {
@@ -52,7 +57,7 @@ DEFAULT_STATE = {
     }
 }
 
-_kde_methods = sorted(kdem.methods.keys())
+_kde_methods = sorted(list(kdem.methods.keys()) + list(kde.methods.keys()))
 _kde_methods.remove("none")  # does not make sense here
 
 STATE_OPTIONS = {
@@ -81,6 +86,7 @@ STATE_OPTIONS = {
     "scatter": {
         "colormap": ["bipolar", "grayblue", "graygreen", "grayorange",
                      "grayred", "inferno", "plasma", "viridis"],
+        "density scale": ["linear", "log"],
         "downsampling": bool,
         "downsampling value": int,
         "enabled":  bool,
@@ -92,6 +98,7 @@ STATE_OPTIONS = {
         "marker alpha": float,
         "marker hue": ["dataset", "kde", "feature", "none"],
         "marker size": float,
+        "mode": ["markers", "density image"],
         "show event count": bool,
     },
     "contour": {
@@ -106,7 +113,7 @@ STATE_OPTIONS = {
 }
 
 
-class Plot(object):
+class Plot(RevisionMixin):
     """Handles plotting information in a pipeline"""
     _instance_counter = 0
     _instances = {}
@@ -153,7 +160,11 @@ class Plot(object):
             state["general"]["range x"] = [0, 0]
         if np.any(np.isinf(state["general"]["range y"])):
             state["general"]["range y"] = [0, 0]
+        # scatter plot rendering options added in Shape-Out 2.23.0
+        for key in ["density scale", "mode"]:
+            state["scatter"].setdefault(key, DEFAULT_STATE["scatter"][key])
         self._state = state
+        self.mark_modified()
 
     @staticmethod
     def get_instances():
@@ -185,3 +196,4 @@ class Plot(object):
     @name.setter
     def name(self, value):
         self._state["layout"]["name"] = value
+        self.mark_modified()
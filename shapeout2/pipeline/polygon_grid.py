@@ -0,0 +1,177 @@
+"""Fast evaluation of polygon filters with a grid of cells"""
+import collections
+import threading
+
+from dclab.external.skimage.measure import points_in_poly
+import numpy as np
+
+
+#: grids of recently used polygons (see :func:`get_polygon_grid`)
+_grids = collections.OrderedDict()
+_lock = threading.Lock()
+#: maximum number of cached grids
+MAX_CACHED_GRIDS = 64
+
+
+class PolygonGrid(object):
+    def __init__(self, points, size=64):
+        """Uniform grid of cells over the bounding box of a polygon
+
+        Cells that are crossed by (or close to) an edge of the
+        polygon are "boundary" cells. All other cells are either
+        completely inside or completely outside of the polygon,
+        which is determined once by testing the cell center.
+        When evaluating events, the exact point-in-polygon test
+        is only run for events in boundary cells.
+
+        Parameters
+        ----------
+        points: 2D ndarray of shape (N, 2)
+            Vertices of the polygon
+        size: int
+            Number of cells along each axis
+        """
+        self.points = np.array(points, dtype=float)
+        #: number of cells along each axis
+        self.size = size
+        xmin, ymin = np.min(self.points, axis=0)
+        xmax, ymax = np.max(self.points, axis=0)
+        #: bounding box of the polygon (xmin, xmax, ymin, ymax)
+        self.bbox = xmin, xmax, ymin, ymax
+        # Margin that is much larger than any rounding error of the
+        # exact point-in-polygon test, so that events outside of the
+        # boundary cells are never close to an edge.
+        self.margin_x = 1e-9 * (abs(xmin) + abs(xmax) + (xmax - xmin))
+        self.margin_y = 1e-9 * (abs(ymin) + abs(ymax) + (ymax - ymin))
+        self.dx = (xmax - xmin) / size
+        self.dy = (ymax - ymin) / size
+        if self.dx == 0 or self.dy == 0:
+            # degenerate polygon (no events inside)
+            self.boundary = np.zeros((size, size), dtype=bool)
+            self.inside = np.zeros((size, size), dtype=bool)
+        else:
+            #: cells crossed by an edge of the polygon
+            self.boundary = self._get_boundary_cells()
+            #: cells completely inside of the polygon
+            self.inside = self._get_inside_cells()
+
+    def _cell_index(self, value, origin, width):
+        """Cell index of a coordinate, clipped to the grid"""
+        return min(max(int(np.floor((value - origin) / width)), 0),
+                   self.size - 1)
+
+    def _get_boundary_cells(self):
+        """Return the cells that are touched by an edge
+
+        This is a conservative estimate: each edge is expanded by
+        the margin and all cells touching its extent within each
+        column are marked.
+        """
+        xmin, _, ymin, _ = self.bbox
+        mx, my = self.margin_x, self.margin_y
+        boundary = np.zeros((self.size, self.size), dtype=bool)
+        for (xa, ya), (xb, yb) in zip(self.points,
+                                      np.roll(self.points, -1, axis=0)):
+            xlo = min(xa, xb) - mx
+            xhi = max(xa, xb) + mx
+            i0 = self._cell_index(xlo, xmin, self.dx)
+            i1 = self._cell_index(xhi, xmin, self.dx)
+            for ii in range(i0, i1 + 1):
+                # part of the edge within this column
+                cx0 = max(xmin + ii * self.dx, xlo)
+                cx1 = min(xmin + (ii + 1) * self.dx, xhi)
+                if xa == xb:
+                    yvals = [ya, yb]
+                else:
+                    tt = np.clip((np.array([cx0, cx1]) - xa) / (xb - xa),
+                                 0, 1)
+                    yvals = ya + tt * (yb - ya)
+                j0 = self._cell_index(min(yvals) - my, ymin, self.dy)
+                j1 = self._cell_index(max(yvals) + my, ymin, self.dy)
+                boundary[ii, j0:j1 + 1] = True
+        return boundary
+
+    def _get_inside_cells(self):
+        """Return the non-boundary cells that are inside the polygon"""
+        xmin, _, ymin, _ = self.bbox
+        centers = (np.arange(self.size) + .5)
+        cx, cy = np.meshgrid(xmin + centers * self.dx,
+                             ymin + centers * self.dy,
+                             indexing="ij")
+        inside = np.zeros((self.size, self.size), dtype=bool)
+        free = ~self.boundary
+        inside[free] = points_in_poly(
+            np.stack([cx[free], cy[free]], axis=1), verts=self.points)
+        return inside
+
+    def contains(self, datax, datay):
+        """Return a boolean array of events inside the polygon
+
+        The result is identical to :func:`points_in_poly` (which
+        is used by :func:`dclab.PolygonFilter.filter`).
+        """
+        datax = np.asarray(datax)
+        datay = np.asarray(datay)
+        xmin, xmax, ymin, ymax = self.bbox
+        result = np.zeros(datax.shape, dtype=bool)
+        # Bounding box prefilter: The exact test never counts an edge
+        # crossing for y < ymin or y >= ymax, and for events left or
+        # right of the polygon the number of crossings is even. nan
+        # values are excluded as well.
+        with np.errstate(invalid="ignore"):
+            inbox = ((datax >= xmin - self.margin_x)
+                     & (datax <= xmax + self.margin_x)
+                     & (datay >= ymin)
+                     & (datay < ymax))
+        idx = np.flatnonzero(inbox)
+        if idx.size == 0:
+            return result
+        bx = datax[idx]
+        by = datay[idx]
+        ci = ((bx - xmin) / self.dx).astype(np.intp)
+        cj = ((by - ymin) / self.dy).astype(np.intp)
+        # events within the margin (or at xmax) are clipped to the grid
+        np.clip(ci, 0, self.size - 1, out=ci)
+        np.clip(cj, 0, self.size - 1, out=cj)
+        cells = ci * self.size + cj
+        sub = self.inside.ravel()[cells]
+        onb = self.boundary.ravel()[cells]
+        if np.any(onb):
+            sub[onb] = points_in_poly(
+                np.stack([bx[onb], by[onb]], axis=1), verts=self.points)
+        result[idx] = sub
+        return result
+
+
+def get_polygon_grid(pf):
+    """Return the (cached) :class:`PolygonGrid` of a polygon filter"""
+    key = pf.hash
+    with _lock:
+        grid = _grids.get(key)
+        if grid is not None:
+            _grids.move_to_end(key)
+    if grid is None:
+        grid = PolygonGrid(pf.points)
+        with _lock:
+            _grids[key] = grid
+            while len(_grids) > MAX_CACHED_GRIDS:
+                _grids.popitem(last=False)
+    return grid
+
+
+def polygon_filter(pf, datax, datay):
+    """Evaluate a polygon filter using a :class:`PolygonGrid`
+
+    This yields the same result as :func:`dclab.PolygonFilter.filter`.
+
+    Parameters
+    ----------
+    pf: dclab.PolygonFilter
+        Polygon filter
+    datax, datay: 1D ndarray
+        Data of the features `pf.axes`
+    """
+    inside = get_polygon_grid(pf).contains(datax, datay)
+    if pf.inverted:
+        inside = np.invert(inside)
+    return inside
@@ -0,0 +1,265 @@
+"""Sorted feature indices for fast box filter range queries"""
+import collections
+import threading
+import weakref
+
+import dclab
+import numpy as np
+
+from ..util import hashobj
+
+
+class RangeIndex(object):
+    def __init__(self, data):
+        """Sorted index of a scalar feature
+
+        The events are sorted once (O(N log N)); afterwards, the
+        events within a range are found by bisection (O(log N)).
+        nan-values are sorted to the end and are never within a
+        range (like in dclab box filters).
+
+        Parameters
+        ----------
+        data: 1D ndarray
+            Scalar feature data
+        """
+        data = np.asarray(data)
+        #: indices that sort the data
+        self.order = np.argsort(data, kind="stable")
+        #: sorted data
+        self.values = data[self.order]
+        #: number of events
+        self.size = data.size
+        # mask and bounds of the previous call to `get_mask`
+        self._mask = None
+        self._bounds = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """Memory used by the index [B]"""
+        return self.order.nbytes + self.values.nbytes + self.size
+
+    def get_bounds(self, start, end):
+        """Return the slice `(lo, hi)` of events with start <= x <= end
+
+        The indices refer to :const:`RangeIndex.order`.
+        """
+        lo = int(np.searchsorted(self.values, start, side="left"))
+        hi = int(np.searchsorted(self.values, end, side="right"))
+        return lo, max(lo, hi)
+
+    def count(self, start, end):
+        """Return the number of events with `start <= x <= end`"""
+        lo, hi = self.get_bounds(start, end)
+        return hi - lo
+
+    def get_mask(self, start, end, indices=None):
+        """Return a boolean array with `start <= x <= end`
+
+        The mask of the previous call is updated incrementally
+        (see :func:`update_mask`), so small changes of the range
+        (e.g. when moving a range slider) are cheap.
+
+        Parameters
+        ----------
+        start, end: float
+            Range of the feature values
+        indices: 1D int ndarray or None
+            If given, only return the mask for these events (e.g.
+            the events of a hierarchy child, see
+            :func:`get_root_indices`)
+        """
+        with self._lock:
+            if self._mask is None:
+                self._mask = np.zeros(self.size, dtype=bool)
+                self._bounds = self.get_bounds(start, end)
+                lo, hi = self._bounds
+                self._mask[self.order[lo:hi]] = True
+            else:
+                self._bounds = self.update_mask(self._mask, self._bounds,
+                                                start, end)
+            if indices is None:
+                return self._mask.copy()
+            else:
+                return self._mask[indices]
+
+    def update_mask(self, mask, bounds, start, end):
+        """Update a mask for a new range
+
+        Only the events between the old and the new boundaries
+        are modified.
+
+        Parameters
+        ----------
+        mask: 1D boolean ndarray
+            The mask for the range given by `bounds` (for all
+            events); it is modified in-place
+        bounds: tuple of int
+            The bounds `(lo, hi)` of `mask` (see :func:`get_bounds`)
+        start, end: float
+            The new range
+
+        Returns
+        -------
+        bounds: tuple of int
+            The bounds of the new range
+        """
+        lo0, hi0 = bounds
+        lo1, hi1 = self.get_bounds(start, end)
+        if lo1 >= hi0 or lo0 >= hi1:
+            # ranges do not overlap
+            mask[self.order[lo0:hi0]] = False
+            mask[self.order[lo1:hi1]] = True
+        else:
+            if lo1 < lo0:
+                mask[self.order[lo1:lo0]] = True
+            else:
+                mask[self.order[lo0:lo1]] = False
+            if hi1 > hi0:
+                mask[self.order[hi0:hi1]] = True
+            else:
+                mask[self.order[hi1:hi0]] = False
+        return lo1, hi1
+
+
+class RangeIndexCache(object):
+    def __init__(self, max_bytes=512 * 1024**2, min_requests=3):
+        """Memory-bounded least-recently-used cache for range indices
+
+        Sorting the events of a feature (O(N log N)) and keeping the
+        index in memory (17 bytes per event) only pays off if the
+        range of that feature is changed repeatedly (e.g. when a box
+        filter range slider is moved). An index is thus only built
+        at the `min_requests`-th request for a feature of a dataset.
+        Indices are evicted in least-recently-used order as soon as
+        their total size exceeds `max_bytes`.
+
+        Parameters
+        ----------
+        max_bytes: int
+            Maximum number of bytes the indices may occupy
+        min_requests: int
+            Number of requests after which an index is built
+        """
+        #: maximum size of all indices [B]
+        self.max_bytes = max_bytes
+        #: number of requests after which an index is built
+        self.min_requests = min_requests
+        #: current size of all indices [B]
+        self.nbytes = 0
+        # (dataset reference, feature) -> [calculation key,
+        # number of requests, RangeIndex or None] in LRU order
+        self._entries = collections.OrderedDict()
+        # reentrant, because entries are removed when datasets are
+        # garbage-collected (see `_on_dataset_deleted`)
+        self._lock = threading.RLock()
+
+    def _evict(self):
+        """Remove least-recently-used indices until we are within limits"""
+        for key in list(self._entries):
+            if self.nbytes <= self.max_bytes:
+                break
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._pop_index(entry)
+
+    def _on_dataset_deleted(self, ref):
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] is ref:
+                    self._pop_index(self._entries.pop(key))
+
+    def _pop_index(self, entry):
+        if entry[2] is not None:
+            self.nbytes -= entry[2].nbytes
+            entry[2] = None
+
+    def clear(self):
+        """Remove all indices and request counts"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def get(self, rtdc_ds, feat):
+        """Return the :class:`RangeIndex` of a feature or None
+
+        None is returned if there were fewer than `min_requests`
+        requests for the feature of `rtdc_ds`; the caller should
+        then compare the feature data with the range directly (O(N)).
+        The request count is reset when the "calculation"
+        configuration of an ancillary feature changes.
+        """
+        if feat in rtdc_ds.features_innate:
+            calc_key = None
+        else:
+            calc_key = hashobj(rtdc_ds.config.get("calculation", ""))
+        with self._lock:
+            key = (weakref.ref(rtdc_ds), feat)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != calc_key:
+                if entry is None:
+                    # remove all entries when the dataset is deleted
+                    key = (weakref.ref(rtdc_ds, self._on_dataset_deleted),
+                           feat)
+                else:
+                    self._pop_index(entry)
+                entry = self._entries[key] = [calc_key, 0, None]
+            self._entries.move_to_end(key)
+            entry[1] += 1
+            if entry[2] is not None or entry[1] < self.min_requests:
+                return entry[2]
+        # sort outside of the lock
+        index = RangeIndex(rtdc_ds[feat])
+        if index.nbytes > self.max_bytes:
+            # do not flush the entire cache for a single index
+            return index
+        with self._lock:
+            if entry[2] is None and entry[0] == calc_key:
+                entry[2] = index
+                self.nbytes += index.nbytes
+                self._evict()
+        return index
+
+    def set_max_bytes(self, max_bytes):
+        """Change the size limit, evicting indices if necessary"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+
+def get_range_index(rtdc_ds, feat):
+    """Return the (cached) :class:`RangeIndex` of a feature or None
+
+    For hierarchy children, the index of the root parent is
+    returned; use :func:`get_root_indices` to map it to the
+    events of the child.
+
+    No index is built for the first few requests of a feature
+    (see :class:`RangeIndexCache`); None is returned and the
+    feature data should be compared with the range directly.
+    The indices of ancillary features (e.g. "emodulus" or
+    crosstalk-corrected fluorescence) are computed again when
+    the "calculation" configuration of the dataset changes.
+    """
+    if isinstance(rtdc_ds, dclab.rtdc_dataset.RTDC_Hierarchy):
+        rtdc_ds = rtdc_ds.get_root_parent()
+    return range_index_cache.get(rtdc_ds, feat)
+
+
+def get_root_indices(rtdc_ds):
+    """Return the indices of the events of `rtdc_ds` in its root parent
+
+    Returns None if `rtdc_ds` is not a hierarchy child.
+    """
+    if not isinstance(rtdc_ds, dclab.rtdc_dataset.RTDC_Hierarchy):
+        return None
+    indices = np.flatnonzero(rtdc_ds.hparent.filter.all)
+    parent_indices = get_root_indices(rtdc_ds.hparent)
+    if parent_indices is not None:
+        indices = parent_indices[indices]
+    return indices
+
+
+#: range indices of root datasets (see :func:`get_range_index`)
+range_index_cache = RangeIndexCache()
@@ -0,0 +1,355 @@
+"""Hierarchy children and filters used by filter rays"""
+import warnings
+import weakref
+
+import dclab
+from dclab import downsampling
+from dclab.rtdc_dataset import RTDC_Hierarchy
+from dclab.rtdc_dataset.filter import NanWarning
+from dclab.rtdc_dataset.fmt_hierarchy import HierarchyFilter
+import numpy as np
+
+from ..util import hashobj
+
+from .mask_store import criterion_store, mask_store
+from .polygon_grid import polygon_filter
+from .range_index import get_range_index, get_root_indices
+
+
+#: mask store keys of datasets created by filter rays
+_mask_keys = weakref.WeakKeyDictionary()
+
+
+class RayHierarchyFilter(HierarchyFilter):
+    """Hierarchy filter with cached masks for the individual criteria
+
+    Each filter criterion (invalid events, one box filter per
+    feature, one polygon filter per identifier) is cached as a
+    separate mask together with its parameters, and only criteria
+    whose parameters changed are computed again. The masks are
+    combined with a single :func:`numpy.logical_and.reduce`.
+
+    If a mask store key is registered for the dataset (see
+    :func:`set_mask_key`), the masks of the individual criteria
+    are shared via :const:`.mask_store.criterion_store` with other
+    hierarchy children of the same parent (e.g. when a box filter
+    range is modified, all other criteria are reused), and the
+    final mask is stored in :const:`.mask_store.mask_store`. If the
+    final mask is already stored, no criterion is evaluated at all.
+
+    Box filters of features whose range is changed repeatedly are
+    evaluated with the sorted range indices of the root dataset (see
+    :mod:`.range_index`) and polygon filters with a grid of cells
+    (see :mod:`.polygon_grid`).
+    """
+
+    def __init__(self, rtdc_ds):
+        super(RayHierarchyFilter, self).__init__(rtdc_ds)
+        #: names of the criteria used in the last update
+        self.criteria = []
+
+    def __getitem__(self, key):
+        """Return the box filter of a feature (read-only)"""
+        arr = super(RayHierarchyFilter, self).__getitem__(key)
+        self._evaluate_criteria()
+        item = self._criteria.get("box " + key)
+        if item is not None:
+            arr = item[1]
+        arr = arr.view()
+        arr.flags.writeable = False
+        return arr
+
+    @property
+    def box(self):
+        """All box filters"""
+        return self._combine_criteria("box ")
+
+    @property
+    def polygon(self):
+        """Polygon filters"""
+        return self._combine_criteria("polygon ")
+
+    @property
+    def invalid(self):
+        """Invalid (nan/inf) events"""
+        return self._combine_criteria("invalid")
+
+    def _combine_criteria(self, prefix):
+        self._evaluate_criteria()
+        masks = [self._criteria[name][1] for name in self.criteria
+                 if name.startswith(prefix)]
+        if masks:
+            arr = np.logical_and.reduce(masks)
+        else:
+            arr = np.ones(self.size, dtype=bool)
+        arr.flags.writeable = False
+        return arr
+
+    def _evaluate_criteria(self):
+        """Evaluate the criteria if the final mask was loaded from the store
+
+        The criteria are evaluated for the filtering configuration
+        of the last update.
+        """
+        if self._unevaluated is not None:
+            ds_ref, events_key = self._unevaluated
+            self._unevaluated = None
+            rtdc_ds = ds_ref()
+            if rtdc_ds is not None:
+                self._update_criteria(rtdc_ds, self._old_config, [],
+                                      events_key)
+
+    def _get_criterion(self, name, params, compute, events_key=None,
+                       force=False):
+        """Return the (cached) mask of a filter criterion
+
+        Parameters
+        ----------
+        name: str
+            Name of the criterion (e.g. "box deform")
+        params: tuple or str
+            Parameters of the criterion; the mask is computed
+            again if these change
+        compute: callable
+            Function that computes the mask
+        events_key: str or None
+            Identifies the events of the dataset (used as a key for
+            sharing the mask with other hierarchy children)
+        force: bool
+            Do not use cached masks
+        """
+        item = self._criteria.get(name)
+        if not force and item is not None and item[0] == params:
+            return item[1]
+        mask = None
+        if events_key is not None:
+            key = hashobj([events_key, name, params])
+            if not force:
+                mask = criterion_store.get(key)
+        if mask is None or mask.size != self.size:
+            mask = compute()
+            if events_key is not None:
+                criterion_store.set(key, mask)
+        self._criteria[name] = (params, mask)
+        return mask
+
+    def _warn_nan(self, rtdc_ds, feat, events_key):
+        """Warn if a box-filtered feature contains nan-values"""
+        key, has_nan = self._nan_features.get(feat, (None, None))
+        if events_key is None or key != events_key:
+            has_nan = bool(np.any(np.isnan(rtdc_ds[feat])))
+            self._nan_features[feat] = (events_key, has_nan)
+        if has_nan:
+            warnings.warn("Feature '{}' contains ".format(feat)
+                          + "nan-values! Box filters remove those.",
+                          NanWarning)
+
+    def reset(self):
+        super(RayHierarchyFilter, self).reset()
+        #: cached masks of the individual criteria (name: (params, mask))
+        self._criteria = {}
+        self.criteria = []
+        #: whether box-filtered features contain nan (feat: (key, bool))
+        self._nan_features = {}
+        # dataset and events key if the criteria of the last update
+        # were not evaluated (see `_evaluate_criteria`)
+        self._unevaluated = None
+
+    def update(self, rtdc_ds, force=None):
+        """Update the filters according to `rtdc_ds.config["filtering"]`
+
+        This is a reimplementation of
+        :func:`dclab.rtdc_dataset.filter.Filter.update` that yields
+        the same :const:`all` filter. Other than in dclab, criteria
+        are not re-evaluated when their parameters did not change,
+        and the box filters of the individual features (``filter[feat]``)
+        are read-only. If the final mask is loaded from the mask
+        store, the criteria (:const:`box`, :const:`polygon`,
+        :const:`invalid`, and ``filter[feat]``) are only evaluated
+        when they are accessed.
+        """
+        if force is None:
+            force = []
+        mask_key, events_key = _mask_keys.get(rtdc_ds, (None, None))
+        # manual filters are not part of the keys
+        if self._man_root_ids or not np.all(self.manual):
+            mask_key = events_key = None
+
+        self._init_rtdc_ds(rtdc_ds)
+        cfg = rtdc_ds.config["filtering"]
+        arr_all = self._get_rw_array("all")
+
+        if mask_key is not None and not force:
+            mask = mask_store.get(mask_key)
+            if mask is not None and mask.size == self.size:
+                arr_all[:] = mask
+                # The criteria are evaluated when they are accessed.
+                self._unevaluated = (weakref.ref(rtdc_ds), events_key)
+                self._old_config = rtdc_ds.config.copy()["filtering"]
+                return
+
+        self._unevaluated = None
+        masks = self._update_criteria(rtdc_ds, cfg, force, events_key)
+
+        # 4. Manual filters
+        if not np.all(self.manual):
+            masks.append(self.manual)
+
+        # 5. Finally combine all filters and apply "limit events"
+        if cfg["enable filters"]:
+            if masks:
+                np.logical_and.reduce(masks, out=arr_all)
+            else:
+                arr_all[:] = True
+            # Filter with configuration keyword argument "limit events".
+            # This additional step limits the total number of events in
+            # self.all.
+            if cfg["limit events"] > 0:
+                limit = cfg["limit events"]
+                sub = arr_all[arr_all]
+                _, idx = downsampling.downsample_rand(sub,
+                                                      samples=limit,
+                                                      ret_idx=True)
+                sub[~idx] = False
+                arr_all[arr_all] = sub
+        else:
+            arr_all[:] = True
+
+        self._old_config = rtdc_ds.config.copy()["filtering"]
+        if mask_key is not None and not force:
+            mask_store.set(mask_key, arr_all)
+
+    def _update_criteria(self, rtdc_ds, cfg, force, events_key):
+        """Evaluate the criteria of the filtering configuration `cfg`
+
+        Returns the list of masks of all criteria.
+        """
+        masks = []
+        criteria = []
+        # 1. Invalid filters
+        if cfg["remove invalid events"]:
+            features = tuple(self.features)
+
+            def compute_invalid():
+                valid = np.ones(self.size, dtype=bool)
+                for feat in features:
+                    valid &= np.isfinite(rtdc_ds[feat])
+                return valid
+
+            criteria.append("invalid")
+            masks.append(self._get_criterion(
+                "invalid", features, compute_invalid, events_key))
+
+        # 2. Box filters
+        root_indices = []
+        for fstart in list(cfg.keys()):
+            if not fstart.endswith(" min"):
+                continue
+            feat = fstart[:-4]
+            fend = feat + " max"
+            if not dclab.dfn.scalar_feature_exists(feat):
+                continue
+            if fend not in cfg:
+                # User is responsible for setting min and max values!
+                raise ValueError("Box filter: Please make sure that both "
+                                 "'{}' and '{}' are set!".format(fstart, fend))
+            start = cfg[fstart]
+            end = cfg[fend]
+            if feat not in self.features:
+                if start != end:
+                    warnings.warn(
+                        "Dataset '{}' does ".format(rtdc_ds.identifier)
+                        + "not contain the feature '{}'! ".format(feat)
+                        + "A box filter has been ignored.")
+                continue
+            if start == end:
+                continue
+            if start > end:
+                warnings.warn("inverting filter: {} > {}".format(fstart,
+                                                                 fend))
+                start, end = end, start
+
+            if feat == "index":
+                # hierarchy children have their own event index
+                def compute_box(feat=feat, start=start, end=end):
+                    data = rtdc_ds[feat]
+                    return (start <= data) & (data <= end)
+            else:
+                def compute_box(feat=feat, start=start, end=end):
+                    index = get_range_index(rtdc_ds, feat)
+                    if index is None:
+                        data = rtdc_ds[feat]
+                        return (start <= data) & (data <= end)
+                    if not root_indices:
+                        root_indices.append(get_root_indices(rtdc_ds))
+                    return index.get_mask(start, end,
+                                          indices=root_indices[0])
+
+            if not cfg["remove invalid events"]:
+                self._warn_nan(rtdc_ds, feat, events_key)
+
+            name = "box " + feat
+            criteria.append(name)
+            masks.append(self._get_criterion(
+                name, (start, end), compute_box, events_key,
+                force=feat in force))
+        for feat in force:
+            # Make sure the feature name is valid.
+            if not dclab.dfn.scalar_feature_exists(feat):
+                raise ValueError(
+                    "Unknown scalar feature name '{}'!".format(feat))
+
+        # 3. Polygon filters
+        for pf_id in cfg["polygon filters"]:
+            pf = dclab.PolygonFilter.get_instance_from_id(pf_id)
+
+            def compute_polygon(pf=pf):
+                return polygon_filter(pf, rtdc_ds[pf.axes[0]],
+                                      rtdc_ds[pf.axes[1]])
+
+            name = "polygon {}".format(pf_id)
+            criteria.append(name)
+            masks.append(self._get_criterion(
+                name, pf.hash, compute_polygon, events_key))
+
+        # remove criteria that are not used anymore
+        for name in list(self._criteria.keys()):
+            if name not in criteria:
+                self._criteria.pop(name)
+        self.criteria = criteria
+
+        return masks
+
+
+class RayHierarchy(RTDC_Hierarchy):
+    """Hierarchy child using :class:`RayHierarchyFilter`"""
+
+    def __init__(self, *args, **kwargs):
+        super(RayHierarchy, self).__init__(*args, **kwargs)
+        # dclab derives the format from the class name (used e.g.
+        # for writing basins during export)
+        self.format = "hierarchy"
+
+    def _assert_filter(self):
+        if self._ds_filter is None:
+            self._ds_filter = RayHierarchyFilter(self)
+
+
+def set_mask_key(rtdc_ds, key, events_key=None):
+    """Register the mask store keys of a dataset
+
+    Parameters
+    ----------
+    rtdc_ds: RayHierarchy
+        Hierarchy child of a filter ray
+    key: str or None
+        Identifies the filter mask of `rtdc_ds`; set to None to
+        unregister the dataset
+    events_key: str or None
+        Identifies the events of `rtdc_ds` (i.e. the filter mask
+        of its hierarchy parent)
+    """
+    if key is None:
+        _mask_keys.pop(rtdc_ds, None)
+    else:
+        _mask_keys[rtdc_ds] = (key, events_key)
@@ -0,0 +1,197 @@
+"""Revision counters for change detection of pipeline elements"""
+import copy
+import itertools
+
+
+#: global counter; revisions are unique and increase monotonically
+_counter = itertools.count(1)
+
+
+def next_revision():
+    """Return a new revision number"""
+    return next(_counter)
+
+
+def track(value, callback):
+    """Wrap dictionaries and lists so that changes call `callback`
+
+    Nested dictionaries and lists are wrapped as well. Other
+    values are returned unchanged.
+    """
+    if isinstance(value, dict):
+        return RevisionDict(value, callback)
+    elif isinstance(value, list):
+        return RevisionList(value, callback)
+    else:
+        return value
+
+
+class RevisionDict(dict):
+    def __init__(self, data, callback):
+        """Dictionary that calls `callback` whenever it is modified
+
+        Copies (:func:`copy.copy` and :func:`copy.deepcopy`) are
+        ordinary dictionaries.
+        """
+        super(RevisionDict, self).__init__(
+            (key, track(val, callback)) for key, val in data.items())
+        self._callback = callback
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {copy.deepcopy(key, memo): copy.deepcopy(val, memo)
+                for key, val in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+    def __setitem__(self, key, value):
+        super(RevisionDict, self).__setitem__(
+            key, track(value, self._callback))
+        self._callback()
+
+    def __delitem__(self, key):
+        super(RevisionDict, self).__delitem__(key)
+        self._callback()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super(RevisionDict, self).clear()
+        self._callback()
+
+    def pop(self, *args):
+        value = super(RevisionDict, self).pop(*args)
+        self._callback()
+        return value
+
+    def popitem(self):
+        item = super(RevisionDict, self).popitem()
+        self._callback()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            super(RevisionDict, self).__setitem__(
+                key, track(value, self._callback))
+        self._callback()
+
+
+class RevisionList(list):
+    def __init__(self, data, callback):
+        """List that calls `callback` whenever it is modified
+
+        Copies (:func:`copy.copy` and :func:`copy.deepcopy`) are
+        ordinary lists.
+        """
+        super(RevisionList, self).__init__(
+            track(val, callback) for val in data)
+        self._callback = callback
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(val, memo) for val in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [track(val, self._callback) for val in value]
+        else:
+            value = track(value, self._callback)
+        super(RevisionList, self).__setitem__(index, value)
+        self._callback()
+
+    def __delitem__(self, index):
+        super(RevisionList, self).__delitem__(index)
+        self._callback()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, other):
+        super(RevisionList, self).__imul__(other)
+        self._callback()
+        return self
+
+    def append(self, value):
+        super(RevisionList, self).append(track(value, self._callback))
+        self._callback()
+
+    def clear(self):
+        super(RevisionList, self).clear()
+        self._callback()
+
+    def extend(self, values):
+        super(RevisionList, self).extend(
+            track(val, self._callback) for val in values)
+        self._callback()
+
+    def insert(self, index, value):
+        super(RevisionList, self).insert(index,
+                                         track(value, self._callback))
+        self._callback()
+
+    def pop(self, *args):
+        value = super(RevisionList, self).pop(*args)
+        self._callback()
+        return value
+
+    def remove(self, value):
+        super(RevisionList, self).remove(value)
+        self._callback()
+
+    def reverse(self):
+        super(RevisionList, self).reverse()
+        self._callback()
+
+    def sort(self, *args, **kwargs):
+        super(RevisionList, self).sort(*args, **kwargs)
+        self._callback()
+
+
+class RevisionMixin(object):
+    """Increment :const:`revision` whenever the element is modified
+
+    Assigning a public attribute automatically increments the
+    revision. Dictionaries and lists assigned to public attributes
+    (e.g. `Filter.boxdict` or `Dataslot.config`) are wrapped in
+    :class:`RevisionDict` and :class:`RevisionList`, so that
+    in-place modifications of these (and of nested dictionaries
+    and lists) increment the revision as well. Modifications that
+    cannot be tracked this way (e.g. of a
+    :class:`dclab.PolygonFilter` used by a filter) must be followed
+    by a call to :func:`mark_modified`.
+
+    Revisions are taken from a global counter, so the maximum
+    revision of several elements changes whenever one of them
+    is modified (see :func:`shapeout2.pipeline.Pipeline.revision`).
+    Use revisions for fast change detection within a session and
+    the hashes of the elements for persistence.
+    """
+    #: revision of the element
+    revision = 0
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_"):
+            value = track(value, self.mark_modified)
+        super(RevisionMixin, self).__setattr__(name, value)
+        if not name.startswith("_"):
+            self.mark_modified()
+
+    def mark_modified(self):
+        """Increment the revision of the element"""
+        object.__setattr__(self, "revision", next_revision())
@@ -1,66 +1,624 @@
 """Facilitate caching of plot data"""
-from dclab.kde import KernelDensityEstimator
+import collections
+import json
+import os
+import pathlib
+import shutil
+import threading
+import uuid
+import warnings
+
+from dclab.kde.base import ContourSpacingTooLarge
+from dclab.kde.contours import find_contours_level, get_quantile_levels
+from dclab.rtdc_dataset import RTDC_Hierarchy
+import numpy as np
 
 from . import util
+from .kde import KernelDensityEstimator
+from .pipeline.filter_ray import get_mask_fingerprint
+
+
+#: number of grid cells per axis of the scatter plot pyramid
+PYRAMID_GRID_SIZE = 256
+
+
+class PlotDataCache:
+    def __init__(self, max_bytes=1024**3):
+        """Memory-bounded least-recently-used cache for plot data
+
+        Items are evicted in least-recently-used order as soon as the
+        total size of all cached arrays exceeds `max_bytes`. The size
+        of an item is the sum of the sizes of all numpy arrays it
+        contains (see :func:`get_nbytes`).
+
+        Parameters
+        ----------
+        max_bytes: int
+            Maximum number of bytes the cached arrays may occupy
+        """
+        #: maximum size of all cached items [B]
+        self.max_bytes = max_bytes
+        #: current size of all cached items [B]
+        self.nbytes = 0
+        #: number of successful lookups
+        self.hits = 0
+        #: number of failed lookups
+        self.misses = 0
+        #: number of items removed due to the size limit
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._data[key]
+            self._data.move_to_end(key)
+            return value
+
+    def __len__(self):
+        return len(self._data)
+
+    def __setitem__(self, key, value):
+        size = get_nbytes(value)
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if size > self.max_bytes:
+                # do not flush the entire cache for a single item
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            self._evict()
+
+    def _evict(self):
+        """Remove least-recently-used items until we are within limits"""
+        while self.nbytes > self.max_bytes and self._data:
+            key = next(iter(self._data))
+            self._pop(key)
+            self.evictions += 1
+
+    def _pop(self, key):
+        self._data.pop(key)
+        self.nbytes -= self._sizes.pop(key)
+
+    def clear(self):
+        """Remove all items and reset the statistics"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return a cached item and update the hit/miss counters"""
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                return self[key]
+            else:
+                self.misses += 1
+                return default
+
+    def get_statistics(self):
+        """Return a dictionary with the current cache statistics"""
+        return {"items": len(self),
+                "nbytes": self.nbytes,
+                "max bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                }
+
+    def set_max_bytes(self, max_bytes):
+        """Change the size limit, evicting items if necessary"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+
+class PlotDataDiskCache:
+    def __init__(self, path=None, max_bytes=4 * 1024**3):
+        """Persistent least-recently-used cache for plot data
+
+        Every item is stored in a separate directory below `path`
+        which contains one ``.npy`` file per numpy array and a
+        ``layout.json`` file describing how the arrays are nested in
+        lists and tuples. Arrays are loaded as read-only memory maps,
+        so reusing plot data from a previous session is cheap. The
+        modification time of an item directory is updated on access;
+        when the total size of the cache exceeds `max_bytes`, the
+        least-recently used items are deleted.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path or None
+            Cache directory; set to None to disable the cache
+        max_bytes: int
+            Maximum number of bytes the cache may occupy on disk
+        """
+        #: maximum size of the cache directory [B]
+        self.max_bytes = max_bytes
+        #: number of successful lookups
+        self.hits = 0
+        #: number of failed lookups
+        self.misses = 0
+        #: number of items removed due to the size limit
+        self.evictions = 0
+        self.path = None
+        self._nbytes = None
+        self._lock = threading.RLock()
+        self.set_path(path)
+
+    def __contains__(self, key):
+        return self.enabled and (self.path / key / "layout.json").exists()
+
+    def __setitem__(self, key, value):
+        if not self.enabled:
+            return
+        size = get_nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # make sure the current size is known before adding the item
+            self.nbytes
+            item_path = self.path / key
+            if item_path.exists():
+                return
+            temp_path = self.path / f".tmp-{key}-{uuid.uuid4().hex}"
+            try:
+                temp_path.mkdir(parents=True)
+                arrays = []
+                layout = _disk_layout_dump(value, arrays)
+                for ii, arr in enumerate(arrays):
+                    np.save(temp_path / f"{ii}.npy", arr,
+                            allow_pickle=False)
+                (temp_path / "layout.json").write_text(json.dumps(layout))
+                temp_path.rename(item_path)
+            except OSError:
+                # disk full, permission issue, or another Shape-Out
+                # instance wrote the same item in the meantime
+                shutil.rmtree(temp_path, ignore_errors=True)
+                return
+            self.nbytes += _get_dir_size(item_path)
+            self._evict()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    @property
+    def nbytes(self):
+        """current size of the cache directory [B]"""
+        if self._nbytes is None:
+            self._nbytes = 0
+            if self.enabled:
+                for item_path in self.path.iterdir():
+                    self._nbytes += _get_dir_size(item_path)
+        return self._nbytes
+
+    @nbytes.setter
+    def nbytes(self, value):
+        self._nbytes = value
+
+    def _evict(self):
+        """Remove least-recently-used items until we are within limits"""
+        if self.nbytes <= self.max_bytes:
+            return
+        items = []
+        for item_path in self.path.iterdir():
+            if item_path.name.startswith(".tmp-"):
+                continue
+            try:
+                items.append((item_path.stat().st_mtime_ns, item_path))
+            except OSError:
+                pass
+        for _, item_path in sorted(items):
+            if self.nbytes <= self.max_bytes:
+                break
+            self.nbytes -= _get_dir_size(item_path)
+            # On Windows, memory-mapped files cannot be deleted.
+            shutil.rmtree(item_path, ignore_errors=True)
+            self.evictions += 1
+
+    def clear(self):
+        """Delete all items and reset the statistics"""
+        with self._lock:
+            if self.enabled:
+                for item_path in self.path.iterdir():
+                    shutil.rmtree(item_path, ignore_errors=True)
+            self.nbytes = None
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return a cached item and update the hit/miss counters"""
+        if not self.enabled:
+            return default
+        item_path = self.path / key
+        try:
+            layout = json.loads((item_path / "layout.json").read_text())
+            value = _disk_layout_load(layout, item_path)
+            # mark as recently used
+            os.utime(item_path)
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def get_statistics(self):
+        """Return a dictionary with the current cache statistics"""
+        return {"enabled": self.enabled,
+                "path": self.path,
+                "nbytes": self.nbytes,
+                "max bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                }
+
+    def set_max_bytes(self, max_bytes):
+        """Change the size limit, deleting items if necessary"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            if self.enabled:
+                self._evict()
+
+    def set_path(self, path):
+        """Set the cache directory (None disables the cache)"""
+        with self._lock:
+            if path is not None:
+                path = pathlib.Path(path)
+                try:
+                    path.mkdir(parents=True, exist_ok=True)
+                except OSError:
+                    path = None
+            self.path = path
+            self.nbytes = None
+            if self.enabled:
+                self._evict()
+
+
+def _disk_layout_dump(obj, arrays):
+    """Return a JSON-serializable layout of nested arrays in `obj`
+
+    The arrays are appended to the list `arrays`.
+    """
+    if isinstance(obj, np.ndarray):
+        arrays.append(obj)
+        layout = {"array": len(arrays) - 1}
+    elif isinstance(obj, (list, tuple)):
+        layout = {type(obj).__name__:
+                  [_disk_layout_dump(item, arrays) for item in obj]}
+    else:
+        raise TypeError(f"Cannot store type '{type(obj)}' on disk!")
+    return layout
+
+
+def _disk_layout_load(layout, path):
+    """Inverse of :func:`_disk_layout_dump` with memory-mapped arrays"""
+    if "array" in layout:
+        obj = np.load(path / f"{layout['array']}.npy", mmap_mode="r",
+                      allow_pickle=False)
+    elif "list" in layout:
+        obj = [_disk_layout_load(item, path) for item in layout["list"]]
+    else:
+        obj = tuple(_disk_layout_load(item, path)
+                    for item in layout["tuple"])
+    return obj
+
+
+def _get_dir_size(path):
+    """Return the size of all files in a directory [B]"""
+    size = 0
+    try:
+        for pp in pathlib.Path(path).iterdir():
+            size += pp.stat().st_size
+    except OSError:
+        pass
+    return size
+
+
+def cache_get(shash):
+    """Return cached plot data from memory or from disk
+
+    Returns None if no data are cached for `shash`.
+    """
+    data = cache_data.get(shash)
+    if data is None and disk_cache.enabled:
+        data = disk_cache.get(shash)
+        if data is not None:
+            cache_data[shash] = data
+    return data
+
+
+def cache_set(shash, data):
+    """Store plot data in the memory and in the disk cache"""
+    cache_data[shash] = data
+    if disk_cache.enabled:
+        disk_cache[shash] = data
 
 
 def get_contour_data(rtdc_ds, xax, yax, xacc, yacc, xscale, yscale,
-                     kde_type="histogram", kde_kwargs=None, quantiles=None):
+                     kde_type="histogram", kde_kwargs=None, quantiles=None,
+                     apply_filter=True):
+    """Return contour lines of the kernel density estimate
+
+    The density grid is cached separately (see
+    :func:`get_density_grid_data`), so that changing the quantiles
+    only requires finding new contour levels.
+
+    Returns
+    -------
+    contours: list of lists of 2d ndarrays
+        For every quantile, a list of contour lines of shape (N, 2)
+    """
+    if not quantiles:
+        quantiles = [0.5, 0.95]
+    grid_hash = get_density_grid_hash(
+        rtdc_ds=rtdc_ds, xax=xax, yax=yax, xacc=xacc, yacc=yacc,
+        xscale=xscale, yscale=yscale, kde_type=kde_type,
+        kde_kwargs=kde_kwargs, apply_filter=apply_filter)
+    shash = util.hashobj(["contour lines", grid_hash, list(quantiles)])
+    contours = cache_get(shash)
+    if contours is None:
+        grid = get_density_grid_data(
+            rtdc_ds=rtdc_ds, xax=xax, yax=yax, xacc=xacc, yacc=yacc,
+            xscale=xscale, yscale=yscale, kde_type=kde_type,
+            kde_kwargs=kde_kwargs, apply_filter=False)
+        if grid is None:
+            # most-likely there is nothing to compute a contour for
+            return []
+        x, y, density = grid
+        if density.shape[0] < 3 or density.shape[1] < 3:
+            warnings.warn("Contour not possible; spacing may be too large!",
+                          ContourSpacingTooLarge)
+            return []
+        # (same as `KernelDensityEstimator.get_contour_lines`)
+        levels = get_quantile_levels(
+            density=density,
+            x=x,
+            y=y,
+            xp=rtdc_ds[xax][rtdc_ds.filter.all],
+            yp=rtdc_ds[yax][rtdc_ds.filter.all],
+            q=np.array(quantiles),
+            normalize=False)
+        contours = []
+        # normalize levels to [0, 1]
+        nlevels = np.array(levels) / density.max()
+        for nlev in nlevels:
+            # make sure that the contour levels are not at the boundaries
+            if not (np.allclose(nlev, 0, atol=1e-12, rtol=0)
+                    or np.allclose(nlev, 1, atol=1e-12, rtol=0)):
+                contours.append(
+                    find_contours_level(density, x=x, y=y, level=nlev))
+            else:
+                contours.append([])
+        # save in cache
+        cache_set(shash, contours)
+    return contours
+
+
+def get_density_grid_data(rtdc_ds, xax, yax, xacc, yacc, xscale, yscale,
+                          kde_type="histogram", kde_kwargs=None,
+                          apply_filter=True):
+    """Return the kernel density estimate evaluated on a grid
+
+    Returns
+    -------
+    x, y, density: 2d ndarrays
+        Grid coordinates and density (see
+        :func:`dclab.kde.KernelDensityEstimator.get_raster`) or None
+        if the density could not be computed (e.g. no events)
+    """
+    shash = get_density_grid_hash(
+        rtdc_ds=rtdc_ds, xax=xax, yax=yax, xacc=xacc, yacc=yacc,
+        xscale=xscale, yscale=yscale, kde_type=kde_type,
+        kde_kwargs=kde_kwargs, apply_filter=apply_filter)
+    grid = cache_get(shash)
+    if grid is None:
+        kde_instance = KernelDensityEstimator(rtdc_ds=rtdc_ds)
+        try:
+            grid = kde_instance.get_raster(
+                xax=xax,
+                yax=yax,
+                xacc=xacc,
+                yacc=yacc,
+                xscale=xscale,
+                yscale=yscale,
+                kde_type=kde_type,
+                kde_kwargs=kde_kwargs)
+        except ValueError:
+            return None
+        cache_set(shash, grid)
+    return grid
+
+
+def get_density_grid_hash(rtdc_ds, xax, yax, xacc, yacc, xscale, yscale,
+                          kde_type="histogram", kde_kwargs=None,
+                          apply_filter=True):
+    """Return the cache key of the density grid for contour plots"""
     if kde_kwargs is None:
         kde_kwargs = {}
-    rtdc_ds.apply_filter()
-    cfg = rtdc_ds.config
+    if apply_filter:
+        rtdc_ds.apply_filter()
     tohash = [
-        rtdc_ds.identifier, rtdc_ds.filter.all,
-        cfg.get("calculation", ""),
+        "density grid", get_dataset_key(rtdc_ds),
         xax, yax, xacc, yacc, xscale, yscale,
         kde_type, kde_kwargs]
+    return util.hashobj(tohash)
+
+
+def get_density_image_data(rtdc_ds, xax, yax, xscale, yscale,
+                           range_x, range_y, bins):
+    """Return a 2D histogram of all filtered events
+
+    Parameters
+    ----------
+    rtdc_ds: dclab.RTDCBase
+        Dataset
+    xax, yax: str
+        Features on the x and y axes
+    xscale, yscale: str
+        Axis scales ("linear" or "log")
+    range_x, range_y: tuple of float
+        Histogram range in plot coordinates (i.e. the base-10
+        logarithm of the data for log scales)
+    bins: tuple of int
+        Number of bins along x and y (e.g. the plot size in pixels)
+
+    Returns
+    -------
+    counts: 2d ndarray of shape (bins[1], bins[0])
+        Event counts; the first axis corresponds to y
+    """
+    rtdc_ds.apply_filter()
+    tohash = [
+        "density image", get_dataset_key(rtdc_ds),
+        xax, yax, xscale, yscale, range_x, range_y, bins]
     shash = util.hashobj(tohash)
-    if shash in cache_data:
-        contours = cache_data[shash]
+    counts = cache_get(shash)
+    if counts is None:
+        data = []
+        for feat, scale in [(yax, yscale), (xax, xscale)]:
+            fdata = np.asarray(rtdc_ds[feat][rtdc_ds.filter.all],
+                               dtype=float)
+            if scale == "log":
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    fdata = np.log10(fdata)
+            data.append(fdata)
+        valid = np.isfinite(data[0]) & np.isfinite(data[1])
+        counts, _, _ = np.histogram2d(data[0][valid], data[1][valid],
+                                      bins=(bins[1], bins[0]),
+                                      range=(range_y, range_x))
+        counts = counts.astype(np.uint32)
+        cache_set(shash, counts)
+    return counts
+
+
+def get_dataset_key(rtdc_ds):
+    """Return a session-independent key for the filtered events
+
+    Dataset identifiers are random and only unique within one
+    session, so they are not used for cache keys. The key is
+    computed from the hash of the underlying measurement, the
+    fingerprint of the filtered events (see
+    :func:`.pipeline.filter_ray.get_mask_fingerprint`) and the
+    calculation configuration (e.g. for the Young's modulus).
+    Thus, data in the disk cache are found again when the
+    measurement is opened in a new session.
+    """
+    ds = rtdc_ds
+    while isinstance(ds, RTDC_Hierarchy):
+        ds = ds.hparent
+    return util.hashobj([ds.hash, get_mask_fingerprint(rtdc_ds),
+                         rtdc_ds.config.get("calculation", "")])
+
+
+def get_nbytes(obj):
+    """Return the number of bytes of all numpy arrays in `obj`
+
+    Tuples, lists and dictionaries are searched recursively.
+    """
+    if isinstance(obj, np.ndarray):
+        nbytes = obj.nbytes
+    elif isinstance(obj, (list, tuple)):
+        nbytes = sum(get_nbytes(item) for item in obj)
+    elif isinstance(obj, dict):
+        nbytes = sum(get_nbytes(item) for item in obj.values())
     else:
-        # compute contour plot data
-        kde_instance = KernelDensityEstimator(rtdc_ds=rtdc_ds)
-        contours = kde_instance.get_contour_lines(
-            quantiles=quantiles,
-            xax=xax,
-            yax=yax,
-            xacc=xacc,
-            yacc=yacc,
-            xscale=xscale,
-            yscale=yscale,
-            kde_type=kde_type,
-            kde_kwargs=kde_kwargs)
-        # save in cache
-        cache_data[shash] = contours
-    return contours
+        nbytes = 0
+    return nbytes
 
 
 def get_scatter_data(rtdc_ds, downsample, xax, yax, xscale, yscale,
-                     kde_type="histogram", kde_kwargs=None):
+                     kde_type="histogram", kde_kwargs=None,
+                     range_x=None, range_y=None, apply_filter=True):
+    """Return (downsampled) scatter plot data
+
+    If `range_x` and `range_y` are given and the visible region
+    does not contain all events, at most `downsample` events are
+    taken from the visible region via :func:`get_scatter_pyramid`
+    (level of detail follows the viewport). Otherwise, the whole
+    dataset is downsampled. Only the whole-dataset data and the
+    pyramid are written to the disk cache; viewport subsets are
+    only cached in memory.
+
+    Set `apply_filter` to False if the filters of `rtdc_ds` are
+    known to be up-to-date (e.g. when computing data in a background
+    thread, where `rtdc_ds` must not be modified).
+    """
     if kde_kwargs is None:
         kde_kwargs = {}
-    rtdc_ds.apply_filter()
-    cfg = rtdc_ds.config
+    if apply_filter:
+        rtdc_ds.apply_filter()
+    if downsample and range_x is not None and range_y is not None:
+        rx = KernelDensityEstimator.apply_scale(
+            np.array(range_x, dtype=float), xscale, xax)
+        ry = KernelDensityEstimator.apply_scale(
+            np.array(range_y, dtype=float), yscale, yax)
+        # log scale: negative lower limits
+        rx[np.isnan(rx)] = -np.inf
+        ry[np.isnan(ry)] = -np.inf
+        extent = get_scatter_extent(rtdc_ds, xax, yax, xscale, yscale,
+                                    apply_filter=False)
+        if (rx[0] <= extent[0] and rx[1] >= extent[1]
+                and ry[0] <= extent[2] and ry[1] >= extent[3]):
+            # everything is visible
+            range_x = range_y = None
+    else:
+        range_x = range_y = None
     tohash = [
-        rtdc_ds.identifier, rtdc_ds.filter.all, downsample,
-        cfg.get("calculation", ""),
-        xax, yax, xscale, yscale, kde_type, kde_kwargs]
+        get_dataset_key(rtdc_ds), downsample,
+        xax, yax, xscale, yscale, kde_type, kde_kwargs, range_x, range_y]
     shash = util.hashobj(tohash)
-    if shash in cache_data:
-        x, y, kde, idx = cache_data[shash]
+    if range_x is None:
+        data = cache_get(shash)
+    else:
+        # viewport subsets are only cached in memory
+        data = cache_data.get(shash)
+    if data is not None:
+        x, y, kde, idx = data
     else:
         # compute scatter plot data
-        x, y, idx = rtdc_ds.get_downsampled_scatter(
-            xax=xax,
-            yax=yax,
-            downsample=downsample,
-            xscale=xscale,
-            yscale=yscale,
-            remove_invalid=True,
-            ret_mask=True)
+        if range_x is None:
+            x, y, idx = rtdc_ds.get_downsampled_scatter(
+                xax=xax,
+                yax=yax,
+                downsample=downsample,
+                xscale=xscale,
+                yscale=yscale,
+                remove_invalid=True,
+                ret_mask=True)
+        else:
+            pyramid = get_scatter_pyramid(rtdc_ds, xax, yax, xscale, yscale,
+                                          apply_filter=False)
+            events = select_from_scatter_pyramid(pyramid,
+                                                 range_x=rx,
+                                                 range_y=ry,
+                                                 samples=downsample)
+            idx = np.zeros(len(rtdc_ds), dtype=bool)
+            idx[events] = True
+            x = rtdc_ds[xax][idx]
+            y = rtdc_ds[yax][idx]
+            # remove events in the visible grid cells outside the range
+            inside = ((x >= range_x[0]) & (x <= range_x[1])
+                      & (y >= range_y[0]) & (y <= range_y[1]))
+            idx[np.where(idx)[0][~inside]] = False
+            x = x[inside]
+            y = y[inside]
         # kde
-        kde = rtdc_ds.get_kde_scatter(
+        kde = KernelDensityEstimator(rtdc_ds=rtdc_ds).get_scatter(
             xax=xax,
             yax=yax,
             positions=(x, y),
@@ -72,8 +630,173 @@ def get_scatter_data(rtdc_ds, downsample, xax, yax, xscale, yscale,
             kde -= kde.min()
             kde /= kde.max()
         # save in cache
-        cache_data[shash] = x, y, kde, idx
+        if range_x is None:
+            cache_set(shash, (x, y, kde, idx))
+        else:
+            cache_data[shash] = (x, y, kde, idx)
     return x, y, kde, idx
 
 
-cache_data = {}
+def _get_scatter_valid(rtdc_ds, xax, yax, xscale, yscale):
+    """Return indices and scaled coordinates of the valid filtered events"""
+    ids = np.where(rtdc_ds.filter.all)[0]
+    xs = KernelDensityEstimator.apply_scale(
+        np.asarray(rtdc_ds[xax][rtdc_ds.filter.all], dtype=float),
+        xscale, xax)
+    ys = KernelDensityEstimator.apply_scale(
+        np.asarray(rtdc_ds[yax][rtdc_ds.filter.all], dtype=float),
+        yscale, yax)
+    valid = np.isfinite(xs) & np.isfinite(ys)
+    return ids[valid], xs[valid], ys[valid]
+
+
+def get_scatter_extent(rtdc_ds, xax, yax, xscale, yscale,
+                       apply_filter=True):
+    """Return the extent of the valid filtered events for scatter plots
+
+    Returns
+    -------
+    extent: 1d ndarray of length 4
+        Extent `[xmin, xmax, ymin, ymax]` in scaled coordinates
+        (same as the extent of :func:`get_scatter_pyramid`)
+    """
+    if apply_filter:
+        rtdc_ds.apply_filter()
+    tohash = [
+        "scatter extent", get_dataset_key(rtdc_ds),
+        xax, yax, xscale, yscale]
+    shash = util.hashobj(tohash)
+    extent = cache_get(shash)
+    if extent is None:
+        _, xs, ys = _get_scatter_valid(rtdc_ds, xax, yax, xscale, yscale)
+        if xs.size:
+            extent = np.array([xs.min(), xs.max(), ys.min(), ys.max()])
+        else:
+            extent = np.array([0., 0., 0., 0.])
+        cache_set(shash, extent)
+    return extent
+
+
+def get_scatter_pyramid(rtdc_ds, xax, yax, xscale, yscale,
+                        apply_filter=True):
+    """Return a spatial index of the filtered events for scatter plots
+
+    The valid filtered events are sorted into a regular grid with
+    `PYRAMID_GRID_SIZE` x `PYRAMID_GRID_SIZE` cells (in the scaled
+    coordinates). Within each cell, the events are in random order,
+    so that any prefix of a cell is a random subsample of that cell.
+    Coarser levels of detail are obtained by taking only short
+    prefixes (see :func:`select_from_scatter_pyramid`).
+
+    Returns
+    -------
+    events: 1d ndarray of int
+        Event indices (in `rtdc_ds`, i.e. including filtered events)
+        sorted by grid cell (row-major)
+    cell_starts: 1d ndarray of int
+        Offsets of the grid cells in `events`; the events of cell
+        `ii` are `events[cell_starts[ii]:cell_starts[ii+1]]`
+    extent: 1d ndarray of length 4
+        Grid extent `[xmin, xmax, ymin, ymax]` in scaled coordinates
+    """
+    if apply_filter:
+        rtdc_ds.apply_filter()
+    tohash = [
+        "scatter pyramid", PYRAMID_GRID_SIZE, get_dataset_key(rtdc_ds),
+        xax, yax, xscale, yscale]
+    shash = util.hashobj(tohash)
+    pyramid = cache_get(shash)
+    if pyramid is None:
+        size = PYRAMID_GRID_SIZE
+        ids, xs, ys = _get_scatter_valid(rtdc_ds, xax, yax, xscale, yscale)
+        extent = get_scatter_extent(rtdc_ds, xax, yax, xscale, yscale,
+                                    apply_filter=False)
+        cx = _get_grid_cells(xs, extent[0], extent[1])
+        cy = _get_grid_cells(ys, extent[2], extent[3])
+        cells = cy * size + cx
+        # random order within each cell (reproducible)
+        rank = np.random.default_rng(42).permutation(ids.size)
+        order = np.argsort(cells * ids.size + rank)
+        events = ids[order]
+        cell_starts = np.zeros(size**2 + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=size**2),
+                  out=cell_starts[1:])
+        pyramid = events, cell_starts, extent
+        cache_set(shash, pyramid)
+    return pyramid
+
+
+def _get_grid_cells(data, vmin, vmax):
+    """Return the pyramid grid cell index along one axis"""
+    if vmax > vmin:
+        cells = np.floor(
+            (data - vmin) / (vmax - vmin) * PYRAMID_GRID_SIZE)
+        cells = np.clip(cells, 0, PYRAMID_GRID_SIZE - 1).astype(np.int64)
+    else:
+        cells = np.zeros(data.size, dtype=np.int64)
+    return cells
+
+
+def select_from_scatter_pyramid(pyramid, range_x, range_y, samples):
+    """Return at most `samples` events of the visible grid cells
+
+    Parameters
+    ----------
+    pyramid: tuple
+        Output of :func:`get_scatter_pyramid`
+    range_x, range_y: tuple of float
+        Visible region in scaled coordinates
+    samples: int
+        Maximum number of events to return
+
+    Returns
+    -------
+    events: 1d ndarray of int
+        Sorted event indices
+
+    Notes
+    -----
+    All grid cells touching the visible region are considered.
+    The number of events taken from each cell is limited, such
+    that sparse regions are fully represented and dense regions
+    are subsampled (similar to the grid-based downsampling in
+    dclab). The returned events may lie outside of the visible
+    region.
+    """
+    events, cell_starts, extent = pyramid
+    size = PYRAMID_GRID_SIZE
+    cx0, cx1 = _get_grid_cells(np.asarray(range_x), extent[0], extent[1])
+    cy0, cy1 = _get_grid_cells(np.asarray(range_y), extent[2], extent[3])
+    if (range_x[1] < extent[0] or range_x[0] > extent[1]
+            or range_y[1] < extent[2] or range_y[0] > extent[3]):
+        return np.zeros(0, dtype=np.int64)
+    cells = (np.arange(cy0, cy1 + 1)[:, np.newaxis] * size
+             + np.arange(cx0, cx1 + 1)[np.newaxis, :]).ravel()
+    starts = cell_starts[cells]
+    counts = cell_starts[cells + 1] - starts
+    if counts.sum() <= samples:
+        take = counts
+    else:
+        # largest per-cell limit for which we stay below `samples`
+        lo, hi = 0, counts.max()
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if np.minimum(counts, mid).sum() <= samples:
+                lo = mid
+            else:
+                hi = mid - 1
+        take = np.minimum(counts, lo)
+        # distribute the remainder over the cells that have more events
+        remainder = samples - take.sum()
+        more = np.where(counts > take)[0][:remainder]
+        take[more] += 1
+    # gather the first `take` events of each cell
+    offsets = np.repeat(starts - np.cumsum(take) + take, take)
+    positions = offsets + np.arange(take.sum())
+    return np.sort(events[positions])
+
+
+#: global plot data cache (size limit is set in the preferences)
+cache_data = PlotDataCache()
+#: persistent plot data cache (disabled unless enabled in the preferences)
+disk_cache = PlotDataDiskCache()
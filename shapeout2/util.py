@@ -32,3 +32,8 @@ def get_valid_filename(value):
 
     ret = ret.strip(".")
     return ret
+
+
+def is_remote_path(path):
+    """Return True if `path` is a URL (e.g. DCOR data) and not a file"""
+    return isinstance(path, str) and path.startswith(("http://", "https://"))
@@ -0,0 +1,39 @@
+import numpy as np
+import pyqtgraph as pg
+
+from shapeout2.gui import colormaps
+
+
+def test_map_to_rgba_matches_colormap():
+    values = np.linspace(0, 1, 11)
+    rgba = colormaps.map_to_rgba(values, "viridis")
+    assert rgba.shape == (11, 4)
+    assert rgba.dtype == np.uint8
+    cmap = colormaps.get_colormap("viridis")
+    for val, color in zip(values, rgba):
+        ref = np.array(cmap.mapToQColor(val).getRgb())
+        assert np.all(np.abs(ref - color) <= 1)
+
+
+def test_map_to_rgba_nan_and_clip():
+    rgba = colormaps.map_to_rgba(np.array([np.nan, -5, 20]), "grayblue",
+                                 vmin=0, vmax=10, nan_color="#FF0000")
+    assert np.all(rgba[0] == [255, 0, 0, 255])
+    assert np.all(rgba[1] == [100, 100, 100, 255])
+    assert np.all(rgba[2] == [0, 0, 255, 255])
+
+
+def test_map_to_rgba_constant_range():
+    rgba = colormaps.map_to_rgba(np.ones(5), "grayred", vmin=1, vmax=1)
+    assert np.all(rgba == rgba[0])
+
+
+def test_map_to_brushes_shared_instances():
+    values = np.array([0, 0.5, 0, np.nan])
+    brushes = colormaps.map_to_brushes(values, "viridis")
+    assert brushes[0] is brushes[2]
+    assert brushes[0] is not brushes[1]
+    assert brushes[3].color() == pg.mkColor("#FF0000")
+    rgba = colormaps.map_to_rgba(values, "viridis")
+    for brush, color in zip(brushes, rgba):
+        assert brush.color().getRgb() == tuple(color)
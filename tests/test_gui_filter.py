@@ -140,6 +140,33 @@ def test_filter_min_max_inf(qtbot):
     assert np.allclose(rcstate["end"], 1.1, rtol=1e-4)
 
 
+def test_box_filter_event_count(qtbot):
+    path = make_fake_dataset()
+
+    mw = ShapeOut2()
+    qtbot.addWidget(mw)
+    mw.add_dataslot(paths=[path])
+
+    # open the filter edit in the Analysis View
+    fe = mw.block_matrix.get_widget(filt_plot_id=mw.pipeline.filter_ids[0])
+    qtbot.mouseClick(fe.toolButton_modify, QtCore.Qt.MouseButton.LeftButton)
+    wf = mw.widget_ana_view.widget_filter
+    mw.widget_ana_view.tabWidget.setCurrentWidget(
+        mw.widget_ana_view.tab_filter)
+
+    # activate the box filter for area_um
+    qtbot.mouseClick(wf.toolButton_moreless, QtCore.Qt.MouseButton.LeftButton)
+    rc = wf._box_range_controls["area_um"]
+    qtbot.mouseClick(rc.checkBox, QtCore.Qt.MouseButton.LeftButton)
+    qtbot.mouseClick(wf.toolButton_moreless, QtCore.Qt.MouseButton.LeftButton)
+    assert rc.label_count.text() == "100"
+
+    # changing the range updates the count (area_um is 20, 21.8, 23.6, ...)
+    rc.doubleSpinBox_max.setValue(29)
+    assert rc.label_count.text() == "5"
+    assert mw.pipeline.get_range_count("area_um", 20, 29) == 5
+
+
 def test_polygon_filter_basic(qtbot):
     path = data_path / "calibration_beads_47.rtdc"
 
@@ -160,3 +160,22 @@ def test_get_hash_flag_dataset_with_hash():
     assert results[0] is None
     assert results[1] is None
     assert results[2] == "Pipeline 1d01"
+
+
+def test_get_isoelastics():
+    kwargs = dict(axis_x="area_um", axis_y="deform", channel_width=20,
+                  pixel_size=0.34, lut_identifier="LE-2D-FEM-19")
+    lines = pipeline_plot.get_isoelastics(**kwargs)
+    assert pipeline_plot.get_isoelastics(**kwargs) is lines
+    assert lines.shape[1] == 2
+    isodef = dclab.isoelastics.get_default()
+    iso = isodef.get(lut_identifier="LE-2D-FEM-19", channel_width=20,
+                     flow_rate=None, viscosity=None, col1="area_um",
+                     col2="deform", add_px_err=True, px_um=0.34)
+    # lines are separated by NaN values
+    assert np.sum(np.isnan(lines[:, 0])) == len(iso) - 1
+    assert np.allclose(lines[:len(iso[0])], iso[0][:, :2])
+    # unknown axes
+    assert pipeline_plot.get_isoelastics(
+        axis_x="area_um", axis_y="bright_avg", channel_width=20,
+        pixel_size=0.34) is None
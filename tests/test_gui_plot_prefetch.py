@@ -0,0 +1,117 @@
+import pathlib
+import threading
+
+from shapeout2 import pipeline, plot_cache
+from shapeout2.gui import pipeline_plot, plot_prefetch
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def make_pipeline():
+    path = datapath / "calibration_beads_47.rtdc"
+    pl = pipeline.Pipeline()
+    plot_ids = [pl.add_plot(), pl.add_plot()]
+    for _ in range(2):
+        slot_id = pl.add_slot(path=path)
+        for plot_id in plot_ids:
+            pl.set_element_active(slot_id, plot_id)
+    return pl, plot_ids
+
+
+def test_prefetch():
+    pl, plot_ids = make_pipeline()
+    plot_cache.cache_data.clear()
+    prefetcher = plot_prefetch.PlotPrefetcher(max_workers=2)
+    try:
+        prefetcher.prefetch(pl, plot_ids, wait=True)
+        assert plot_cache.cache_data.misses > 0
+        misses = plot_cache.cache_data.misses
+        # everything is cached for the plot windows
+        for plot_id in plot_ids:
+            plot_state = pl.get_plot(plot_id).__getstate__()
+            for ds in pl.get_plot_datasets(plot_id)[0]:
+                pipeline_plot.compute_scatter_data(plot_state, ds)
+                pipeline_plot.compute_contours(plot_state, ds)
+        assert plot_cache.cache_data.misses == misses
+    finally:
+        prefetcher.shutdown()
+
+
+def test_prefetch_cancel_stale_jobs(qtbot, monkeypatch):
+    pl, plot_ids = make_pipeline()
+    plot_cache.cache_data.clear()
+    prefetcher = plot_prefetch.PlotPrefetcher(max_workers=1)
+    release = threading.Event()
+    calls = []
+    compute_scatter_data = pipeline_plot.compute_scatter_data
+
+    def blocking_compute(*args, **kwargs):
+        calls.append(prefetcher.generation)
+        # the first job blocks until the next state arrives
+        release.wait(timeout=30)
+        return compute_scatter_data(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline_plot, "compute_scatter_data",
+                        blocking_compute)
+    finished = []
+    prefetcher.finished.connect(finished.append)
+    try:
+        # prefetch returns while the first job is running
+        gen1 = prefetcher.prefetch(pl, plot_ids)
+        qtbot.waitUntil(lambda: len(calls) == 1)
+        futures1 = list(prefetcher._futures)
+        # two filter jobs (one per plot) and four plot data jobs
+        assert len(futures1) == 6
+        running = [ff for ff in futures1 if ff.running()]
+        assert len(running) == 1
+        # a new state arrives while the job is running
+        gen2 = prefetcher.prefetch(pl, plot_ids[:1])
+        assert gen2 > gen1
+        # the running job was not waited for
+        assert not running[0].done()
+        # the pending jobs of the old state were cancelled
+        assert sum(ff.cancelled() for ff in futures1) == 3
+        release.set()
+        qtbot.waitUntil(lambda: finished == [gen2], timeout=30000)
+        # two jobs for the new state
+        assert calls == [gen1, gen2, gen2]
+    finally:
+        release.set()
+        prefetcher.shutdown()
+
+
+def test_prefetch_stale_job_skipped():
+    pl, plot_ids = make_pipeline()
+    prefetcher = plot_prefetch.PlotPrefetcher(max_workers=1)
+    try:
+        prefetcher.cancel()
+        # jobs of an old generation do not compute anything
+        plot_cache.cache_data.clear()
+        plot_state = pl.get_plot(plot_ids[0]).__getstate__()
+        ds = pl.get_plot_datasets(plot_ids[0])[0][0]
+        prefetcher.run_job(prefetcher.generation - 1, plot_state, ds,
+                           pl.dataset_lock)
+        assert len(plot_cache.cache_data) == 0
+    finally:
+        prefetcher.shutdown()
+
+
+def test_prefetch_pipeline_modified():
+    pl, plot_ids = make_pipeline()
+    prefetcher = plot_prefetch.PlotPrefetcher(max_workers=1)
+    try:
+        prefetcher.prefetch(pl, [])
+        revision = pl.revision
+        plot_state = pl.get_plot(plot_ids[0]).__getstate__()
+        # the pipeline is modified before the job starts
+        pl.get_slot(pl.slot_ids[0]).name = "modified"
+        prefetcher.run_plot_job(prefetcher.generation, pl, revision,
+                                plot_ids[0], plot_state)
+        assert not prefetcher._futures
+        # the current revision
+        prefetcher.run_plot_job(prefetcher.generation, pl, pl.revision,
+                                plot_ids[0], plot_state)
+        assert len(prefetcher._futures) == 2
+        prefetcher.wait()
+    finally:
+        prefetcher.shutdown()
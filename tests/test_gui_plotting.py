@@ -6,7 +6,9 @@ import dclab
 import h5py
 import numpy as np
 from PyQt6 import QtCore
+import pyqtgraph as pg
 import pytest
+from shapeout2.gui import pipeline_plot
 from shapeout2.gui.main import ShapeOut2
 from shapeout2 import pipeline, session
 
@@ -314,3 +316,86 @@ def test_changing_lut_identifier_in_analysis_view_plots(qtbot):
     qtbot.mouseClick(pv.pushButton_apply, QtCore.Qt.MouseButton.LeftButton)
 
     assert pv.comboBox_lut.currentData() == "HE-3D-FEM-22"
+
+
+@pytest.mark.parametrize("division", ["each", "merge"])
+def test_scatter_density_image(qtbot, division):
+    mw = ShapeOut2()
+    qtbot.addWidget(mw)
+
+    # add two dataslots
+    path = datapath / "calibration_beads_47.rtdc"
+    slot_ids = mw.add_dataslot(paths=[path, path])
+
+    # add a plot and activate both datasets
+    plot_id = mw.add_plot()
+    for slot_id in slot_ids:
+        pw = mw.block_matrix.get_widget(filt_plot_id=plot_id,
+                                        slot_id=slot_id)
+        qtbot.mouseClick(pw, QtCore.Qt.MouseButton.LeftButton)
+
+    # activate analysis view
+    pe = mw.block_matrix.get_widget(filt_plot_id=plot_id)
+    qtbot.mouseClick(pe.toolButton_modify, QtCore.Qt.MouseButton.LeftButton)
+
+    mw.widget_ana_view.tabWidget.setCurrentWidget(
+        mw.widget_ana_view.tab_plot)
+    pv = mw.widget_ana_view.widget_plot
+
+    idx = pv.comboBox_division.findData(division)
+    pv.comboBox_division.setCurrentIndex(idx)
+    idx = pv.comboBox_scatter_mode.findData("density image")
+    pv.comboBox_scatter_mode.setCurrentIndex(idx)
+    assert not pv.spinBox_downsample.isEnabled()
+    qtbot.mouseClick(pv.pushButton_apply, QtCore.Qt.MouseButton.LeftButton)
+
+    plot = mw.pipeline.get_plot(plot_id)
+    assert plot.__getstate__()["scatter"]["mode"] == "density image"
+    pp = mw.subwindows_plots[plot_id].widget()
+
+    def get_images():
+        images = []
+        for item in pp.plot_items:
+            images += [el for el in item._plot_elements
+                       if hasattr(el, "event_count")]
+        return images
+
+    # the plot window is updated when the plot data are computed
+    qtbot.waitUntil(lambda: len(get_images()) == 2)
+    images = get_images()
+    assert images[0].event_count == 47
+    # the image is recomputed with the dataset from the pipeline
+    assert not hasattr(images[0], "rtdc_ds")
+    images[0]._bins = None
+    images[0].update_image()
+    assert images[0]._bins is not None
+    assert images[0].event_count == 47
+    # not when the filtered events changed
+    filt_id = mw.add_filter()
+    filt = mw.pipeline.get_filter(filt_id)
+    filt.add_box_filter("deform", 0, .01)
+    mw.pipeline.set_element_active(slot_ids[0], filt_id)
+    images[0]._bins = None
+    images[0].update_image()
+    assert images[0]._bins is None
+    assert images[0].event_count == 47
+
+
+def test_density_image_degenerate_range(qtbot):
+    """Empty plot ranges on log scales must not break plotting"""
+    ds = dclab.new_dataset(datapath / "calibration_beads_47.rtdc")
+    plot_state = pipeline.Plot().__getstate__()
+    gen = plot_state["general"]
+    gen["axis x"] = "area_um"
+    gen["axis y"] = "deform"
+    gen["scale x"] = "log"
+    gen["range x"] = [0, 0]
+    gen["range y"] = [0, 1]
+    plot_item = pg.PlotItem()
+    image = pipeline_plot.DensityImageItem(
+        plot_item=plot_item,
+        plot_state=plot_state,
+        rtdc_ds=ds,
+        slot_state={"color": "#FF0000"})
+    assert image.event_count == 0
+    assert image.image is None
@@ -10,6 +10,7 @@ from PyQt6 import QtCore, QtWidgets
 
 from shapeout2 import session
 from shapeout2.gui.main import ShapeOut2
+from shapeout2.pipeline.handle_pool import handle_pool
 
 datapath = pathlib.Path(__file__).parent / "data"
 
@@ -291,6 +292,33 @@ def test_remove_dataset_h5py_error(qtbot):
     mw.close()
 
 
+def test_slot_pinned(qtbot):
+    """The dataset shown in Quick View is not closed by the handle pool"""
+    mw = ShapeOut2()
+    qtbot.addWidget(mw)
+    max_open = handle_pool.max_open
+    try:
+        path = datapath / "calibration_beads_47.rtdc"
+        mw.add_dataslot(paths=[path, path, path])
+        handle_pool.set_max_open(1)
+        mw.on_quickview_show_dataset(0, 0)
+        slot0 = mw.pipeline.slots[0]
+        assert mw.widget_quick_view.slot is slot0
+        assert handle_pool.is_pinned(slot0)
+        # opening other datasets does not close the first one
+        mw.pipeline.slots[1].get_dataset()
+        mw.pipeline.slots[2].get_dataset()
+        assert slot0._dataset is not None
+        assert mw.widget_quick_view.rtdc_ds is not None
+        # showing another dataset releases the first one
+        mw.on_quickview_show_dataset(1, 0)
+        assert not handle_pool.is_pinned(slot0)
+        assert handle_pool.is_pinned(mw.pipeline.slots[1])
+    finally:
+        handle_pool.set_max_open(max_open)
+        mw.close()
+
+
 def test_translate_polygon_filter_issue_115(qtbot):
     """https://github.com/ZELLMECHANIK-DRESDEN/ShapeOut2/issues/115
 
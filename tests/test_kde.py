@@ -0,0 +1,46 @@
+import pathlib
+
+from dclab.kde.methods import kde_gauss
+import numpy as np
+
+from shapeout2 import kde, pipeline, plot_cache
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_kde_binned_vs_gauss():
+    rng = np.random.default_rng(42)
+    x = rng.normal(size=5000)
+    y = rng.normal(scale=2, size=5000)
+    density = kde.kde_binned(x, y)
+    density_ref = kde_gauss(x, y)
+    assert np.allclose(density, density_ref, rtol=0,
+                       atol=0.01 * density_ref.max())
+
+
+def test_kde_binned_nan_and_outside():
+    x = np.array([0, 1, 2, np.nan, 1.5, 0.5])
+    y = np.array([0, 1, 2, 1, 1.5, np.nan])
+    density = kde.kde_binned(x, y, xout=np.array([1, 1, 10]),
+                             yout=np.array([1, np.nan, 10]))
+    assert density[0] > 0
+    assert np.isnan(density[1])
+    assert density[2] == 0
+
+
+def test_scatter_and_contour_binned():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    x, y, density, idx = plot_cache.get_scatter_data(
+        rtdc_ds=ds, downsample=0, xax="area_um", yax="deform",
+        xscale="log", yscale="linear", kde_type="binned")
+    assert density.size == len(ds)
+    assert density.min() == 0
+    assert density.max() == 1
+    contours = plot_cache.get_contour_data(
+        rtdc_ds=ds, xax="area_um", yax="deform", xacc=None, yacc=None,
+        xscale="linear", yscale="linear", kde_type="binned",
+        quantiles=[0.5, 0.95])
+    assert len(contours) == 2
+    assert len(contours[0])
@@ -0,0 +1,104 @@
+import pathlib
+import shutil
+
+import dclab
+import numpy as np
+import pytest
+from shapeout2 import meta_tool
+from shapeout2.meta_index import MetaIndex, meta_index
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    old_path = meta_index.path
+    meta_index.set_path(tmp_path / "meta_index.sqlite")
+    yield tmp_path
+    meta_index.set_path(old_path)
+
+
+def clear_lru_caches():
+    meta_tool.get_rtdc_config.cache_clear()
+    meta_tool.get_rtdc_features.cache_clear()
+    meta_tool.get_rtdc_features_minmax.cache_clear()
+
+
+def test_meta_index_roundtrip(tmp_path):
+    path = tmp_path / "data.rtdc"
+    shutil.copy2(datapath / "calibration_beads_47.rtdc", path)
+    index = MetaIndex(tmp_path / "index.sqlite")
+    index.set(path, {"a": [1, 2.5], "b": None})
+    # a new instance (e.g. in a new session) finds the items
+    index2 = MetaIndex(tmp_path / "index.sqlite")
+    assert index2.get(path, ["a", "b", "c"]) == {"a": [1, 2.5], "b": None}
+    assert index2.hits == 2
+    assert index2.misses == 1
+    # items are discarded when the file changes
+    with path.open("ab") as fd:
+        fd.write(b"\0")
+    assert index2.get(path, ["a"]) == {}
+    index2.set(path, {"c": 1})
+    assert index2._conn.execute("SELECT COUNT(*) FROM items").fetchone() \
+        == (1,)
+
+
+def test_meta_index_not_serializable(tmp_path):
+    path = tmp_path / "data.rtdc"
+    shutil.copy2(datapath / "calibration_beads_47.rtdc", path)
+    index = MetaIndex(tmp_path / "index.sqlite")
+    index.set(path, {"a": object(), "b": 1})
+    assert index.get(path, ["a", "b"]) == {"b": 1}
+
+
+def test_meta_index_max_measurements(tmp_path):
+    paths = []
+    for ii in range(3):
+        paths.append(tmp_path / f"data_{ii}.rtdc")
+        shutil.copy2(datapath / "calibration_beads_47.rtdc", paths[-1])
+    index = MetaIndex(tmp_path / "index.sqlite", max_measurements=2)
+    for pp in paths:
+        index.set(pp, {"a": 1, "b": 2})
+    # the least-recently indexed measurement was removed
+    assert index.get(paths[0], ["a"]) == {}
+    assert index.get(paths[1], ["a"]) == {"a": 1}
+    assert index.get(paths[2], ["a", "b"]) == {"a": 1, "b": 2}
+    index.set_max_measurements(1)
+    assert index.get(paths[1], ["a"]) == {}
+    assert index.get(paths[2], ["a"]) == {"a": 1}
+
+
+def test_meta_index_remote_key():
+    for url in ["https://dcor.example.org/api/3/resource",
+                "http://dcor.example.org/api/3/resource"]:
+        assert MetaIndex.get_key(url) == (url, "dcor")
+
+
+def test_meta_tool_indexed(index_path, monkeypatch):
+    path = index_path / "data.rtdc"
+    shutil.copy2(datapath / "calibration_beads_47.rtdc", path)
+    clear_lru_caches()
+    config = meta_tool.get_rtdc_config(path)
+    features = meta_tool.get_rtdc_features(path)
+    minmax = meta_tool.get_rtdc_features_minmax(path, "deform", "ml_score_xyz")
+    minmax_all = meta_tool.get_rtdc_features_minmax(path)
+    assert "ml_score_xyz" not in minmax
+    clear_lru_caches()
+
+    def new_dataset(*args, **kwargs):
+        raise AssertionError("The file should not be opened!")
+
+    monkeypatch.setattr(dclab, "new_dataset", new_dataset)
+    config2 = meta_tool.get_rtdc_config(path)
+    assert config2["setup"]["channel width"] \
+        == config["setup"]["channel width"]
+    assert config2["experiment"]["date"] == config["experiment"]["date"]
+    assert meta_tool.get_rtdc_features(path) == features
+    assert meta_tool.get_rtdc_features_minmax(path, "deform", "ml_score_xyz") \
+        == minmax
+    minmax_all2 = meta_tool.get_rtdc_features_minmax(path)
+    assert minmax_all2.keys() == minmax_all.keys()
+    for feat in minmax_all:
+        assert np.allclose(minmax_all2[feat], minmax_all[feat])
+    clear_lru_caches()
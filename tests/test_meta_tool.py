@@ -0,0 +1,54 @@
+import pathlib
+import threading
+
+import dclab
+from shapeout2 import meta_tool
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_map_paths_pools():
+    paths = ["https://dcor.mpl.mpg.de/api/3/action/dcserv?id=a",
+             datapath / "calibration_beads_47.rtdc",
+             "https://dcor.mpl.mpg.de/api/3/action/dcserv?id=b",
+             str(datapath / "blood_rbc_leukocytes.rtdc")]
+    names = meta_tool._map_paths(
+        lambda pp: (pp, threading.current_thread().name), paths)
+    # results are in the order of the paths
+    assert [nn[0] for nn in names] == paths
+    assert names[0][1].startswith("MetaToolNetwork")
+    assert names[1][1].startswith("MetaToolLocal")
+    assert names[2][1].startswith("MetaToolNetwork")
+    assert names[3][1].startswith("MetaToolLocal")
+
+
+def test_minmax_bulk():
+    paths = [datapath / "calibration_beads_47.rtdc",
+             datapath / "blood_rbc_leukocytes.rtdc"]
+    features = ["deform", "area_um", "fl1_max"]
+    mmdict = meta_tool.get_rtdc_features_minmax_bulk(
+        paths, features=features, max_workers=2)
+    mm0 = meta_tool.get_rtdc_features_minmax(paths[0], *features)
+    mm1 = meta_tool.get_rtdc_features_minmax(paths[1], *features)
+    assert "fl1_max" not in mm1
+    assert mmdict["fl1_max"] == mm0["fl1_max"]
+    for feat in ["deform", "area_um"]:
+        assert mmdict[feat] == (min(mm0[feat][0], mm1[feat][0]),
+                                max(mm0[feat][1], mm1[feat][1]))
+    assert meta_tool.get_rtdc_features_bulk(paths, max_workers=2) \
+        == sorted(set(meta_tool.get_rtdc_features(paths[0])
+                      + meta_tool.get_rtdc_features(paths[1])))
+
+
+def test_minmax_default_scalar_features():
+    path = datapath / "calibration_beads_47.rtdc"
+    with dclab.new_dataset(path) as ds:
+        scalar = [f for f in ds.features_loaded
+                  if dclab.dfn.scalar_feature_exists(f)]
+        assert "image" in ds.features_loaded
+    # non-scalar features are ignored by default
+    mmdict = meta_tool.get_rtdc_features_minmax(path)
+    assert sorted(mmdict.keys()) == sorted(scalar)
+    mmdict_bulk = meta_tool.get_rtdc_features_minmax_bulk([path])
+    assert sorted(mmdict_bulk.keys()) == sorted(scalar)
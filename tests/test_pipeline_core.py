@@ -1,6 +1,8 @@
 import copy
 import pathlib
 import tempfile
+import threading
+import time
 
 import dclab
 import numpy as np
@@ -42,6 +44,152 @@ def test_apply_filter_ray():
     assert np.all(ds_ref.filter.all == ds_ext.filter.all)
 
 
+def test_check_contour_spacing_cached():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    pl = pipeline.Pipeline()
+    slot_id = pl.add_slot(path=path)
+    plot_id = pl.add_plot()
+    pl.set_element_active(slot_id, plot_id)
+    slot = pl.get_slot(slot_id)
+    calls = []
+
+    def get_sane_spacing_range(feat):
+        calls.append(feat)
+        return pipeline.Dataslot.get_sane_spacing_range(slot, feat)
+
+    slot.get_sane_spacing_range = get_sane_spacing_range
+    plot = pl.get_plot(plot_id)
+    assert len(calls) == 2  # x and y axis
+    # spacing too small
+    state = plot.__getstate__()
+    state["contour"]["spacing x"] = 1e-10
+    plot.__setstate__(state)
+    pl.get_plot(plot_id)
+    assert len(calls) == 4
+    sp_min, _ = slot.get_sane_spacing_range(feat=state["general"]["axis x"])
+    assert plot.__getstate__()["contour"]["spacing x"] == sp_min
+    calls.clear()
+    # nothing changed
+    pl.get_plot(plot_id)
+    assert len(calls) == 0
+    # the slots of the plot changed
+    pl.set_element_active(slot_id, plot_id, False)
+    pl.get_plot(plot_id)
+    assert len(calls) == 0  # no slots
+    pl.set_element_active(slot_id, plot_id, True)
+    pl.get_plot(plot_id)
+    assert len(calls) == 2
+    calls.clear()
+    # in-place modification of the slot
+    slot.config["emodulus"]["emodulus temperature"] = 22.5
+    pl.get_plot(plot_id)
+    assert len(calls) == 2
+
+
+def test_element_states():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    pl = pipeline.Pipeline()
+    slot_ids = [pl.add_slot(path=path) for _ in range(3)]
+    filt_ids = [pl.add_filter() for _ in range(3)]
+    plot_id = pl.add_plot()
+    pl.set_element_active(slot_ids[0], filt_ids[1])
+    pl.set_element_active(slot_ids[2], filt_ids[2])
+    pl.set_element_active(slot_ids[1], plot_id)
+    assert pl.is_element_active(slot_ids[0], filt_ids[1])
+    assert not pl.is_element_active(slot_ids[0], filt_ids[2])
+    assert pl.is_element_active(slot_ids[1], plot_id)
+    assert pl.get_filters_for_slot(slot_ids[2]) \
+        == [pl.get_filter(filt_ids[2])]
+    assert pl.get_filters_for_slot(slot_ids[2], max_filter_index=1) == []
+
+    # reordering slots and removing elements keeps the states
+    pl.reorder_slots([2, 0, 1])
+    pl.remove_filter(filt_ids[0])
+    assert pl.slot_ids == [slot_ids[2], slot_ids[0], slot_ids[1]]
+    assert pl.filter_ids == filt_ids[1:]
+    assert pl.get_plot_datasets(plot_id)[1][0]["identifier"] == slot_ids[1]
+    estates = pl.element_states
+    assert estates[slot_ids[0]] == {filt_ids[1]: True,
+                                    filt_ids[2]: False,
+                                    plot_id: False}
+    assert estates[slot_ids[2]][filt_ids[2]]
+    assert estates[slot_ids[1]][plot_id]
+    pl.remove_slot(slot_ids[0])
+    assert slot_ids[0] not in pl.element_states
+
+    # state roundtrip
+    state = pl.__getstate__()
+    pl2 = pipeline.Pipeline(state)
+    assert pl2.element_states == pl.element_states
+    assert pl2.__getstate__() == state
+
+
+def test_get_datasets_thread_pool():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    pl = pipeline.Pipeline()
+    slot_ids = [pl.add_slot(path=path) for _ in range(4)]
+    filt_id = pl.add_filter()
+    filt = pl.get_filter(filt_id)
+    amin, amax = pl.get_min_max("area_um")
+    filt.boxdict["area_um"] = {"start": amin,
+                               "end": (amin + amax)/2,
+                               "active": True}
+    # the filter is only used for the second and the fourth slot
+    for slot_id in slot_ids[1::2]:
+        pl.set_element_active(slot_id, filt_id)
+    pl.filter_workers = 4
+    dslist = pl.get_datasets()
+    pl.filter_workers = 1
+    dslist_ref = pl.get_datasets()
+    assert [ds.identifier for ds in dslist] == \
+        [ds.identifier for ds in dslist_ref]
+    for ds, ds_ref in zip(dslist, dslist_ref):
+        assert np.all(ds.filter.all == ds_ref.filter.all)
+    assert np.sum(dslist[0].filter.all) > np.sum(dslist[1].filter.all)
+
+
+def test_get_datasets_thread_pool_reused():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    pl = pipeline.Pipeline()
+    pl.filter_workers = 2
+    slot_id = pl.add_slot(path=path)
+    pl.add_filter()
+    # a single slot is computed in this thread
+    pl.get_datasets()
+    assert pl._filter_executor is None
+    pl.add_slot(path=path)
+    pl.get_datasets()
+    executor = pl._filter_executor
+    assert executor is not None
+    pl.get_datasets()
+    assert pl._filter_executor is executor
+    pl.remove_slot(slot_id)
+    pl.get_datasets()
+    assert pl._filter_executor is executor
+
+
+def test_get_datasets_thread_pool_error():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    pl = pipeline.Pipeline()
+    slot_ids = [pl.add_slot(path=path) for _ in range(3)]
+    pl.add_filter()
+    pl.filter_workers = 3
+    pl.get_datasets()
+    # break the filter ray of the second slot
+    ray = pl.get_ray(slot_ids[1])
+
+    def get_dataset(*args, **kwargs):
+        raise ValueError("Sorry Dave")
+
+    ray.get_dataset = get_dataset
+    try:
+        pl.get_datasets()
+    except ValueError as e:
+        assert str(e) == "Sorry Dave"
+    else:
+        assert False, "error should have been raised"
+
+
 def test_get_min_max_inf():
     # generate fake dataset
     path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
@@ -110,6 +258,28 @@ def test_get_min_max_plot():
     assert amax2 <= (amin + amax) / 2
 
 
+def test_dataset_lock():
+    lock = pipeline.Pipeline().dataset_lock
+    events = []
+    reading = threading.Event()
+
+    def reader():
+        with lock.reading():
+            reading.set()
+            time.sleep(.2)
+            events.append("read")
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    reading.wait()
+    # writing waits for the reader and is reentrant
+    with lock.writing():
+        with lock.writing(), lock.reading():
+            events.append("write")
+    thread.join()
+    assert events == ["read", "write"]
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
@@ -0,0 +1,189 @@
+import pathlib
+
+import dclab
+import numpy as np
+from shapeout2 import pipeline
+from shapeout2.pipeline import dataslot
+from shapeout2.pipeline.handle_pool import handle_pool
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_load_dataslots():
+    paths = [datapath / "calibration_beads_47.rtdc",
+             datapath / "does_not_exist.rtdc",
+             datapath / "blood_rbc_leukocytes.rtdc"]
+    progress = []
+    slots, errors = dataslot.load_dataslots(
+        paths, max_workers=3,
+        callback=lambda done, total: progress.append((done, total)))
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    assert slots[1] is None
+    assert len(errors) == 1
+    assert errors[0][0] == paths[1]
+    for slot, path in zip(slots[::2], paths[::2]):
+        assert slot.path == path
+        # the dataset opened in the thread pool is used
+        assert slot._dataset is not None
+        assert slot.get_dataset().path == path
+
+
+def test_dataslot_dataset():
+    path = datapath / "calibration_beads_47.rtdc"
+    slot = dataslot.Dataslot(path)
+    slot2 = dataslot.Dataslot(path, dataset=slot.get_dataset())
+    assert slot2.get_dataset() is slot.get_dataset()
+    assert slot2.name == slot.name
+    assert slot2.config == slot.config
+
+
+def test_handle_pool_reopen():
+    path = datapath / "calibration_beads_47.rtdc"
+    max_open = handle_pool.max_open
+    try:
+        slots = [dataslot.Dataslot(path) for _ in range(3)]
+        manual = np.ones(len(slots[0].get_dataset()), dtype=bool)
+        manual[:5] = False
+        slots[0].get_dataset().filter.manual[:] = manual
+        slots[0].get_dataset().apply_filter()
+        filt = pipeline.Filter()
+        filt.add_box_filter("deform", 0, .01)
+        ray = pipeline.FilterRay(slots[0])
+        ds_ref = ray.get_dataset(filters=[filt])
+        count = np.sum(ds_ref.filter.all)
+        handle_pool.set_max_open(2)
+        # opening another dataset closes the first one
+        slots[1].get_dataset()
+        slots[2].get_dataset()
+        assert slots[0]._dataset is None
+        assert slots[0] not in handle_pool
+        assert slots[0].dataset_generation == 1
+        assert len(handle_pool) == 2
+        # the dataset is reopened with the same manual filter
+        ds0 = slots[0].get_dataset()
+        assert np.all(ds0.filter.manual == manual)
+        assert slots[1]._dataset is None
+        # the filter ray is rebuilt
+        ds = ray.get_dataset(filters=[filt])
+        assert ds is not ds_ref
+        assert ds.get_root_parent() is ds0
+        assert np.sum(ds.filter.all) == count
+    finally:
+        handle_pool.set_max_open(max_open)
+
+
+def test_handle_pool_get_datasets():
+    path = datapath / "blood_rbc_leukocytes.rtdc"
+    max_open = handle_pool.max_open
+    try:
+        handle_pool.set_max_open(1)
+        pl = pipeline.Pipeline()
+        filt_id = pl.add_filter()
+        slot_ids = [pl.add_slot(path=path) for _ in range(3)]
+        for slot_id in slot_ids:
+            pl.set_element_active(slot_id, filt_id)
+        # the datasets of the slots are not closed by one another
+        datasets = pl.get_datasets()
+        for ds in datasets:
+            assert len(ds["deform"][:]) == len(ds)
+        # the datasets are closed with the next access
+        pl.get_slot(slot_ids[0]).get_dataset()
+        assert len(handle_pool) == 1
+    finally:
+        handle_pool.set_max_open(max_open)
+
+
+def test_handle_pool_pinned():
+    path = datapath / "calibration_beads_47.rtdc"
+    max_open = handle_pool.max_open
+    try:
+        handle_pool.set_max_open(1)
+        slots = [dataslot.Dataslot(path) for _ in range(3)]
+        with handle_pool.pinned(slots[:2]):
+            ds0 = slots[0].get_dataset()
+            slots[1].get_dataset()
+            # the slot that is accessed is not closed either
+            ds2 = slots[2].get_dataset()
+            assert len(handle_pool) == 3
+            assert len(ds0["deform"][:]) == len(ds0)
+            assert len(ds2["deform"][:]) == len(ds2)
+        assert handle_pool.is_pinned(slots[0]) is False
+        slots[2].get_dataset()
+        assert len(handle_pool) == 1
+        assert slots[0]._dataset is None
+    finally:
+        handle_pool.set_max_open(max_open)
+
+
+def test_sane_spacing_range_partial_read():
+    class Data:
+        """Array wrapper that records the number of read events"""
+        def __init__(self, array):
+            self.array = array
+            self.read = 0
+
+        def __len__(self):
+            return len(self.array)
+
+        def __getitem__(self, index):
+            values = np.atleast_1d(self.array[index])
+            self.read += values.size
+            return self.array[index]
+
+    array = np.linspace(0, 1, 100000)
+    array[:10] = np.nan
+    array[-10:] = np.nan
+    data = Data(array)
+    sp_min, sp_max = dataslot.get_sane_contour_spacing_range("time", data)
+    assert np.allclose(sp_max, (array[-11] - array[10]) / 5)
+    assert data.read <= 30000
+    data = Data(array)
+    sp_min, sp_max = dataslot.get_sane_contour_spacing_range("deform", data)
+    assert np.allclose(sp_max, (array[10009] - array[10]) / 5)
+    assert data.read <= 30000
+
+
+def test_sane_spacing_range_stored_statistics(tmp_path):
+    path = tmp_path / "stored.rtdc"
+    deform = np.linspace(0.01, 0.1, 20000)
+    time = np.linspace(0, 20, 20000)
+    with dclab.RTDCWriter(path) as hw:
+        hw.store_metadata({"experiment": {"sample": "test",
+                                          "run index": 1},
+                           "imaging": {"pixel size": 0.34},
+                           "setup": {"channel width": 20,
+                                     "chip region": "channel",
+                                     "flow rate": 0.04}})
+        hw.store_feature("deform", deform)
+        hw.store_feature("time", time)
+    with dclab.new_dataset(path) as ds:
+        assert dataslot.get_stored_feature_range(ds["deform"]) \
+            == (deform.min(), deform.max())
+        # the stored min/max values are used instead of the first events
+        sp_min, sp_max = dataslot.get_sane_contour_spacing_range(
+            "deform", ds["deform"])
+        assert np.allclose(sp_max, (deform.max() - deform.min()) / 5)
+        assert ds["deform"]._array is None, "data must not be loaded"
+        sp_min, sp_max = dataslot.get_sane_contour_spacing_range(
+            "time", ds["time"])
+        assert np.allclose(sp_max, 20 / 5)
+    # no stored values
+    assert dataslot.get_stored_feature_range(deform) is None
+
+
+def test_sane_spacing_range_emodulus_config():
+    slot = pipeline.Dataslot(datapath / "blood_rbc_leukocytes.rtdc")
+    state = slot.__getstate__()
+    state["emodulus"]["emodulus enabled"] = True
+    state["emodulus"]["emodulus medium"] = "CellCarrier"
+    state["emodulus"]["emodulus scenario"] = "manual"
+    state["emodulus"]["emodulus temperature"] = 23.0
+    slot.__setstate__(state)
+    range_a = slot.get_sane_spacing_range("emodulus")
+    assert np.all(np.isfinite(range_a))
+    # the cached range must not be used for a different configuration
+    state["emodulus"]["emodulus temperature"] = 30.0
+    slot.__setstate__(state)
+    range_b = slot.get_sane_spacing_range("emodulus")
+    assert range_a != range_b
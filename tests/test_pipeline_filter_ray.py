@@ -1,7 +1,11 @@
 import pathlib
 
+import dclab
 import numpy as np
+import pytest
 from shapeout2 import pipeline
+from shapeout2.pipeline.filter_ray import (
+    RayModifiedError, get_mask_fingerprint)
 
 
 def test_get_heredity():
@@ -65,6 +69,38 @@ def test_get_heredity():
     assert ds5 is ds6  # b/c filt2 does nothing
 
 
+def test_step_cache():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    slot = pipeline.Dataslot(path)
+    ds = slot.get_dataset()
+    ray = pipeline.FilterRay(slot)
+    filt1 = pipeline.Filter()
+    filt1.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                                "end": np.mean(ds["area_um"]),
+                                "active": True}
+    filt2 = pipeline.Filter()
+    filt2.boxdict["deform"] = {"start": np.min(ds["deform"]),
+                               "end": np.mean(ds["deform"]),
+                               "active": True}
+    ds12 = ray.get_dataset(filters=[filt1, filt2])
+    # intermediate datasets are the hierarchy parents
+    assert ray.get_dataset(filters=[filt1]) is ds12.hparent
+    assert ray.get_dataset(filters=[filt1, filt2]) is ds12
+    assert ray._generation == 0
+    # a different order creates a new branch...
+    ds21 = ray.get_dataset(filters=[filt2, filt1])
+    assert ray._generation == 1
+    assert ds21 is not ds12
+    # ...but going back does not compute anything anew
+    assert ray.get_dataset(filters=[filt1]) is ds12.hparent
+    assert ray.get_dataset(filters=[filt1, filt2]) is ds12
+    assert ray.get_dataset(filters=[filt2, filt1]) is ds21
+    assert len(ray._step_cache) == 4
+    # same result as without caching
+    ref = ray.get_final_child(rtdc_ds=ds)
+    assert np.all(ds21.filter.all == ref.filter.all)
+
+
 def test_filtering():
     path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
 
@@ -100,6 +136,81 @@ def test_filtering():
     assert len(ds4) == 47
 
 
+def test_mask_fingerprint():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+
+    slot = pipeline.Dataslot(path)
+    ds = slot.get_dataset()
+    ray = pipeline.FilterRay(slot)
+
+    filt1 = pipeline.Filter()
+    filt1.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                                "end": np.mean(ds["area_um"]),
+                                "active": True}
+    filt2 = pipeline.Filter()
+
+    ds1 = ray.get_dataset(filters=[filt1], apply_filter=True)
+    fp1 = get_mask_fingerprint(ds1)
+    assert fp1 == ray.get_mask_fingerprint()
+    # adding a filter that does not filter anything changes the ray
+    ds2 = ray.get_dataset(filters=[filt1, filt2], apply_filter=True)
+    fp2 = get_mask_fingerprint(ds2)
+    assert fp1 != fp2
+    # going back yields the same fingerprint
+    ds3 = ray.get_dataset(filters=[filt1], apply_filter=True)
+    assert get_mask_fingerprint(ds3) == fp1
+    # modifying a filter changes the fingerprint
+    filt1.boxdict["area_um"]["end"] = np.max(ds["area_um"])
+    ds4 = ray.get_dataset(filters=[filt1], apply_filter=True)
+    assert get_mask_fingerprint(ds4) != fp1
+
+    # polygon filters are taken into account
+    pf = dclab.PolygonFilter(axes=["area_um", "deform"],
+                             points=[[0, 0], [100, 0], [100, .1]])
+    filt2.polylist.append(pf.unique_id)
+    ds5 = ray.get_dataset(filters=[filt1, filt2], apply_filter=True)
+    fp5 = get_mask_fingerprint(ds5)
+    pf.points = [[0, 0], [100, 0], [100, .2]]
+    ds6 = ray.get_dataset(filters=[filt1, filt2], apply_filter=True)
+    assert get_mask_fingerprint(ds6) != fp5
+    dclab.PolygonFilter.remove(pf.unique_id)
+
+
+def test_mask_fingerprint_unregistered():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    ds = dclab.new_dataset(path)
+    ch = dclab.new_dataset(ds)
+    fp1 = get_mask_fingerprint(ch)
+    # filtering the parent changes the fingerprint of the child
+    ds.config["filtering"]["deform min"] = 0
+    ds.config["filtering"]["deform max"] = np.mean(ds["deform"])
+    ds.apply_filter()
+    ch.apply_filter()
+    assert get_mask_fingerprint(ch) != fp1
+
+
+def test_filter_ray_modified_during_update():
+    path = pathlib.Path(__file__).parent / "data" / "calibration_beads_47.rtdc"
+    slot = pipeline.Dataslot(path)
+    ray = pipeline.FilterRay(slot)
+    filt = pipeline.Filter()
+    filt.add_box_filter("deform", 0, .01)
+    update_dataset = filt.update_dataset
+
+    def modifying_update(ds):
+        update_dataset(ds)
+        # e.g. modified in the GUI while a worker thread updates the ray
+        filt.boxdict["deform"]["end"] = .02
+
+    filt.update_dataset = modifying_update
+    with pytest.raises(RayModifiedError):
+        ray.get_dataset(filters=[filt])
+    assert not ray.steps
+    filt.update_dataset = update_dataset
+    ds = ray.get_dataset(filters=[filt])
+    assert ds.config["filtering"]["deform max"] == .02
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
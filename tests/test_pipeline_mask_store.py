@@ -0,0 +1,97 @@
+import pathlib
+
+import numpy as np
+from shapeout2 import pipeline
+from shapeout2.pipeline import mask_store as ms
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_mask_store_roundtrip(tmp_path):
+    store = ms.MaskStore(path=tmp_path)
+    mask = np.random.default_rng(42).random(1001) > .5
+    store.set("a", mask)
+    # one bit per event
+    assert store.nbytes == 126
+    assert np.all(store.get("a") == mask)
+    assert store.hits == 1
+    # a new instance (e.g. in a new session) finds the mask
+    store2 = ms.MaskStore(path=tmp_path)
+    mask2 = store2.get("a")
+    assert mask2.dtype == bool
+    assert np.all(mask2 == mask)
+    assert store2.get("b") is None
+    assert store2.misses == 1
+
+
+def test_mask_store_lru_eviction():
+    store = ms.MaskStore(max_bytes=250)
+    for key in "abc":
+        store.set(key, np.ones(800, dtype=bool))  # 100 bytes
+    assert "a" not in store
+    assert "b" in store
+    assert "c" in store
+    assert store.nbytes == 200
+
+
+def test_mask_store_disk_eviction(tmp_path):
+    # a mask that is being written (e.g. by another session)
+    temp_path = tmp_path / ".tmp-x-1234.npy"
+    temp_path.write_bytes(b"\0" * 1000)
+    store = ms.MaskStore(path=tmp_path)
+    assert store.disk_nbytes == 0
+    store.set("a", np.ones(800, dtype=bool))
+    size = (tmp_path / "a.npy").stat().st_size
+    assert store.disk_nbytes == size
+    store.max_disk_bytes = 2 * size
+    store.set("b", np.ones(800, dtype=bool))
+    store.get("a")  # "a" is now the most recently used file
+    store.set("c", np.ones(800, dtype=bool))
+    assert store.disk_nbytes == 2 * size
+    assert (tmp_path / "a.npy").exists()
+    assert not (tmp_path / "b.npy").exists()
+    assert (tmp_path / "c.npy").exists()
+    assert temp_path.exists()
+    # the sizes are determined when the directory is set
+    store2 = ms.MaskStore(path=tmp_path)
+    assert store2.disk_nbytes == 2 * size
+    store2.clear()
+    assert store2.disk_nbytes == 0
+    assert sorted(pp.name for pp in tmp_path.iterdir()) == [temp_path.name]
+
+
+def test_filter_ray_stored_masks():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    filt1 = pipeline.Filter()
+    filt1.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                                "end": np.mean(ds["area_um"]),
+                                "active": True}
+    filt2 = pipeline.Filter()
+    filt2.boxdict["deform"] = {"start": np.min(ds["deform"]),
+                               "end": np.mean(ds["deform"]),
+                               "active": True}
+    ms.mask_store.clear()
+    ray = pipeline.FilterRay(slot)
+    ds1 = ray.get_dataset(filters=[filt1, filt2])
+    assert ms.mask_store.hits == 0
+    assert len(ms.mask_store._items) == 2
+    # a new ray (e.g. after loading a session) reuses the masks
+    ray2 = pipeline.FilterRay(slot)
+    ds2 = ray2.get_dataset(filters=[filt1, filt2])
+    assert ms.mask_store.hits == 2
+    assert np.all(ds1.filter.all == ds2.filter.all)
+    assert np.all(ds1["deform"] == ds2["deform"])
+    count2 = np.sum(ds2.filter.all)
+    # changing a filter computes a new mask
+    filt2.boxdict["deform"]["end"] = np.max(ds["deform"])
+    ds3 = ray2.get_dataset(filters=[filt1, filt2])
+    assert ms.mask_store.hits == 3
+    assert np.sum(ds3.filter.all) > count2
+    # and it is the same as without the mask store
+    ms.mask_store.clear()
+    ds4 = pipeline.FilterRay(slot).get_dataset(filters=[filt1, filt2])
+    assert ms.mask_store.hits == 0
+    assert np.all(ds3.filter.all == ds4.filter.all)
+    ms.mask_store.clear()
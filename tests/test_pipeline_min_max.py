@@ -0,0 +1,55 @@
+import pathlib
+
+import numpy as np
+from shapeout2 import pipeline
+from shapeout2.pipeline import min_max
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_compute_min_max_chunks():
+    rng = np.random.default_rng(42)
+    data = rng.normal(size=1001)
+    data[[3, 500]] = np.inf
+    data[[4, 600]] = np.nan
+    data[700] = -np.inf
+    mask = rng.random(1001) > .3
+    ref = data[mask & np.isfinite(data)]
+    for chunk_size in [1, 10, 1001, 2000]:
+        vmin, vmax = min_max.compute_min_max(data, mask,
+                                             chunk_size=chunk_size)
+        assert vmin == np.min(ref)
+        assert vmax == np.max(ref)
+    # integer data
+    assert min_max.compute_min_max(np.arange(10), np.arange(10) > 2,
+                                   chunk_size=3) == (3, 9)
+    # no valid data
+    assert min_max.compute_min_max(data, np.zeros(1001, dtype=bool)) \
+        == (np.inf, -np.inf)
+
+
+def test_get_min_max_cache_invalidation():
+    pl = pipeline.Pipeline()
+    slot_id = pl.add_slot(path=datapath / "calibration_beads_47.rtdc")
+    filt_id = pl.add_filter()
+    plot_id = pl.add_plot()
+    pl.set_element_active(slot_id, filt_id)
+    pl.set_element_active(slot_id, plot_id)
+    min_max.clear_min_max_cache()
+    amin, amax = pl.get_min_max("area_um", plot_id=plot_id)
+    assert len(min_max._cache) == 1
+    # cached
+    assert pl.get_min_max("area_um", plot_id=plot_id) == [amin, amax]
+    assert len(min_max._cache) == 1
+    # changing the filter yields a new mask fingerprint
+    filt = pl.get_filter(filt_id)
+    filt.boxdict["area_um"] = {"start": amin,
+                               "end": (amin + amax) / 2,
+                               "active": True}
+    bmin, bmax = pl.get_min_max("area_um", plot_id=plot_id)
+    assert len(min_max._cache) == 2
+    assert bmin == amin
+    assert bmax <= (amin + amax) / 2
+    ds = pl.get_plot_datasets(plot_id)[0][0]
+    assert bmax == np.max(ds["area_um"][ds.filter.all])
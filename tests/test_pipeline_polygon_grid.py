@@ -0,0 +1,41 @@
+import dclab
+import numpy as np
+import pytest
+
+from shapeout2.pipeline import polygon_grid
+
+
+@pytest.mark.parametrize("inverted", [False, True])
+def test_polygon_filter_same_as_dclab(inverted):
+    rng = np.random.default_rng(42)
+    for _ in range(20):
+        points = rng.random((rng.integers(3, 30), 2)) * 10
+        pf = dclab.PolygonFilter(axes=("area_um", "deform"),
+                                 points=points,
+                                 inverted=inverted)
+        # events on vertices and edges, nan and inf
+        datax = np.concatenate([rng.random(10000) * 12 - 1,
+                                points[:, 0],
+                                (points[:, 0] + np.roll(points[:, 0], 1)) / 2,
+                                [np.nan, np.inf, -np.inf, 5]])
+        datay = np.concatenate([rng.random(10000) * 12 - 1,
+                                points[:, 1],
+                                (points[:, 1] + np.roll(points[:, 1], 1)) / 2,
+                                [5, 5, 5, np.nan]])
+        assert np.array_equal(polygon_grid.polygon_filter(pf, datax, datay),
+                              pf.filter(datax, datay))
+        dclab.PolygonFilter.remove(pf.unique_id)
+
+
+def test_polygon_grid_cells():
+    grid = polygon_grid.PolygonGrid([[0, 0], [4, 0], [4, 4], [0, 4]],
+                                    size=4)
+    assert np.all(grid.boundary[[0, -1], :])
+    assert np.all(grid.boundary[:, [0, -1]])
+    assert np.all(~grid.boundary[1:3, 1:3])
+    assert np.all(grid.inside[1:3, 1:3])
+
+
+def test_polygon_grid_degenerate():
+    grid = polygon_grid.PolygonGrid([[0, 0], [1, 0], [2, 0]])
+    assert not np.any(grid.contains([0, 1, 1.5], [0, 0, 0]))
@@ -0,0 +1,112 @@
+import gc
+import pathlib
+
+import dclab
+import numpy as np
+from shapeout2 import pipeline
+from shapeout2.pipeline import range_index
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_range_index_mask():
+    rng = np.random.default_rng(42)
+    data = rng.normal(size=1000)
+    data[::17] = np.nan
+    index = range_index.RangeIndex(data)
+    mask = index.get_mask(-1, .5)
+    with np.errstate(invalid="ignore"):
+        assert np.all(mask == ((data >= -1) & (data <= .5)))
+    assert index.count(-1, .5) == np.sum(mask)
+    # incremental updates (overlapping and disjoint ranges)
+    indices = np.arange(0, 1000, 3)
+    for _ in range(50):
+        start, end = np.sort(rng.normal(size=2) * 2)
+        mask = index.get_mask(start, end, indices=indices)
+        with np.errstate(invalid="ignore"):
+            ref = (data >= start) & (data <= end)
+        assert np.all(mask == ref[indices])
+    # boundaries are included
+    value = data[np.isfinite(data)][0]
+    assert index.count(value, value) == 1
+
+
+def test_range_index_cache():
+    ds1 = dclab.new_dataset(datapath / "calibration_beads_47.rtdc")
+    ds2 = dclab.new_dataset(datapath / "calibration_beads_47.rtdc")
+    cache = range_index.RangeIndexCache(min_requests=2)
+    # the index is only built for repeated requests
+    assert cache.get(ds1, "deform") is None
+    index1 = cache.get(ds1, "deform")
+    assert index1 is not None
+    assert cache.get(ds1, "deform") is index1
+    assert cache.nbytes == index1.nbytes
+    # least-recently-used indices are evicted
+    cache.set_max_bytes(index1.nbytes)
+    cache.get(ds2, "deform")
+    index2 = cache.get(ds2, "deform")
+    assert cache.nbytes == index2.nbytes
+    assert cache.get(ds1, "deform") is not index1
+    # indices of deleted datasets are removed
+    del ds1, ds2
+    gc.collect()
+    assert cache.nbytes == 0
+    assert len(cache._entries) == 0
+
+
+def test_filter_ray_box_filters():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    ray = pipeline.FilterRay(slot)
+    filt1 = pipeline.Filter()
+    filt1.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                                "end": np.mean(ds["area_um"]),
+                                "active": True}
+    filt2 = pipeline.Filter()
+    filt2.boxdict["deform"] = {"start": np.min(ds["deform"]),
+                               "end": np.mean(ds["deform"]),
+                               "active": True}
+    # reference computed with dclab
+    ref1 = dclab.new_dataset(ds)
+    ref1.config["filtering"]["area_um min"] = np.min(ds["area_um"])
+    ref1.config["filtering"]["area_um max"] = np.mean(ds["area_um"])
+    ref2 = dclab.new_dataset(ref1)
+    for end in [np.mean(ds["deform"]), np.median(ds["deform"]),
+                np.max(ds["deform"])]:
+        filt2.boxdict["deform"]["end"] = end
+        ds2 = ray.get_dataset(filters=[filt1, filt2])
+        ref2.config["filtering"]["deform min"] = np.min(ds["deform"])
+        ref2.config["filtering"]["deform max"] = end
+        ref2.apply_filter()
+        assert np.all(ds2.filter.all == ref2.filter.all)
+
+
+def test_range_index_emodulus_config():
+    pl = pipeline.Pipeline()
+    slot_id = pl.add_slot(path=datapath / "blood_rbc_leukocytes.rtdc")
+    filt_id = pl.add_filter()
+    pl.set_element_active(slot_id, filt_id)
+    slot = pl.get_slot(slot_id)
+    state = slot.__getstate__()
+    state["emodulus"]["emodulus enabled"] = True
+    state["emodulus"]["emodulus medium"] = "CellCarrier"
+    state["emodulus"]["emodulus scenario"] = "manual"
+    state["emodulus"]["emodulus temperature"] = 23.0
+    slot.__setstate__(state)
+    ds = pl.get_dataset(0, filt_index=None)
+    emod = ds["emodulus"]
+    start, end = np.nanpercentile(emod, [20, 60])
+    filt = pl.get_filter(filt_id)
+    filt.boxdict["emodulus"] = {"start": start, "end": end, "active": True}
+    filt.mark_modified()
+    assert np.sum(pl.get_dataset(0).filter.all) \
+        == np.sum((emod >= start) & (emod <= end))
+    # the emodulus changes with the temperature
+    state["emodulus"]["emodulus temperature"] = 35.0
+    slot.__setstate__(state)
+    ds = pl.get_dataset(0, filt_index=None)
+    emod2 = ds["emodulus"]
+    assert not np.allclose(emod, emod2, equal_nan=True)
+    assert np.sum(pl.get_dataset(0).filter.all) \
+        == np.sum((emod2 >= start) & (emod2 <= end))
@@ -0,0 +1,140 @@
+import pathlib
+
+import dclab
+from dclab.rtdc_dataset.filter import NanWarning
+import numpy as np
+import pytest
+from shapeout2 import pipeline
+from shapeout2.pipeline import mask_store, ray_filter
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_same_as_dclab():
+    ds = dclab.new_dataset(datapath / "calibration_beads_47.rtdc")
+    pf = dclab.PolygonFilter(axes=["area_um", "deform"],
+                             points=[[0, 0], [100, 0], [100, .1]])
+    ch = ray_filter.RayHierarchy(ds)
+    ref = dclab.new_dataset(ds)
+    for cfg in [
+        {"area_um min": 0, "area_um max": np.mean(ds["area_um"])},
+        {"remove invalid events": True,
+         # inverted range
+         "deform min": np.mean(ds["deform"]), "deform max": 0},
+        {"polygon filters": [pf.unique_id],
+         "bright_avg min": 0, "bright_avg max": 0,
+         "limit events": 5},
+        {"polygon filters": [pf.unique_id],
+         "area_um min": 0, "area_um max": np.mean(ds["area_um"])},
+    ]:
+        ch.reset_filter()
+        ref.reset_filter()
+        ch.config["filtering"].update(cfg)
+        ref.config["filtering"].update(cfg)
+        ch.apply_filter()
+        ref.apply_filter()
+        assert np.all(ch.filter.all == ref.filter.all)
+        assert np.all(ch.filter.box == ref.filter.box)
+        assert np.all(ch.filter.polygon == ref.filter.polygon)
+        assert np.all(ch.filter.invalid == ref.filter.invalid)
+        for feat in ["area_um", "deform"]:
+            assert np.all(ch.filter[feat] == ref.filter[feat])
+    dclab.PolygonFilter.remove(pf.unique_id)
+
+
+def test_criteria_after_mask_store_hit():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    pf = dclab.PolygonFilter(axes=["area_um", "deform"],
+                             points=[[0, 0], [100, 0], [100, .1]])
+    filt = pipeline.Filter()
+    filt.polylist.append(pf.unique_id)
+    filt.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                               "end": np.mean(ds["area_um"]),
+                               "active": True}
+    mask_store.mask_store.clear()
+    mask_store.criterion_store.clear()
+    ds1 = pipeline.FilterRay(slot).get_dataset(filters=[filt])
+    hits = mask_store.mask_store.hits
+    # the final mask of a new ray is loaded from the mask store
+    ds2 = pipeline.FilterRay(slot).get_dataset(filters=[filt])
+    assert mask_store.mask_store.hits == hits + 1
+    assert np.all(ds2.filter.all == ds1.filter.all)
+    assert np.all(ds2.filter.box == ds1.filter.box)
+    assert np.all(ds2.filter.polygon == ds1.filter.polygon)
+    assert np.all(ds2.filter.invalid == ds1.filter.invalid)
+    assert np.all(ds2.filter["area_um"] == ds1.filter["area_um"])
+    assert not np.all(ds2.filter["area_um"])
+    assert np.all(ds2.filter["deform"])
+    assert ds2.filter.criteria == ds1.filter.criteria
+    dclab.PolygonFilter.remove(pf.unique_id)
+    mask_store.mask_store.clear()
+    mask_store.criterion_store.clear()
+
+
+def test_nan_warning():
+    ds = dclab.new_dataset(datapath / "calibration_beads_47.rtdc")
+    area_um = np.array(ds["area_um"], copy=True)
+    area_um[0] = np.nan
+    ds2 = dclab.new_dataset({"area_um": area_um,
+                             "deform": np.array(ds["deform"])})
+    ch = ray_filter.RayHierarchy(ds2)
+    ch.config["filtering"]["area_um min"] = 0
+    ch.config["filtering"]["area_um max"] = np.nanmean(area_um)
+    with pytest.warns(NanWarning, match="area_um"):
+        ch.apply_filter()
+    assert not ch.filter.all[0]
+
+
+def test_criteria_shared_between_steps():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    pf = dclab.PolygonFilter(axes=["area_um", "deform"],
+                             points=[[0, 0], [100, 0], [100, .1]])
+    filt = pipeline.Filter()
+    filt.polylist.append(pf.unique_id)
+    filt.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                               "end": np.mean(ds["area_um"]),
+                               "active": True}
+    mask_store.mask_store.clear()
+    mask_store.criterion_store.clear()
+    ray = pipeline.FilterRay(slot)
+    ds1 = ray.get_dataset(filters=[filt])
+    assert mask_store.criterion_store.hits == 0
+    assert ds1.filter.criteria == ["box area_um", "polygon {}".format(
+        pf.unique_id)]
+    # only the box filter is computed for the new step
+    filt.boxdict["area_um"]["end"] = np.max(ds["area_um"])
+    ds2 = ray.get_dataset(filters=[filt])
+    assert ds2 is not ds1
+    assert mask_store.criterion_store.hits == 1
+    assert np.sum(ds2.filter.all) > np.sum(ds1.filter.all)
+    assert np.all(ds2.filter.polygon == ds1.filter.polygon)
+    dclab.PolygonFilter.remove(pf.unique_id)
+    mask_store.mask_store.clear()
+    mask_store.criterion_store.clear()
+
+
+def test_update_dataset_keeps_criteria():
+    ds = dclab.new_dataset(datapath / "calibration_beads_47.rtdc")
+    ch = ray_filter.RayHierarchy(ds)
+    filt = pipeline.Filter()
+    filt.boxdict["area_um"] = {"start": np.min(ds["area_um"]),
+                               "end": np.mean(ds["area_um"]),
+                               "active": True}
+    filt.boxdict["deform"] = {"start": np.min(ds["deform"]),
+                              "end": np.mean(ds["deform"]),
+                              "active": True}
+    filt.apply_to_dataset(ch)
+    mask_area = ch.filter._criteria["box area_um"][1]
+    mask_deform = ch.filter._criteria["box deform"][1]
+    filt.boxdict["deform"]["end"] = np.max(ds["deform"])
+    filt.apply_to_dataset(ch)
+    assert ch.filter._criteria["box area_um"][1] is mask_area
+    assert ch.filter._criteria["box deform"][1] is not mask_deform
+    # deactivating a box filter removes it from the configuration
+    filt.boxdict["deform"]["active"] = False
+    filt.apply_to_dataset(ch)
+    assert "deform min" not in ch.config["filtering"]
+    assert ch.filter.criteria == ["box area_um"]
@@ -0,0 +1,121 @@
+import pathlib
+
+from shapeout2 import pipeline
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_element_revision():
+    filt = pipeline.Filter()
+    rev = filt.revision
+    # unchanged
+    filt.__getstate__()
+    assert filt.revision == rev
+    # attribute assignment
+    filt.name = "peter"
+    assert filt.revision > rev
+    rev = filt.revision
+    # mutators
+    filt.add_box_filter("deform", 0, .1)
+    assert filt.revision > rev
+    rev = filt.revision
+    filt.filter_used = False
+    assert filt.revision > rev
+    rev = filt.revision
+    filt.__setstate__(filt.__getstate__())
+    assert filt.revision > rev
+
+    plot = pipeline.Plot()
+    rev = plot.revision
+    plot.name = "hans"
+    assert plot.revision > rev
+
+
+def test_pipeline_revision():
+    pl = pipeline.Pipeline()
+    rev0 = pl.revision
+    slot_id = pl.add_slot(path=datapath / "calibration_beads_47.rtdc")
+    filt_id = pl.add_filter()
+    rev1 = pl.revision
+    assert rev1 > rev0
+    assert pl.revision == rev1
+    pl.set_element_active(slot_id, filt_id)
+    rev2 = pl.revision
+    assert rev2 > rev1
+    pl.get_filter(filt_id).add_box_filter("deform", 0, .1)
+    rev3 = pl.revision
+    assert rev3 > rev2
+    pl.get_slot(slot_id).name = "other name"
+    assert pl.revision > rev3
+
+
+def test_filter_ray_slot_revision():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ray = pipeline.FilterRay(slot)
+    filt = pipeline.Filter()
+    filt.add_box_filter("deform", 0, .01)
+    ds1 = ray.get_dataset(filters=[filt])
+    # setting the same state does not reset the ray
+    slot.__setstate__(slot.__getstate__())
+    assert ray.get_dataset(filters=[filt]) is ds1
+    # modifying the slot does
+    state = slot.__getstate__()
+    state["emodulus"]["emodulus temperature"] = 22.5
+    slot.__setstate__(state)
+    assert ray.get_dataset(filters=[filt]) is not ds1
+
+
+def test_filter_ray_nested_slot_edit():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ray = pipeline.FilterRay(slot)
+    filt = pipeline.Filter()
+    filt.add_box_filter("deform", 0, .01)
+    ds1 = ray.get_dataset(filters=[filt])
+    rev = slot.revision
+    # in-place modification without `mark_modified`
+    slot.config["emodulus"]["emodulus temperature"] = 22.5
+    assert slot.revision > rev
+    assert ray.get_dataset(filters=[filt]) is not ds1
+
+
+def test_nested_edit_revision():
+    filt = pipeline.Filter()
+    rev = filt.revision
+    filt.boxdict["deform"] = {"start": 0, "end": .1, "active": True}
+    assert filt.revision > rev
+    rev = filt.revision
+    filt.boxdict["deform"]["end"] = .2
+    assert filt.revision > rev
+    rev = filt.revision
+    filt.general["remove invalid events"] = True
+    assert filt.revision > rev
+    rev = filt.revision
+    filt.polylist.append(0)
+    assert filt.revision > rev
+    rev = filt.revision
+    # states are plain dictionaries
+    state = filt.__getstate__()
+    state["box filters"]["deform"]["end"] = .3
+    assert filt.revision == rev
+    assert filt.boxdict["deform"]["end"] == .2
+
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    rev = slot.revision
+    slot.config["crosstalk"]["crosstalk fl21"] = .1
+    assert slot.revision > rev
+
+
+def test_polygon_filter_revision():
+    import dclab
+    pf = dclab.PolygonFilter(axes=["area_um", "deform"],
+                             points=[[0, 0], [1, 1], [1, 0]])
+    filt1 = pipeline.Filter()
+    filt2 = pipeline.Filter()
+    filt1.polylist.append(pf.unique_id)
+    rev1 = filt1.revision
+    rev2 = filt2.revision
+    pf.points = [[0, 0], [2, 2], [2, 0]]
+    pipeline.Filter.mark_polygon_filter_modified(pf.unique_id)
+    assert filt1.revision > rev1
+    assert filt2.revision == rev2
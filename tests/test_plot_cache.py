@@ -0,0 +1,282 @@
+import os
+import pathlib
+
+from dclab.kde import KernelDensityEstimator
+import numpy as np
+
+from shapeout2 import pipeline, plot_cache
+
+
+datapath = pathlib.Path(__file__).parent / "data"
+
+
+def test_cache_lru_eviction():
+    cache = plot_cache.PlotDataCache(max_bytes=3000)
+    cache["a"] = np.zeros(100)  # 800 bytes
+    cache["b"] = (np.zeros(100), np.zeros(100))  # 1600 bytes
+    assert cache.nbytes == 2400
+    # access "a" so that "b" becomes the least-recently used item
+    assert cache.get("a") is not None
+    cache["c"] = [[np.zeros(50)], [np.zeros(50)]]  # 800 bytes
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.nbytes == 1600
+    assert cache.evictions == 1
+    assert cache.get("b") is None
+    stats = cache.get_statistics()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["items"] == 2
+
+
+def test_cache_item_too_large():
+    cache = plot_cache.PlotDataCache(max_bytes=1000)
+    cache["a"] = np.zeros(10)
+    cache["b"] = np.zeros(1000)
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.evictions == 0
+
+
+def test_cache_set_max_bytes():
+    cache = plot_cache.PlotDataCache(max_bytes=10000)
+    for key in "abcde":
+        cache[key] = np.zeros(100)
+    cache.set_max_bytes(1700)
+    assert len(cache) == 2
+    assert "d" in cache
+    assert "e" in cache
+    assert cache.evictions == 3
+
+
+def test_get_scatter_data_cached():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    plot_cache.cache_data.clear()
+    kwargs = dict(rtdc_ds=ds, downsample=0, xax="area_um", yax="deform",
+                  xscale="linear", yscale="linear")
+    x1, y1, kde1, idx1 = plot_cache.get_scatter_data(**kwargs)
+    assert plot_cache.cache_data.misses == 1
+    x2, y2, kde2, idx2 = plot_cache.get_scatter_data(**kwargs)
+    assert plot_cache.cache_data.hits == 1
+    assert x1 is x2
+    assert np.all(idx1 == idx2)
+    assert plot_cache.cache_data.nbytes > 0
+
+
+def test_disk_cache_roundtrip(tmp_path):
+    cache = plot_cache.PlotDataDiskCache(path=tmp_path)
+    data = (np.arange(10), [np.ones((5, 2)), np.zeros((3, 2))])
+    cache["a"] = data
+    assert "a" in cache
+    assert cache.nbytes > 0
+    # a new instance (e.g. in a new session) finds the item
+    cache2 = plot_cache.PlotDataDiskCache(path=tmp_path)
+    data2 = cache2.get("a")
+    assert cache2.hits == 1
+    assert isinstance(data2, tuple)
+    assert isinstance(data2[1], list)
+    assert isinstance(data2[0], np.memmap)
+    assert np.all(data2[0] == data[0])
+    assert np.all(data2[1][0] == data[1][0])
+    assert cache2.get("b") is None
+    assert cache2.misses == 1
+
+
+def test_disk_cache_disabled():
+    cache = plot_cache.PlotDataDiskCache(path=None)
+    cache["a"] = np.arange(10)
+    assert not cache.enabled
+    assert "a" not in cache
+    assert cache.get("a") is None
+
+
+def test_disk_cache_lru_eviction(tmp_path):
+    cache = plot_cache.PlotDataDiskCache(path=tmp_path, max_bytes=12000)
+    for ii, key in enumerate("abc"):
+        cache[key] = np.zeros(400)  # 3200 bytes plus header
+        os.utime(tmp_path / key, ns=(ii * 10**9, ii * 10**9))
+    # access "a" so that "b" becomes the least-recently used item
+    assert cache.get("a") is not None
+    cache["d"] = np.zeros(400)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert "d" in cache
+    assert cache.evictions == 1
+    assert cache.nbytes <= 12000
+
+
+def test_get_scatter_data_disk_cached(tmp_path):
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    kwargs = dict(rtdc_ds=ds, downsample=0, xax="area_um", yax="deform",
+                  xscale="linear", yscale="linear")
+    try:
+        plot_cache.disk_cache.set_path(tmp_path)
+        plot_cache.cache_data.clear()
+        x1, y1, kde1, idx1 = plot_cache.get_scatter_data(**kwargs)
+        assert len(list(tmp_path.iterdir())) == 1
+        # simulate a new session
+        plot_cache.cache_data.clear()
+        x2, y2, kde2, idx2 = plot_cache.get_scatter_data(**kwargs)
+        assert plot_cache.disk_cache.hits == 1
+        assert isinstance(x2, np.memmap)
+        assert np.all(x1 == x2)
+        assert np.all(kde1 == kde2)
+        assert np.all(idx1 == idx2)
+    finally:
+        plot_cache.disk_cache.set_path(None)
+
+
+def test_get_scatter_data_disk_cached_new_session(tmp_path):
+    path = datapath / "calibration_beads_47.rtdc"
+    kwargs = dict(downsample=0, xax="area_um", yax="deform",
+                  xscale="linear", yscale="linear")
+    try:
+        plot_cache.disk_cache.set_path(tmp_path)
+        plot_cache.cache_data.clear()
+        slot = pipeline.Dataslot(path, identifier="disk-cache-session")
+        # filter ray without active filters (root dataset)
+        ray = pipeline.FilterRay(slot)
+        ds1 = ray.get_dataset(filters=[])
+        x1, y1, kde1, idx1 = plot_cache.get_scatter_data(rtdc_ds=ds1,
+                                                         **kwargs)
+        pipeline.Dataslot.remove_slot(slot.identifier)
+        # simulate a new session with a freshly opened dataset
+        plot_cache.cache_data.clear()
+        slot = pipeline.Dataslot(path, identifier="disk-cache-session")
+        ds2 = pipeline.FilterRay(slot).get_dataset(filters=[])
+        assert ds2.identifier != ds1.identifier
+        hits = plot_cache.disk_cache.hits
+        x2, y2, kde2, idx2 = plot_cache.get_scatter_data(rtdc_ds=ds2,
+                                                         **kwargs)
+        assert plot_cache.disk_cache.hits == hits + 1
+        assert np.all(x1 == x2)
+        assert np.all(idx1 == idx2)
+    finally:
+        plot_cache.disk_cache.set_path(None)
+        pipeline.Dataslot.remove_slot("disk-cache-session")
+
+
+def test_scatter_pyramid_selection():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    events, cell_starts, extent = plot_cache.get_scatter_pyramid(
+        ds, xax="area_um", yax="deform", xscale="linear", yscale="linear")
+    assert np.all(np.sort(events) == np.arange(len(ds)))
+    assert cell_starts[-1] == len(ds)
+    assert extent[0] == ds["area_um"].min()
+    assert extent[3] == ds["deform"].max()
+    # everything visible and enough samples
+    sel = plot_cache.select_from_scatter_pyramid(
+        (events, cell_starts, extent),
+        range_x=extent[:2], range_y=extent[2:], samples=100)
+    assert np.all(sel == np.arange(len(ds)))
+    # limited number of samples
+    sel = plot_cache.select_from_scatter_pyramid(
+        (events, cell_starts, extent),
+        range_x=extent[:2], range_y=extent[2:], samples=20)
+    assert sel.size == 20
+    assert np.unique(sel).size == 20
+
+
+def test_get_scatter_data_range():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    area = ds["area_um"]
+    deform = ds["deform"]
+    range_x = [area.min(), np.median(area)]
+    range_y = [deform.min(), deform.max()]
+    x, y, kde, idx = plot_cache.get_scatter_data(
+        rtdc_ds=ds, downsample=1000, xax="area_um", yax="deform",
+        xscale="linear", yscale="linear",
+        range_x=range_x, range_y=range_y)
+    inside = (area >= range_x[0]) & (area <= range_x[1])
+    assert np.all(idx == inside)
+    assert np.all(x == area[inside])
+    assert np.all(y == deform[inside])
+    # fewer samples
+    x, y, kde, idx = plot_cache.get_scatter_data(
+        rtdc_ds=ds, downsample=10, xax="area_um", yax="deform",
+        xscale="linear", yscale="linear",
+        range_x=range_x, range_y=range_y)
+    assert 0 < x.size <= 10
+    assert np.all(x <= range_x[1])
+    assert np.all(x == area[idx])
+    # the entire range is visible: regular downsampling
+    x1, y1, kde1, idx1 = plot_cache.get_scatter_data(
+        rtdc_ds=ds, downsample=10, xax="area_um", yax="deform",
+        xscale="log", yscale="linear",
+        range_x=[0, area.max()], range_y=range_y)
+    x2, y2, kde2, idx2 = plot_cache.get_scatter_data(
+        rtdc_ds=ds, downsample=10, xax="area_um", yax="deform",
+        xscale="log", yscale="linear")
+    assert np.all(idx1 == idx2)
+
+
+def test_get_scatter_data_range_not_disk_cached(tmp_path):
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    area = ds["area_um"]
+    kwargs = dict(rtdc_ds=ds, downsample=10, xax="area_um", yax="deform",
+                  xscale="linear", yscale="linear",
+                  range_y=[ds["deform"].min(), ds["deform"].max()])
+    try:
+        plot_cache.disk_cache.set_path(tmp_path)
+        plot_cache.cache_data.clear()
+        # the entire range is visible: no pyramid is computed
+        plot_cache.get_scatter_data(range_x=[0, area.max()], **kwargs)
+        num_files = len(list(tmp_path.iterdir()))
+        assert num_files == 2  # extent and scatter data
+        # only the pyramid is written to disk
+        plot_cache.get_scatter_data(range_x=[0, np.median(area)], **kwargs)
+        assert len(list(tmp_path.iterdir())) == num_files + 1
+        plot_cache.get_scatter_data(range_x=[0, np.mean(area)], **kwargs)
+        assert len(list(tmp_path.iterdir())) == num_files + 1
+    finally:
+        plot_cache.disk_cache.set_path(None)
+
+
+def test_get_density_image_data():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    area = np.asarray(ds["area_um"], dtype=float)
+    kwargs = dict(rtdc_ds=ds, xax="area_um", yax="deform",
+                  xscale="log", yscale="linear",
+                  range_x=[np.log10(area.min()), np.log10(area.max())],
+                  range_y=[ds["deform"].min(), ds["deform"].max()],
+                  bins=(40, 30))
+    counts = plot_cache.get_density_image_data(**kwargs)
+    assert counts.shape == (30, 40)
+    assert counts.sum() == len(ds)
+    # events with large area are on the right
+    assert counts[:, -1].sum() == np.sum(area == area.max())
+    assert plot_cache.get_density_image_data(**kwargs) is counts
+
+
+def test_get_contour_data_quantiles():
+    slot = pipeline.Dataslot(datapath / "calibration_beads_47.rtdc")
+    ds = slot.get_dataset()
+    kwargs = dict(xax="area_um", yax="deform", xacc=None, yacc=None,
+                  xscale="linear", yscale="linear")
+    plot_cache.cache_data.clear()
+    contours = plot_cache.get_contour_data(
+        ds, quantiles=[0.5, 0.95], **kwargs)
+    kde = KernelDensityEstimator(rtdc_ds=ds)
+    contours_ref = kde.get_contour_lines(quantiles=[0.5, 0.95], **kwargs)
+    assert len(contours) == len(contours_ref) == 2
+    for cc, cc_ref in zip(contours, contours_ref):
+        assert len(cc) == len(cc_ref)
+        for ci, ci_ref in zip(cc, cc_ref):
+            assert np.allclose(ci, ci_ref)
+    grid = plot_cache.get_density_grid_data(ds, **kwargs)
+    # other quantiles are computed from the same density grid
+    contours2 = plot_cache.get_contour_data(
+        ds, quantiles=[0.1, 0.5], **kwargs)
+    assert plot_cache.get_density_grid_data(ds, **kwargs) is grid
+    assert np.allclose(contours2[1][0], contours[0][0])
+    # cached contours
+    assert plot_cache.get_contour_data(
+        ds, quantiles=[0.1, 0.5], **kwargs) is contours2